@@ -0,0 +1,100 @@
+"""
+Latency and memory of N concurrent sessions opening the same workflow: each session analysing it for itself
+(as before the process-wide cache) against the shared AnalysisCache. Sessions are threads started together,
+as Streamlit runs them; each mode runs in its own process, with an empty catalogue.
+
+    python benchmarks/bench_analysis_cache.py path/to/workflow_wfd.xml --sessions 10
+    python benchmarks/bench_analysis_cache.py --generate 20000 --sessions 1 10 50
+"""
+import argparse
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_workflow_memory import generate_workflow
+
+
+def rss_mb() -> float:
+    """RSS courante du process (Linux)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def measure(mode: str, path: str, sessions: int):
+    import func_catalogue
+    from func_analysis_cache import AnalysisCache, file_digest, load_analysis
+    from func_exception_index import ExceptionIndex
+
+    # Catalogue vide et propre au benchmark : chaque mode part d'une analyse du XML
+    func_catalogue._catalogue = func_catalogue.Catalogue(os.path.join(tempfile.mkdtemp(), "exceptions.catalogue"))
+    cache = AnalysisCache(max_bytes=1 << 40)
+
+    def open_workflow():
+        if mode == "shared":
+            return cache.get(path, workflow_name="BENCH")
+        # Sans cache commun : chaque session hache, analyse et indexe le wfd
+        analysis = load_analysis(path, None, file_digest(path), use_catalogue=False)
+        return analysis, ExceptionIndex(list(analysis.exceptions))
+
+    barrier = threading.Barrier(sessions)
+    latencies = [0.0] * sessions
+    held = [None] * sessions  # références gardées par chaque session
+
+    def session(i):
+        barrier.wait()
+        start = time.perf_counter()
+        held[i] = open_workflow()
+        latencies[i] = time.perf_counter() - start
+
+    baseline = rss_mb()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    retained = rss_mb() - baseline
+    # ru_maxrss : Ko sous Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+    print(f"{mode:12} {sessions:>4} sessions  wall {elapsed:7.2f} s  latency median {statistics.median(latencies):7.2f} s "
+          f"max {max(latencies):7.2f} s  retained {retained:8.1f} MB  peak RSS {peak:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-session analyses with the shared analysis cache.")
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--generate", type=int, metavar="OPERATIONS",
+                        help="benchmark a synthetic wfd with this many operations")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10])
+    parser.add_argument("--measure", choices=["per-session", "shared"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.paths[0], args.sessions[0])
+        return
+
+    paths = list(args.paths)
+    if args.generate:
+        generated = os.path.join(tempfile.mkdtemp(), "generated_wfd.xml")
+        generate_workflow(generated, args.generate)
+        paths.append(generated)
+
+    for path in paths:
+        print(f"{path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        for sessions in args.sessions:
+            for mode in ("per-session", "shared"):
+                subprocess.run([sys.executable, __file__, "--measure", mode, path, "--sessions", str(sessions)],
+                               check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Transfer time and client CPU of a full Bitbucket synchronization, per-file browse (JSON 'lines') against
+the tar.gz archive stream, served by a local stand-in Bitbucket server running in its own process.
+Each method runs in its own client process, into an empty XML_PATH.
+
+    python benchmarks/bench_bitbucket_sync.py --files 2000 --size 8000
+
+The browse requests go through a minimal requests-based client (same endpoints, limit/start paging)
+instead of api_bitbucket.BitbucketClient, so that they reach the local server.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STP_NAMES = ['PAY', 'FX', 'SEC', 'CASH']
+API_PREFIX = '/rest/api/1.0'
+
+
+def generate_tree(files: int, size: int, seed: int = 0) -> dict:
+    """Arborescence synthétique du dépôt : chemin -> contenu (texte, lignes de ~60 caractères)."""
+    rng = random.Random(seed)
+
+    def text(length):
+        lines, total = [], 0
+        while total < length:
+            line = f"    value_{rng.randint(0, 10 ** 6)} = compute(value_{rng.randint(0, 10 ** 6)}, {rng.random():.6f});"
+            lines.append(line)
+            total += len(line) + 1
+        return '\n'.join(lines) + '\n'
+
+    tree = {}
+    for name in STP_NAMES:
+        for suffix in ('_wfd', '_cfg', '_ini'):
+            tree[f"etc/stpcfg/{name}{suffix}.xml"] = f'<?xml version="1.0"?>\n<workflow>\n{text(size)}</workflow>\n'
+    for i in range(files):
+        tree[f"src/stk/stp/{STP_NAMES[i % len(STP_NAMES)].title()}/module{i // 50}/file{i}.cc"] = text(size)
+    for utils in ('MK_Utils', 'TCI_Utils'):
+        for i in range(20):
+            tree[f"include/{utils}/header{i}.h"] = text(size // 4)
+    return {path: content.encode('utf-8') for path, content in tree.items()}
+
+
+def serve(files: int, size: int):
+    """Serveur Bitbucket de substitution : commits, last-modified, browse paginé et archive tar.gz."""
+    from func_update_bitbucket import REPO_ENDPOINT
+
+    tree = generate_tree(files, size)
+    archives = {}
+    sent = [0]
+
+    def children(path):
+        found = {}
+        for filepath in sorted(tree):
+            if filepath.startswith(path + '/'):
+                rest = filepath[len(path) + 1:]
+                found.setdefault(rest.split('/')[0], 'DIRECTORY' if '/' in rest else 'FILE')
+        return found
+
+    def archive(paths):
+        key = tuple(paths)
+        if key not in archives:
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+                for filepath, content in sorted(tree.items()):
+                    if any(filepath.startswith(p + '/') for p in paths):
+                        info = tarfile.TarInfo(filepath)
+                        info.size = len(content)
+                        tar.addfile(info, io.BytesIO(content))
+            archives[key] = buffer.getvalue()
+        return archives[key]
+
+    def page(values, query):
+        limit, start = int(query.get('limit', ['500'])[0]), int(query.get('start', ['0'])[0])
+        last = start + limit >= len(values)
+        return values[start:start + limit], {'isLastPage': last, 'nextPageStart': None if last else start + limit}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # en-têtes et corps écrits séparément : sans cela, ~40 ms par requête
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, body: bytes, content_type='application/json', status=200):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            sent[0] += len(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/stats':
+                body, sent[0] = json.dumps({'sent': sent[0]}).encode(), 0
+                return self.reply(body)
+            endpoint = url.path[len(API_PREFIX + REPO_ENDPOINT) + 1:]
+            kind, _, path = endpoint.partition('/')
+            path = path.rstrip('/')
+            if kind == 'commits':
+                result = {'values': [{'id': 'c1'}]}
+            elif kind == 'archive':
+                return self.reply(archive(query['path']), 'application/octet-stream')
+            elif kind == 'last-modified':
+                result = {'files': {name: {'id': 'c1'} for name in children(path)}}
+            elif path in tree:
+                lines, paging = page([{'text': line} for line in tree[path].decode('utf-8').split('\n')], query)
+                result = dict(lines=lines, **paging)
+            elif children(path):
+                values = [{'type': kind, 'path': {'toString': name, 'name': name,
+                                                  'extension': name.rpartition('.')[2]}}
+                          for name, kind in children(path).items()]
+                values, paging = page(values, query)
+                result = {'children': dict(values=values, **paging)}
+            else:
+                return self.reply(b'{"errors": []}', status=404)
+            self.reply(json.dumps(result).encode())
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+def measure(method: str, port: int):
+    import requests
+    import func_update_bitbucket as bitbucket
+    from func_manage_json import JsonManager
+
+    base = f"http://127.0.0.1:{port}"
+    session = requests.Session()
+
+    class LocalClient:
+        def __init__(self, *args):
+            pass
+
+        def _make_request(self, method, endpoint, limit, start):
+            response = session.request(method, f"{base}{API_PREFIX}{endpoint}", params={'limit': limit, 'start': start})
+            response.raise_for_status()
+            return response.json()
+
+    bitbucket.BitbucketClient = LocalClient
+    bitbucket.bitbucket_cfg['URL'] = base
+    bitbucket.xml_cfg['XML_PATH'] = tempfile.mkdtemp()
+    JsonManager.get_stp_list = staticmethod(lambda *args: STP_NAMES)
+
+    manifest, seen = {"commit": None, "stp_list": None, "dirs": {}, "files": {}}, set()
+    start, cpu = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if method == 'archive':
+            bitbucket.sync_archive(manifest, seen)
+        else:
+            bitbucket.sync_browse(manifest, seen)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    received = session.get(f"{base}/stats").json()['sent']
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{method:8} {len(manifest['files']):>6} files {elapsed:7.2f} s  client CPU {cpu:6.2f} s  "
+          f"received {received / 1e6:7.1f} MB  peak RSS {peak:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare browse and archive Bitbucket synchronization.")
+    parser.add_argument("--files", type=int, default=2000, help="source files under src/stk/stp")
+    parser.add_argument("--size", type=int, default=8000, help="approximate size of each file in bytes")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--measure", choices=["browse", "archive"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.files, args.size)
+        return
+    if args.measure:
+        measure(args.measure, args.port)
+        return
+
+    server = subprocess.Popen([sys.executable, __file__, "--serve", "--files", str(args.files), "--size", str(args.size)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        port = server.stdout.readline().strip()
+        print(f"{args.files} files of ~{args.size} bytes, local server on port {port}")
+        for method in ("browse", "archive"):
+            subprocess.run([sys.executable, __file__, "--measure", method, "--port", port], check=True)
+    finally:
+        server.kill()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
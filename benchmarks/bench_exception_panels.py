@@ -0,0 +1,234 @@
+"""
+Rerun time of the exception list, measured with Streamlit's AppTest on a synthetic workflow whose exceptions
+all have a source file and includes on disk. Each git revision is exported into its own directory (with the
+deployed module names and a config pointing to the generated data) and measured in its own process.
+
+    python benchmarks/bench_exception_panels.py --revisions aebc5d9^ HEAD --exceptions 300
+
+A rerun is what any click outside the exception panels costs: the script runs again with every panel closed.
+A click is the latency of "Show exception code" inside the first exception panel, once that panel is open:
+as a page rerun (what panels without fragments cost) and, when the panel is a fragment, as a fragment rerun.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# new_*.py -> nom du module déployé
+DEPLOYED_NAMES = {
+    "new_comps_exception_details.py": "comps_exceptions.py",
+    "new_comps_node_impact.py": "comps_node_impact.py",
+    "new_home.py": None,
+}
+
+APP = """
+import inspect
+import json
+from collections import defaultdict
+import streamlit as st
+from comps_exceptions import display_exceptions
+
+# Etat initialisé par la page d'accueil des anciennes versions
+if "llm_results" not in st.session_state:
+    st.session_state.llm_results = defaultdict(str)
+
+with open({exceptions_file!r}) as f:
+    exceptions = json.load(f)
+groups = sorted({{exception["condition_group"] for exception in exceptions}})
+
+if next(iter(inspect.signature(display_exceptions).parameters)) == "index":
+    from func_exception_index import ExceptionIndex
+    try:
+        from func_exception_record import ExceptionRecord
+        exceptions = [ExceptionRecord.from_dict(exception) for exception in exceptions]
+    except ImportError:
+        pass
+    display_exceptions(ExceptionIndex(exceptions), groups)
+else:
+    display_exceptions(exceptions, groups)
+"""
+
+
+def generate_data(root: str, count: int) -> str:
+    """Sources, includes, prompt et exceptions d'un workflow synthétique ; renvoie le fichier des exceptions."""
+    codes = os.path.join(root, "xml", "codes", "PayServer", "tci")
+    os.makedirs(codes)
+    os.makedirs(os.path.join(root, "json"))
+    for i in range(10):
+        with open(os.path.join(codes, f"cSU_Common{i}.h"), "w") as f:
+            f.write("".join(f"int common_{i}_{j}(int value);\n" for j in range(200)))
+    exceptions = []
+    for i in range(count):
+        with open(os.path.join(codes, f"cSU_Check{i}.cc"), "w") as f:
+            f.write("".join(f'#include "cSU_Common{(i + j) % 10}.h"\n' for j in range(3)))
+            f.write("".join(f"    if (!check_{i}_{j}()) throw PaymentException({j});\n" for j in range(150)))
+        exceptions.append({
+            "condition_id": f"PayServerTCI.Check{i}", "condition_group": f"G{i % 5}", "type": f"T{i % 7}",
+            "format": "F", "text": f"Check {i} failed",
+            "path": " -> ".join(["start"] + [f"PayServerTCI.Step{j}/Success" for j in range(i % 20)]),
+        })
+    exceptions_file = os.path.join(root, "exceptions.json")
+    with open(exceptions_file, "w") as f:
+        json.dump(exceptions, f)
+    with open(os.path.join(root, "json", "prompt.json"), "w") as f:
+        json.dump({"prompt_default": "Explain this exception."}, f)
+    return exceptions_file
+
+
+def export_revision(revision: str, root: str, data: str, exceptions_file: str) -> str:
+    """Arbre de 'revision' avec les noms de modules déployés, un config.py et l'app de mesure."""
+    app_dir = os.path.join(root, "app")
+    os.makedirs(app_dir)
+    archive = subprocess.run(["git", "-C", REPO, "archive", revision], check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", app_dir], input=archive, check=True)
+    for name in os.listdir(app_dir):
+        deployed = DEPLOYED_NAMES.get(name, name[len("new_"):] if name.startswith("new_func_") else name)
+        if deployed and deployed != name and not os.path.exists(os.path.join(app_dir, deployed)):
+            os.symlink(os.path.join(app_dir, name), os.path.join(app_dir, deployed))
+    with open(os.path.join(app_dir, "config.py"), "w") as f:
+        f.write(f"environment = 'bench'\n"
+                f"xml_cfg = {{'XML_PATH': {os.path.join(data, 'xml')!r}}}\n"
+                f"app_cfg = {{'JSON_PATH': {os.path.join(data, 'json')!r}, "
+                f"'JSON_PROMPT': {os.path.join(data, 'json', 'prompt.json')!r}, "
+                f"'ADMINLIST': {os.path.join(data, 'json', 'adminlist.json')!r}, 'LOGO_PATH': ''}}\n"
+                f"bitbucket_cfg = {{'URL': 'http://127.0.0.1', 'TOKEN': ''}}\n")
+    with open(os.path.join(app_dir, "bench_app.py"), "w") as f:
+        f.write(APP.format(exceptions_file=exceptions_file))
+    return app_dir
+
+
+def enable_fragment_runs(state: dict):
+    """
+    AppTest relance toujours le script entier. Tant que state["fragment"] est renseigné, les runs suivants
+    ne relancent que ce fragment, comme le fait le serveur quand un widget du fragment change (API interne
+    d'AppTest). Les messages du dernier run sont gardés dans state["messages"] pour retrouver les fragments.
+    """
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests
+    from streamlit.testing.v1 import local_script_runner
+
+    full_run = local_script_runner.LocalScriptRunner.run
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        if state["fragment"] is None:
+            tree = full_run(self, widget_state, query_params, timeout, page_hash)
+        else:
+            # Remplace la demande de run complet faite à la création du runner
+            self._requests = ScriptRequests()
+            self.request_rerun(RerunData(widget_states=widget_state, page_script_hash=page_hash,
+                                         fragment_id_queue=[state["fragment"]], is_fragment_scoped_rerun=True))
+            try:
+                if not self._script_thread:
+                    self.start()
+                local_script_runner.require_widgets_deltas(self, timeout)
+            finally:
+                self.join()
+            tree = local_script_runner.parse_tree_from_messages(self.forward_msgs())
+        state["messages"] = list(self.forward_msgs())
+        return tree
+
+    local_script_runner.LocalScriptRunner.run = run
+
+
+def widget_fragment(state: dict, widget_id: str):
+    """Fragment contenant le widget lors du dernier run, None hors fragment."""
+    for message in state["messages"]:
+        if message.HasField("delta") and message.delta.HasField("new_element"):
+            element = message.delta.new_element
+            if getattr(getattr(element, element.WhichOneof("type")), "id", None) == widget_id:
+                return message.delta.fragment_id or None
+    return None
+
+
+def time_clicks(app, count: int) -> list:
+    timings = []
+    for _ in range(count):
+        button = next(b for b in app.button if b.label == "Show exception code")
+        start = time.perf_counter()
+        button.click().run()
+        timings.append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+    return timings
+
+
+def measure(app_dir: str, reruns: int):
+    sys.path.insert(0, app_dir)
+    os.chdir(app_dir)
+    from streamlit.testing.v1 import AppTest
+
+    state = {"fragment": None, "messages": []}
+    enable_fragment_runs(state)
+
+    app = AppTest.from_file(os.path.join(app_dir, "bench_app.py"), default_timeout=600)
+    # Les print() de l'app ne sont pas mesurés ni affichés
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        app.run()
+        first = time.perf_counter() - start
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+
+        timings = []
+        for _ in range(reruns):
+            start = time.perf_counter()
+            app.run()
+            timings.append(time.perf_counter() - start)
+        panels = len(app.toggle) or len(app.expander)
+
+        # Panneaux repliables par toggle depuis le chargement à la demande, expanders toujours exécutés avant
+        if app.toggle:
+            app.toggle[0].set_value(True).run()
+        button = next(b for b in app.button if b.label == "Show exception code")
+        state["fragment"] = widget_fragment(state, button.id)
+        fragment_clicks = time_clicks(app, reruns) if state["fragment"] else None
+        state["fragment"] = None
+        try:
+            page_clicks = time_clicks(app, reruns)
+        except RuntimeError as e:
+            page_clicks = str(e)
+
+    print(f"  first run {first * 1000:8.0f} ms   rerun median {statistics.median(timings) * 1000:8.0f} ms  "
+          f"max {max(timings) * 1000:8.0f} ms   ({panels} panels rendered)")
+    if isinstance(page_clicks, str):
+        print(f"  click, page rerun      failed: {page_clicks}")
+    else:
+        print(f"  click, page rerun      median {statistics.median(page_clicks) * 1000:8.0f} ms   "
+              f"max {max(page_clicks) * 1000:8.0f} ms")
+    if fragment_clicks:
+        print(f"  click, fragment rerun  median {statistics.median(fragment_clicks) * 1000:8.0f} ms   "
+              f"max {max(fragment_clicks) * 1000:8.0f} ms")
+    else:
+        print("  click, fragment rerun  - (panel is not a fragment)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure exception list rerun time at several git revisions.")
+    parser.add_argument("--revisions", nargs="+", default=["HEAD"])
+    parser.add_argument("--exceptions", type=int, default=300)
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--measure", metavar="APP_DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.reruns)
+        return
+
+    data = tempfile.mkdtemp()
+    exceptions_file = generate_data(data, args.exceptions)
+    print(f"{args.exceptions} exceptions, data in {data}")
+    for revision in args.revisions:
+        app_dir = export_revision(revision, tempfile.mkdtemp(), data, exceptions_file)
+        print(revision)
+        subprocess.run([sys.executable, __file__, "--measure", app_dir, "--reruns", str(args.reruns)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Memory of exception paths stored as full " -> "-joined strings against PathRef references into a shared
+path trie, and size of the module JSON with string paths against the compact 'path_trie' serialization.
+
+    python benchmarks/bench_path_interning.py path/to/workflow_wfd.xml ...
+    python benchmarks/bench_path_interning.py --generate 20000
+    python benchmarks/bench_path_interning.py --generate 500 --depth 40
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_workflow_memory import generate_workflow
+
+
+def generate_deep_workflow(path: str, branches: int, depth: int):
+    """wfd synthétique à chemins longs : 'branches' chaînes de 'depth' forks, une condition à chaque niveau."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<workflow><start id="start">\n')
+        for b in range(branches):
+            f.write(f'<operation id="Branch{b}.Entry">')
+            for d in range(depth):
+                f.write(f'<fork id="Branch{b}.Fork{d}"><failure>'
+                        f'<condition id="Branch{b}.Check{d}" conditionG="G{d % 10}">'
+                        f'<exception type="T" format="F" text="Check {d} of branch {b} failed"/></condition>'
+                        f'</failure><success><operation id="Branch{b}.Step{d}">')
+            f.write('</operation></success></fork>' * depth + '</operation>\n')
+        f.write('</start></workflow>\n')
+
+
+def traced(build):
+    """Résultat de build() et mémoire qu'il retient (tracemalloc)."""
+    tracemalloc.start()
+    result = build()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, retained
+
+
+def measure(path: str):
+    from func_graph_xml import analyze_workflow
+    from func_manage_json import JsonManager
+    from func_path_trie import PathTrie
+
+    start = time.perf_counter()
+    exceptions = analyze_workflow(path).exceptions
+    elapsed = time.perf_counter() - start
+    steps = [exception.path.steps() for exception in exceptions]
+
+    # Les noms de noeuds et labels sont déjà en mémoire (graphe) : seule la structure des chemins est comptée
+    strings, string_bytes = traced(lambda: [" -> ".join(f"{n}/{l}" if l else n for n, l in s) for s in steps])
+
+    def build_trie():
+        # Comme PathFinder : index de préfixes temporaire, seul le trie est retenu
+        trie, known, indexes = PathTrie(), {}, []
+        for path_steps in steps:
+            index = trie.ROOT
+            for node, label in path_steps:
+                key = (index, node, label)
+                if key not in known:
+                    known[key] = trie.append(index, node, label)
+                index = known[key]
+            indexes.append(index)
+        return trie, indexes
+
+    (trie, indexes), trie_bytes = traced(build_trie)
+
+    # Fichier de module tel que l'écrit add_exceptions (trie ou chaînes selon le plus petit), contre chaînes seules
+    records = [{**exception.to_dict(), "path": string, "prompt": None, "ai_explanation": None}
+               for exception, string in zip(exceptions, strings)]
+    string_json = len(json.dumps({"exceptions": records}, indent=4))
+    manager = JsonManager(tempfile.mkdtemp())
+    manager.add_exceptions("BENCH", [exception.to_dict() for exception in exceptions])
+    module_json = os.path.getsize(manager._get_json_file_path("BENCH"))
+    storage = "trie" if "path_trie" in manager.load_json("BENCH") else "strings"
+
+    average = sum(map(len, strings)) / max(1, len(strings))
+    print(f"{len(exceptions)} exceptions (analysis {elapsed:.1f} s), average path {average:.0f} chars, "
+          f"{len(trie)} trie steps")
+    print(f"  in memory   strings {string_bytes / 1e6:8.2f} MB   trie {trie_bytes / 1e6:8.2f} MB")
+    print(f"  module JSON strings {string_json / 1e6:8.2f} MB   add_exceptions {module_json / 1e6:8.2f} MB ({storage})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory saved by interning exception paths in a trie.")
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--generate", type=int, metavar="OPERATIONS",
+                        help="benchmark a synthetic wfd with this many operations (branches with --depth)")
+    parser.add_argument("--depth", type=int, help="nest forks this deep in each branch (long shared paths)")
+    args = parser.parse_args()
+
+    paths = list(args.paths)
+    if args.generate:
+        generated = os.path.join(tempfile.mkdtemp(), "generated_wfd.xml")
+        if args.depth:
+            generate_deep_workflow(generated, args.generate, args.depth)
+        else:
+            generate_workflow(generated, args.generate)
+        paths.append(generated)
+
+    for path in paths:
+        print(f"{path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        measure(path)
+
+
+if __name__ == "__main__":
+    main()
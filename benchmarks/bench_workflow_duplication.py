@@ -0,0 +1,80 @@
+"""
+Build time and memory of analyze_workflow with and without the structural memoization of repeated subtrees,
+on a wfd where the same validation block is pasted into many branches. Each run happens in its own process.
+
+    python benchmarks/bench_workflow_duplication.py path/to/workflow_wfd.xml ...
+    python benchmarks/bench_workflow_duplication.py --generate 5000 --block 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def validation_block(checks: int) -> str:
+    """Bloc de contrôles copié tel quel (mêmes ids) dans chaque branche."""
+    return "".join(
+        f'<condition id="Validation.Check{i}" conditionG="VALIDATION">'
+        f'<exception type="T{i % 5}" format="F" text="Validation check {i} failed: {"detail " * 20}"/>'
+        f'<success><operation id="Validation.Step{i}"/></success></condition>'
+        for i in range(checks))
+
+
+def generate_workflow(path: str, branches: int, checks: int):
+    block = validation_block(checks)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<workflow><start id="start">\n')
+        for i in range(branches):
+            f.write(f'<operation id="op{i}"><fork id="fork{i}"><success>{block}</success>'
+                    f'<failure><end id="end{i}"/></failure></fork></operation>\n')
+        f.write('</start></workflow>\n')
+
+
+def measure(method: str, path: str):
+    from func_graph_xml import analyze_workflow
+
+    # Temps mesuré sans tracemalloc, qui ralentit fortement les allocations
+    start = time.perf_counter()
+    analyze_workflow(path, memoize=method == "memo")
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    analysis = analyze_workflow(path, memoize=method == "memo")
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{method:8} {len(analysis.exceptions):>8} exceptions {elapsed:7.2f} s  "
+          f"retained {current / 1e6:8.1f} MB  traced peak {peak / 1e6:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare analyze_workflow with and without subtree memoization.")
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--generate", type=int, metavar="BRANCHES",
+                        help="benchmark a synthetic wfd with this many copies of the validation block")
+    parser.add_argument("--block", type=int, default=20, help="conditions in the validation block")
+    parser.add_argument("--measure", choices=["memo", "no-memo"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.paths[0])
+        return
+
+    paths = list(args.paths)
+    if args.generate:
+        generated = os.path.join(tempfile.mkdtemp(), "duplicated_wfd.xml")
+        generate_workflow(generated, args.generate, args.block)
+        paths.append(generated)
+
+    for path in paths:
+        print(f"{path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        for method in ("no-memo", "memo"):
+            subprocess.run([sys.executable, __file__, "--measure", method, path], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Peak memory of the wfd graph construction: full tree (parse + build_workflow_graph + condition scan)
+against the streaming builder (stream_workflow). Each run happens in its own process so that the peak
+RSS of one method does not hide the other.
+
+    python benchmarks/bench_workflow_memory.py path/to/workflow_wfd.xml ...
+    python benchmarks/bench_workflow_memory.py --generate 200000
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate_workflow(path: str, operations: int, seed: int = 0):
+    """wfd synthétique : une suite d'opérations contenant forks, conditions (avec exceptions) et fins."""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<workflow><start id="start">\n')
+        for i in range(operations):
+            f.write(f'<operation id="op{i}">'
+                    f'<fork id="fork{i}"><success>'
+                    f'<condition id="Svc.Check{i}" conditionG="G{rng.randint(0, 9)}">'
+                    f'<exception type="T{rng.randint(0, 4)}" format="F" text="Check {i} failed"/>'
+                    f'<success><end id="end{i}"/></success></condition>'
+                    f'</success><failure><jump location="L{rng.randint(0, 50)}"/></failure></fork>'
+                    f'</operation>\n')
+        f.write('</start></workflow>\n')
+
+
+def measure(method: str, path: str):
+    from func_graph_xml import build_workflow_graph, parse_xml, stream_workflow
+    from func_xml_engine import get_engine
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if method == "tree":
+        root = parse_xml(path)
+        graph = build_workflow_graph(path, root=root)
+        conditions = [(c.get("id"), c.find("exception")) for c in get_engine().find_all(root, "condition")]
+    else:
+        graph, _, conditions = stream_workflow(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # ru_maxrss : Ko sous Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(f"{method:6} {graph.number_of_nodes():>9} nodes {len(conditions):>8} conditions "
+          f"{elapsed:7.2f} s  traced peak {peak / 1e6:8.1f} MB  max RSS {rss / 1e6:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare peak memory of the tree and streaming wfd builders.")
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--generate", type=int, metavar="OPERATIONS",
+                        help="benchmark a synthetic wfd with this many operations")
+    parser.add_argument("--measure", choices=["tree", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.paths[0])
+        return
+
+    paths = list(args.paths)
+    if args.generate:
+        generated = os.path.join(tempfile.mkdtemp(), "generated_wfd.xml")
+        generate_workflow(generated, args.generate)
+        paths.append(generated)
+
+    for path in paths:
+        print(f"{path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        for method in ("tree", "stream"):
+            subprocess.run([sys.executable, __file__, "--measure", method, path], check=True)
+
+
+if __name__ == "__main__":
+    main()
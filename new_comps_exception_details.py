@@ -1,92 +1,186 @@
-from collections import defaultdict
-import json
+import math
 import os
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 from streamlit_extras.stylable_container import stylable_container
 
-from config import xml_cfg, app_cfg
+from config import xml_cfg
+from func_config_registry import prompt_config
 from func_llm_request import main as llm_request, print_code, replace_print_code, find_directory
 from func_manage_json import JsonManager
+from func_query import QueryError
+from sessionstate_manager import SessionStateManager
 
 
 manage_json = JsonManager()
-
-
-def display_exceptions(exceptions, selected_groups):
-    """Display exceptions based on selected groups."""
-    grouped_exceptions = defaultdict(list)
-    for exception in exceptions:
-        condition_group = exception.get('condition_group', 'Autre')
-        grouped_exceptions[condition_group].append(exception)
-    
-    for condition_group in list(grouped_exceptions.keys()):
-        if condition_group not in selected_groups:
-            del grouped_exceptions[condition_group]
-
-    for condition_group, group_exceptions in grouped_exceptions.items():
-        condition_group_display = "No exception group" if condition_group == 'None' else condition_group
-        st.subheader(condition_group_display)
-
-        seen_ids = {} 
-        for exception in group_exceptions:
-            modified_exception = modify_exception_id_if_duplicate(exception, seen_ids)
-            display_exception_details(modified_exception)  # Passer l'exception potentiellement modifiée
-
-
-def modify_exception_id_if_duplicate(exception, seen_ids):
-    """Modifie condition_id si une exception avec le même condition_id et condition_group existe déjà."""
-    condition_id = exception['condition_id']
-    condition_group = exception.get('condition_group', 'Autre')
-
-    key = (condition_id, condition_group)
-
-    if key in seen_ids:
-        count = seen_ids[key] + 1
-        new_condition_id = f"{condition_id}___{count}"
-        exception['condition_id'] = new_condition_id
-        seen_ids[key] = count
-        
-    else:
-        seen_ids[key] = 0
-    
-    return exception
-
-
-def display_exception_details(exception):
-    """Display the details for a single exception."""
-    
-    with open(app_cfg["JSON_PROMPT"], 'r') as f:
-                json_prompt = json.load(f)
-    default_prompt = json_prompt["prompt_default"]
-
-    model_names = ["gemini-2.0-flash-001", "claude-sonnet-4", "gpt-4o-mini-2024-07-18"]
-    key_exception = exception['condition_group'] + '/' + exception['condition_id']
-    exception_id = exception['condition_id'].split('___')[0]
+# Etat d'interface (filtres, widgets, état de chaque exception), vidé au changement de workflow
+exceptions_state = SessionStateManager("exceptions")
+# Données lues sur disque pour chaque exception, vidées à chaque chargement des exceptions
+exceptions_data = SessionStateManager("exception_cache")
+# Anciens prompts par défaut : les exceptions qui les utilisent encore passent au nouveau
+replaced_prompts = set()
+
+
+def remember_replaced_prompt(previous, data):
+    if previous and previous.get("prompt_default") != data.get("prompt_default"):
+        replaced_prompts.add(previous.get("prompt_default"))
+
+
+prompt_config().subscribe(remember_replaced_prompt)
+
+MODEL_NAMES = ["gemini-2.0-flash-001", "claude-sonnet-4", "gpt-4o-mini-2024-07-18"]
+PAGE_SIZES = [10, 25, 50, 100]
+
+
+def group_label(condition_group):
+    return "No exception group" if condition_group == 'None' else condition_group
+
+
+def display_exceptions(index, selected_groups, loops=None, query=None):
+    """
+    Display one page of the exceptions matching the selected groups, filters and query.
+    'loops' (WorkflowLoops) is None when the exceptions come from the catalogue.
+    'query' (WorkflowQuery) evaluates the query expression on the same rows as 'index'.
+    """
+    default_prompt = prompt_config().get()["prompt_default"]
+
+    query_rows = None
+    if query is not None:
+        expression = st.text_input("Query", key=exceptions_state.key("query"),
+                                   placeholder="type = X and reachable via Failure of fork F and text contains 'IBAN'")
+        if expression.strip():
+            try:
+                query_rows = set(query.run(expression))
+            except QueryError as e:
+                st.error(str(e))
+                return
+
+    filter1, filter2, filter3 = st.columns([2, 3, 1])
+    with filter1:
+        types = st.multiselect("Type", options=index.types, key=exceptions_state.key("filter_types"))
+    with filter2:
+        text = st.text_input("Search", key=exceptions_state.key("filter_text"), placeholder="Id, text or path")
+    with filter3:
+        page_size = st.selectbox("Per page", options=PAGE_SIZES, index=1, key=exceptions_state.key("page_size"))
+
+    rows = index.filter(groups=selected_groups, types=types, text=text)
+    if query_rows is not None:
+        rows = [row for row in rows if row in query_rows]
+    counts = index.count_by_group(rows)
+    st.caption("  \n".join(f"**{group_label(group)}**: {counts.get(group, 0)} / {index.group_size(group)}"
+                           for group in index.groups if group in selected_groups))
+
+    if not rows:
+        st.write("0 exception found.")
+        return
+
+    # Retour à la première page dès qu'un filtre change
+    page_count = math.ceil(len(rows) / page_size)
+    filter_key = (tuple(sorted(selected_groups)), tuple(types), text, page_size,
+                  exceptions_state.get("query") if query_rows is not None else None)
+    if exceptions_state.get("filter_key") != filter_key:
+        exceptions_state.set("filter_key", filter_key)
+        exceptions_state.set("page", 1)
+    exceptions_state.set("page", min(exceptions_state.get("page", 1), page_count))
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key=exceptions_state.key("page"))
+
+    # Seule la page visible crée des widgets
+    current_group = None
+    for row in rows[(page - 1) * page_size:page * page_size]:
+        exception = index.exceptions[row]
+        condition_group = exception.condition_group
+        if condition_group != current_group:
+            st.subheader(f"{group_label(condition_group)} ({counts[condition_group]})")
+            current_group = condition_group
+        display_exception_details(exception, default_prompt, loops)
+
+
+def cached(data, name, loader):
+    """Appelle 'loader' une seule fois par exception et par donnée ('data' : namespace de l'exception)."""
+    if not data.exists(name):
+        data.set(name, loader())
+    return data.get(name)
+
+
+def list_code_files(files_folder):
+    """Fichiers .cc d'un dossier de codes, None si le dossier n'existe pas."""
+    if not os.path.exists(files_folder):
+        return None
+    return [f for f in os.listdir(files_folder)
+            if os.path.isfile(os.path.join(files_folder, f)) and f.endswith(".cc")]
+
+
+def exception_state(scope, default_prompt):
+    """Etat d'interface d'une exception, regroupé dans un seul dictionnaire de son namespace."""
+    scope.init("ui", {
+        "prompt_custom": False,
+        "text_area_visible": False,
+        "prompt_value": default_prompt,
+        "model_name": MODEL_NAMES[0],
+        "show_code": False,
+        "show_dep": False,
+        "llm_result": "",
+        "is_modifying": False,
+    })
+    state = scope.get("ui")
+    if state["prompt_value"] in replaced_prompts:
+        state["prompt_value"] = default_prompt
+    return state
+
+
+def display_loops(exception, scope, loops):
+    """Boucles traversées par le chemin : repliées par défaut, arêtes internes affichées à la demande."""
+    st.write(f"**Loops:** {', '.join(str(loops.by_id[region_id]) for region_id in exception.loops)}")
+    if not st.toggle("Expand loops", key=scope.key("show_loops")):
+        return
+    st.write(f"**Full path:** {exception.path}")
+    for region_id in exception.loops:
+        edges = loops.expand(region_id)
+        st.code("\n".join(f"{src} -[{label}]-> {dst}" if label else f"{src} -> {dst}" for src, label, dst in edges),
+                language=None)
+
+
+def rerun_panel():
+    """
+    Relance seulement le panneau de l'exception. Un clic peut aussi être traité pendant une exécution complète
+    de la page (relance du fragment fusionnée avec celle de la page, AppTest) : la page entière est alors relancée.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+@st.fragment
+def display_exception_details(exception, default_prompt, loops=None):
+    """
+    Display the details for a single exception. Nothing is read from disk until the exception is opened.
+    Runs as a fragment: interactions inside a panel only rerun that panel.
+    """
+
+    key_exception = exception.condition_group + '/' + exception.display_id
+    exception_id = exception.condition_id
+    scope = exceptions_state.scope(key_exception)
+    data = exceptions_data.scope(key_exception)
 
 
     service_folder = exception_id.split('.')[0]
     service_folder, code_directory = find_directory(service_folder)
 
-    with st.expander(f'**{exception_id}**'):
-        st.write(f"**Group:** {exception['condition_group']}  \n**Type:** {exception['type']}  \n**Format:** {exception['format']}  \n**Path:** {exception['path']}")
-
-        prompt_custom_key = f"prompt_custom_{key_exception}"
-        if prompt_custom_key not in st.session_state:
-            st.session_state[prompt_custom_key] = False
+    with st.container(border=True):
+        if not st.toggle(f'**{exception_id}**', key=scope.key("open")):
+            return
 
-        text_area_visible_key = f"text_area_visible_{key_exception}"
-        if text_area_visible_key not in st.session_state:
-            st.session_state[text_area_visible_key] = False
-            
-        prompt_value_key = f"prompt_value_{key_exception}"
-        if prompt_value_key not in st.session_state:
-            st.session_state[prompt_value_key] = default_prompt
+        path = exception.path
+        if loops is not None and exception.loops and hasattr(path, 'steps'):
+            path = loops.collapse(path.steps())
+        st.write(f"**Group:** {exception.condition_group}  \n**Type:** {exception.type}  \n**Format:** {exception.format}  \n**Path:** {path}")
+        if loops is not None and exception.loops:
+            display_loops(exception, scope, loops)
 
-        model_name_key = f"model_name_selected_{key_exception}"
-        if model_name_key not in st.session_state:
-            st.session_state[model_name_key] = model_names[0]
+        state = exception_state(scope, default_prompt)
 
-        a, b, c = print_code(exception=exception_id)
+        a, b, c = cached(data, 'code', lambda: print_code(exception=exception_id))
         exception_code, exception_name, code_dep = a, b, c
 
         if not exception_code:
@@ -94,14 +188,6 @@ def display_exception_details(exception):
         else:
             disabled = False
 
-        show_code_key = f"show_code_{key_exception}"
-        if show_code_key not in st.session_state:
-            st.session_state[show_code_key] = False
-
-        show_dep_key = f"show_dep_{key_exception}"
-        if show_dep_key not in st.session_state:
-            st.session_state[show_dep_key] = False
-
 
         # CASE WHEN CODE EXCEPTION IS NOT FOUND
         if not a:
@@ -110,20 +196,19 @@ def display_exception_details(exception):
                     files_folder = os.path.join(xml_cfg['XML_PATH'], "codes", code_directory)
                 else:
                     files_folder = os.path.join(xml_cfg['XML_PATH'], "codes", code_directory, service_folder)
-                if os.path.exists(files_folder):
-                    files = [f for f in os.listdir(files_folder)
-                        if os.path.isfile(os.path.join(files_folder, f )) and 
-                        os.path.join(files_folder, f ).endswith(".cc")]
+                files = cached(data, 'code_files', lambda: list_code_files(files_folder))
+                if files is not None:
                     files = [''] + files
                     replace_exception_name = st.selectbox(label="No exception code found. Select the right code.", 
                                                     options=files, 
-                                                    key=f"disabled_{key_exception}_selectbox")
+                                                    key=scope.key("code_selectbox"))
                     if replace_exception_name != '':
                         try:
                             exception_id = exception_id.split('.')[0] + '.' + replace_exception_name.split('_')[1].split('.')[0]
                         except:
                             exception_id = exception_id.split('.')[0]
-                        exception_code, exception_name, code_dep = replace_print_code(exception=exception_id)
+                        exception_code, exception_name, code_dep = cached(
+                            data, f'code_{exception_id}', lambda: replace_print_code(exception=exception_id))
                 if not exception_code:
                     disabled = True
                 else:
@@ -140,8 +225,8 @@ def display_exception_details(exception):
                 .stButton > button {{
                     border-radius: 0.700rem;
                     transition: all 0.1s ease;
-                    background-color: {"#0059ff" if st.session_state[prompt_custom_key] else "white"};
-                    color: {"white" if st.session_state[prompt_custom_key] else "initial"};
+                    background-color: {"#0059ff" if state['prompt_custom'] else "white"};
+                    color: {"white" if state['prompt_custom'] else "initial"};
                     
                 }}
                 .stButton > button: hover {{
@@ -149,12 +234,12 @@ def display_exception_details(exception):
                 }}
                 """
             ):
-                if st.button(label='Custom prompt', key=f"prompt_{key_exception}_button",
+                if st.button(label='Custom prompt', key=scope.key("prompt_button"),
                             use_container_width=True, disabled=disabled):
-                    st.session_state[prompt_custom_key] = not st.session_state[prompt_custom_key]
-                    st.session_state[show_code_key] = False
-                    st.session_state[show_dep_key] = False
-                    st.rerun()
+                    state['prompt_custom'] = not state['prompt_custom']
+                    state['show_code'] = False
+                    state['show_dep'] = False
+                    rerun_panel()
 
         # BUTTON SHOW CODE
         with col2: 
@@ -164,8 +249,8 @@ def display_exception_details(exception):
                 .stButton > button {{
                     border-radius: 0.700rem;
                     transition: all 0.1s ease;
-                    background-color: {"#0059ff" if st.session_state[show_code_key] else "white"};
-                    color: {"white" if st.session_state[show_code_key] else "initial"};
+                    background-color: {"#0059ff" if state['show_code'] else "white"};
+                    color: {"white" if state['show_code'] else "initial"};
                     
                 }}
                 .stButton > button: hover {{
@@ -173,12 +258,12 @@ def display_exception_details(exception):
                 }}
                 """
             ):
-                if st.button(label='Show exception code', key=f"dep_{key_exception}_button",
+                if st.button(label='Show exception code', key=scope.key("code_button"),
                             use_container_width=True, disabled=disabled):
-                    st.session_state[show_code_key] = not st.session_state[show_code_key]
-                    st.session_state[prompt_custom_key] = False
-                    st.session_state[show_dep_key] = False
-                    st.rerun()
+                    state['show_code'] = not state['show_code']
+                    state['prompt_custom'] = False
+                    state['show_dep'] = False
+                    rerun_panel()
 
         # BUTTON SHOW DEPENDENCIES
         with col3:
@@ -188,8 +273,8 @@ def display_exception_details(exception):
                 .stButton > button {{
                     border-radius: 0.700rem;
                     transition: all 0.1s ease;
-                    background-color: {"#0059ff" if st.session_state[show_dep_key] else "white"};
-                    color: {"white" if st.session_state[show_dep_key] else "initial"};
+                    background-color: {"#0059ff" if state['show_dep'] else "white"};
+                    color: {"white" if state['show_dep'] else "initial"};
                     
                 }}
                 .stButton > button: hover {{
@@ -197,12 +282,12 @@ def display_exception_details(exception):
                 }}
                 """
             ):
-                if st.button(label='Show includes code', key=f"codes_{key_exception}_button",
+                if st.button(label='Show includes code', key=scope.key("dep_button"),
                             use_container_width=True, disabled=disabled):
-                    st.session_state[show_dep_key] = not st.session_state[show_dep_key]
-                    st.session_state[prompt_custom_key] = False
-                    st.session_state[show_code_key] = False
-                    st.rerun()
+                    state['show_dep'] = not state['show_dep']
+                    state['prompt_custom'] = False
+                    state['show_code'] = False
+                    rerun_panel()
 
         # BUTTON AI
         with col4:
@@ -212,8 +297,8 @@ def display_exception_details(exception):
                 .stButton > button {{
                     border-radius: 0.700rem;
                     transition: all 0.1s ease;
-                    background-color: {"#0059ff" if st.session_state.llm_results[key_exception] else "white"};
-                    color: {"white" if st.session_state.llm_results[key_exception] else "initial"};
+                    background-color: {"#0059ff" if state['llm_result'] else "white"};
+                    color: {"white" if state['llm_result'] else "initial"};
                     
                 }}
                 .stButton > button: hover {{
@@ -221,170 +306,165 @@ def display_exception_details(exception):
                 }}
                 """
             ):
-                if st.button(label='Ask AI', key=f"AI_{key_exception}_button", 
+                if st.button(label='Ask AI', key=scope.key("ai_button"),
                             use_container_width=True, disabled=disabled):
                     result = llm_request(exception=exception_id, 
-                                        prompt_struct=st.session_state[prompt_value_key],
-                                        model_name=st.session_state[model_name_key])
-                    st.session_state.llm_results[key_exception] = result
-                    st.session_state[prompt_custom_key] = False
-                    st.session_state[show_code_key] = False
-                    st.session_state[show_dep_key] = False
-                    st.rerun()
+                                        prompt_struct=state['prompt_value'],
+                                        model_name=state['model_name'])
+                    state['llm_result'] = result
+                    state['prompt_custom'] = False
+                    state['show_code'] = False
+                    state['show_dep'] = False
+                    rerun_panel()
 
         st.write('')
         # RESULT CUSTOM PROMPT
-        if st.session_state[prompt_custom_key]:
+        if state['prompt_custom']:
             
-            prompt_struct_key = f"input_{key_exception}"
+            prompt_struct_key = scope.key("prompt_text_area")
 
-            saved_prompt = manage_json.get_exception_value(module_name=code_directory,
-                                                                condition_id=exception_id,
-                                                                group=exception['condition_group'],
-                                                                value_name='prompt')
+            saved_prompt = cached(data, 'prompt', lambda: manage_json.get_exception_value(
+                module_name=code_directory,
+                condition_id=exception_id,
+                group=exception.condition_group,
+                value_name='prompt'))
 
             if saved_prompt:
-                st.session_state[prompt_value_key] = saved_prompt
+                state['prompt_value'] = saved_prompt
             
             st.write('')
             prompt1, prompt2, prompt3, prompt4 = st.columns(4)
 
             with prompt1:
                 if st.button(label="Modify prompt", 
-                             key=f"change_prompt_{key_exception}_button",
+                             key=scope.key("change_prompt_button"),
                              use_container_width=True):
-                    st.session_state[text_area_visible_key] = not st.session_state[text_area_visible_key]
+                    state['text_area_visible'] = not state['text_area_visible']
             
             
-            st.session_state[model_name_key] = st.selectbox(
+            state['model_name'] = st.selectbox(
                 label="Model:", 
-                options=model_names, 
-                key=f"model_name_{key_exception}"
+                options=MODEL_NAMES, 
+                key=scope.key("model_name")
             )
 
-            if st.session_state[text_area_visible_key]:
-                st.session_state[prompt_value_key] = st.text_area(label="Prompt:", value=st.session_state[prompt_value_key], key=prompt_struct_key)
+            if state['text_area_visible']:
+                state['prompt_value'] = st.text_area(label="Prompt:", value=state['prompt_value'], key=prompt_struct_key)
             else:
-                st.code(f"{st.session_state[prompt_value_key]}  \n\nPart 1:  \nFile: {exception_name}  \nCode:  \n{exception_code}  \n\nPart 2:  \nCode:  \n{code_dep}", 
+                st.code(f"{state['prompt_value']}  \n\nPart 1:  \nFile: {exception_name}  \nCode:  \n{exception_code}  \n\nPart 2:  \nCode:  \n{code_dep}", 
                         language='markdown')
             
             with prompt2:
                 if st.button(label="Save for later",
-                             key=f"save_prompt_{key_exception}_button",
+                             key=scope.key("save_prompt_button"),
                              use_container_width=True):
                     manage_json.update_json_value(module_name=code_directory,
                                                     condition_id=exception_id,
-                                                    group=exception['condition_group'],
+                                                    group=exception.condition_group,
                                                     to_change='prompt',
-                                                    value=st.session_state[prompt_value_key])
-                    st.session_state[prompt_value_key] = saved_prompt
-                    st.session_state[text_area_visible_key] = None
-                    st.rerun()
+                                                    value=state['prompt_value'])
+                    data.clear('prompt')
+                    state['prompt_value'] = saved_prompt
+                    state['text_area_visible'] = None
+                    rerun_panel()
 
         # RESULT SHOW CODE
-        if st.session_state[show_code_key]:
+        if state['show_code']:
             st.code(f"File: {exception_name}  \nCode:  \n{exception_code}", language='cpp')
 
         # RESULT SHOW DEP
-        if st.session_state[show_dep_key]:
+        if state['show_dep']:
             st.code(code_dep, language='cpp')
 
         # IA RESULT
         ai_result = None 
 
-        if code_directory:
-            existing_explanation = manage_json.get_exception_value(module_name=code_directory,
-                                                                    condition_id=exception_id,
-                                                                    group=exception['condition_group'],
-                                                                    value_name='ai_explanation')
-        else:
-            existing_explanation = None
-
         # Initialize session state for existing_explanation, only if it doesn't exist
-        if f"existing_explanation_{key_exception}" not in st.session_state:
-            st.session_state[f"existing_explanation_{key_exception}"] = existing_explanation
+        if 'existing_explanation' not in state:
+            if code_directory:
+                existing_explanation = manage_json.get_exception_value(module_name=code_directory,
+                                                                        condition_id=exception_id,
+                                                                        group=exception.condition_group,
+                                                                        value_name='ai_explanation')
+            else:
+                existing_explanation = None
+            state['existing_explanation'] = existing_explanation
 
         # Sync ai_result with existing explanation in session state
-        ai_result = st.session_state[f"existing_explanation_{key_exception}"]
+        ai_result = state['existing_explanation']
 
-        # If no explanation exists in manage_json, try to load from st.session_state.llm_results
-        if ai_result is None and key_exception in st.session_state.llm_results:
-            ai_result = st.session_state.llm_results[key_exception]
+        # If no explanation exists in manage_json, fall back on the last AI answer
+        if ai_result is None:
+            ai_result = state['llm_result']
 
 
         if ai_result:
-            if (st.session_state.llm_results[key_exception] and 
-                st.session_state[f"existing_explanation_{key_exception}"] and
-                st.session_state[f"existing_explanation_{key_exception}"] != st.session_state.llm_results[key_exception]):
+            if (state['llm_result'] and 
+                state['existing_explanation'] and
+                state['existing_explanation'] != state['llm_result']):
                 st.write('**Select which response you want to keep.**')
                 st.write("Saved explanation.")
-                button_choice_1 = st.checkbox(st.session_state[f"existing_explanation_{key_exception}"], key=f"choice1_{key_exception}_button")
+                button_choice_1 = st.checkbox(state['existing_explanation'], key=scope.key("choice1_checkbox"))
                 st.divider()
                 st.write("New explanation.")
-                button_choice_2 = st.checkbox(st.session_state.llm_results[key_exception], key=f"choice2_{key_exception}_button")
+                button_choice_2 = st.checkbox(state['llm_result'], key=scope.key("choice2_checkbox"))
 
                 if button_choice_1:
-                    st.session_state.llm_results[key_exception] = st.session_state[f"existing_explanation_{key_exception}"]
-                    st.rerun()
+                    state['llm_result'] = state['existing_explanation']
+                    rerun_panel()
                 elif button_choice_2:
-                    st.session_state[f"existing_explanation_{key_exception}"] = st.session_state.llm_results[key_exception]
-                    st.rerun()
+                    state['existing_explanation'] = state['llm_result']
+                    rerun_panel()
 
             # If ai_result is not None, you might want to set a default value or skip the rest of the code
             else:
-                # Initialize a state to track if the explanation is being modified
-                if f"is_modifying_{key_exception}" not in st.session_state:
-                    st.session_state[f"is_modifying_{key_exception}"] = False
-
                 st.write('')
                 col1ai, col6ai, col7ai, col8ai = st.columns(4)
 
                 # Display ai_result by default IF the text area is not displayed
-                if not st.session_state[f"is_modifying_{key_exception}"]:
+                if not state['is_modifying']:
                     st.write(ai_result)
 
                 with col1ai:
                     # Modify button clicked
-                    modify_button = st.button(label='Modify', key=f"modify_explanation{key_exception}_button",
+                    modify_button = st.button(label='Modify', key=scope.key("modify_explanation_button"),
                                             use_container_width=True)
 
                     # Toggle the modification state if Modify is clicked
                     if modify_button:
-                        st.session_state[f"is_modifying_{key_exception}"] = not st.session_state[
-                            f"is_modifying_{key_exception}"]
-                        st.rerun()  # Rerun to update the UI
+                        state['is_modifying'] = not state['is_modifying']
+                        rerun_panel()  # Rerun to update the UI
 
                 # Display the text area if modification is in progress
-                if st.session_state[f"is_modifying_{key_exception}"]:
+                if state['is_modifying']:
                     ai_result = st.text_area(label='AI explanation',
-                                            key=f"modify_explanation{key_exception}_text_area",
+                                            key=scope.key("explanation_text_area"),
                                             value=ai_result)  # Update ai_result with the text area value
 
                 with col6ai:
                     # Save button (always visible)
-                    save_button = st.button(label='Validate', key=f"save_explanation{key_exception}_button",
+                    save_button = st.button(label='Validate', key=scope.key("save_explanation_button"),
                                             use_container_width=True)
 
                     # Save action (always performed if Save button is clicked AND text area is visible)
                     if save_button:
                         manage_json.update_json_value(module_name=code_directory,
                                                         condition_id=exception_id,
-                                                        group=exception['condition_group'],
+                                                        group=exception.condition_group,
                                                         to_change='ai_explanation',
                                                         value=ai_result)
 
                         # Update the session state with the new explanation
-                        st.session_state[f"existing_explanation_{key_exception}"] = ai_result
-                        st.session_state.llm_results[key_exception] = None
-                        st.session_state[f"is_modifying_{key_exception}"] = False  # Hide the text area after saving
-                        st.rerun()
+                        state['existing_explanation'] = ai_result
+                        state['llm_result'] = None
+                        state['is_modifying'] = False  # Hide the text area after saving
+                        rerun_panel()
 
                 with col7ai:
                     confluence_button = st.button(label='Send to Confluence',
-                                                key=f"confluence_{key_exception}_button",
+                                                key=scope.key("confluence_button"),
                                                 use_container_width=True,
-                                                disabled=not st.session_state[
-                                                    f"existing_explanation_{key_exception}"])
+                                                disabled=not state['existing_explanation'])
 
                     if confluence_button:
                         # rien pour l'instant
@@ -0,0 +1,73 @@
+import streamlit as st
+
+from sessionstate_manager import SessionStateManager
+
+
+# Etat du panneau d'impact, vidé au changement de workflow
+impact_state = SessionStateManager("node_impact")
+
+BRANCHES = {"Any branch": None, "Success": "Success", "Failure": "Failure"}
+MAX_ROWS = 1000
+MAX_SUGGESTIONS = 20
+
+
+def matching_nodes(graph, text: str) -> list:
+    """Premiers noeuds du graphe dont l'id contient 'text'."""
+    text = text.lower()
+    matches = []
+    for node in graph:
+        if text in str(node).lower():
+            matches.append(node)
+            if len(matches) == MAX_SUGGESTIONS:
+                break
+    return matches
+
+
+@st.fragment
+def display_node_impact(analysis, load_graph):
+    """
+    "If this node fails, which exceptions can fire?": exceptions downstream of a node, per branch,
+    read from the reachability index of the workflow.
+    'load_graph' runs a full analysis when the exceptions come from the catalogue (no graph).
+    """
+    if analysis.reachability is None:
+        if not analysis.from_catalogue:
+            st.write("The workflow graph could not be built.")
+            return
+        st.caption("Exceptions were loaded from the catalogue, without the workflow graph.")
+        if st.button("Build the workflow graph", key=impact_state.key("build")):
+            with st.spinner("Analyzing the workflow..."):
+                load_graph()
+            st.rerun()
+        return
+
+    graph = analysis.graph
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        text = st.text_input("Node", key=impact_state.key("node_text"), placeholder="Fork, operation or condition id")
+    with col2:
+        branch = st.radio("Branch", options=list(BRANCHES), key=impact_state.key("branch"), horizontal=True)
+    if not text:
+        return
+
+    node = text
+    if node not in graph:
+        matches = matching_nodes(graph, text)
+        if not matches:
+            st.write("No matching node.")
+            return
+        node = st.selectbox("Matching nodes", options=matches, key=impact_state.key("node"))
+
+    rows = analysis.reachability.downstream(node, BRANCHES[branch])
+    st.write(f"**{node}** ({graph.nodes[node].get('type', '?')}): {len(rows)} exception(s) downstream")
+    if not rows:
+        return
+    st.dataframe([{
+        "Condition": exception.display_id,
+        "Group": exception.condition_group,
+        "Type": exception.type,
+        "Text": exception.text,
+    } for exception in (analysis.exceptions[row] for row in rows[:MAX_ROWS])],
+        use_container_width=True, hide_index=True)
+    if len(rows) > MAX_ROWS:
+        st.caption(f"First {MAX_ROWS} exceptions shown.")
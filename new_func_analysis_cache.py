@@ -0,0 +1,165 @@
+import hashlib
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+import streamlit as st
+
+from config import app_cfg
+from func_catalogue import get_catalogue
+from func_exception_record import ExceptionRecord
+from func_exception_index import ExceptionIndex
+from func_graph_xml import WorkflowAnalysis, analyze_workflow
+from func_query import WorkflowQuery
+
+
+# Estimations grossières de l'empreinte mémoire d'un graphe networkx
+NODE_BYTES = 350
+EDGE_BYTES = 450
+
+
+class CachedWorkflow(NamedTuple):
+    analysis: WorkflowAnalysis
+    index: ExceptionIndex
+    size: int
+    query: WorkflowQuery
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def estimate_size(analysis: WorkflowAnalysis) -> int:
+    size = sys.getsizeof(analysis.exceptions)
+    for exception in analysis.exceptions:
+        size += sys.getsizeof(exception) + sys.getsizeof(exception.condition_id) + sys.getsizeof(exception.text)
+    if analysis.graph is not None:
+        size += analysis.graph.number_of_nodes() * NODE_BYTES + analysis.graph.number_of_edges() * EDGE_BYTES
+    if analysis.loops is not None:
+        # DAG condensé et table noeud -> composante
+        condensed = analysis.loops.condensed
+        size += (condensed.number_of_nodes() + analysis.graph.number_of_nodes()) * NODE_BYTES \
+            + condensed.number_of_edges() * EDGE_BYTES
+    if analysis.reachability is not None:
+        size += analysis.reachability.nbytes()
+    # L'index ajoute le texte de recherche et les listes par groupe / type
+    return size * 2
+
+
+# Catalogue illisible (corrompu, accès refusé...) : on se rabat sur l'analyse du XML
+CATALOGUE_ERRORS = (OSError, ValueError, struct.error)
+
+
+def catalogue_exceptions(catalogue, workflow_name: str, digest: str):
+    """Exceptions du workflow dans le catalogue, None si absentes ou si le catalogue ne peut pas être lu."""
+    try:
+        return catalogue.exceptions(workflow_name, digest)
+    except CATALOGUE_ERRORS as e:
+        print(f"Error reading '{workflow_name}' from the catalogue: {e}")
+        return None
+
+
+def load_analysis(xml_file: str, workflow_name: str, digest: str, use_catalogue: bool = True) -> WorkflowAnalysis:
+    catalogue = get_catalogue()
+    if workflow_name and use_catalogue:
+        exceptions = catalogue_exceptions(catalogue, workflow_name, digest)
+        if exceptions is not None:
+            return WorkflowAnalysis(graph=None, exceptions=tuple(ExceptionRecord.from_dict(e) for e in exceptions),
+                                    from_catalogue=True)
+
+    analysis = analyze_workflow(xml_file)
+    # Sans passer par le catalogue, l'analyse peut y être déjà
+    if workflow_name and analysis.graph is not None and (
+            use_catalogue or catalogue_exceptions(catalogue, workflow_name, digest) is None):
+        try:
+            catalogue.append(workflow_name, digest, [exception.to_dict() for exception in analysis.exceptions])
+        except CATALOGUE_ERRORS as e:
+            print(f"Error exporting '{workflow_name}' to the catalogue: {e}")
+    return analysis
+
+
+class AnalysisCache:
+    """
+    Cache des analyses de workflows commun à toutes les sessions du process.
+    Clé : hash du contenu du wfd. Eviction LRU au-delà de 'max_bytes'.
+    Une même analyse n'est construite qu'une fois, même si plusieurs sessions la demandent en même temps.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.building = {}
+
+    def get(self, xml_file: str, workflow_name: str = None, with_graph: bool = False) -> CachedWorkflow:
+        """
+        Analyse du wfd, depuis ce cache, sinon depuis le catalogue partagé entre process
+        (exceptions seules, sans graphe), sinon en analysant le XML puis en l'exportant au catalogue.
+        Avec 'with_graph', une analyse venue du catalogue est remplacée par une analyse complète du XML.
+        """
+        key = file_digest(xml_file)
+
+        def cached_entry():
+            entry = self.entries.get(key)
+            if entry is None or (with_graph and entry.analysis.from_catalogue):
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        with self.lock:
+            entry = cached_entry()
+            if entry is not None:
+                return entry
+            key_lock = self.building.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self.lock:
+                entry = cached_entry()
+                if entry is not None:
+                    return entry
+                self.misses += 1
+
+            analysis = load_analysis(xml_file, workflow_name, key, use_catalogue=not with_graph)
+            index = ExceptionIndex(list(analysis.exceptions))
+            entry = CachedWorkflow(analysis=analysis, index=index, size=estimate_size(analysis),
+                                   query=WorkflowQuery(index, analysis))
+
+            with self.lock:
+                previous = self.entries.pop(key, None)
+                if previous is not None:
+                    self.total_bytes -= previous.size
+                self.entries[key] = entry
+                self.total_bytes += entry.size
+                self.building.pop(key, None)
+                self._evict()
+        return entry
+
+    def _evict(self):
+        # L'entrée la plus récente est conservée même si elle dépasse seule le plafond
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry.size
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+@st.cache_resource
+def get_analysis_cache() -> AnalysisCache:
+    return AnalysisCache(max_bytes=app_cfg.get('ANALYSIS_CACHE_MB', 256) * 1024 * 1024)
@@ -0,0 +1,48 @@
+"""
+Ensembles de lignes en bitsets : un entier Python dont le bit i représente la ligne i.
+Un bitset décalé (décalage, bits) représente les lignes décalage + i : les ensembles de lignes contiguës
+restent petits quel que soit leur décalage.
+"""
+
+EMPTY = (0, 0)
+
+
+def rows_to_bitset(rows, row_count: int) -> int:
+    bits = bytearray((row_count + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitset_rows(bitset: int) -> list:
+    """Indices des bits à 1, par ordre croissant."""
+    digits = bin(bitset)[:1:-1]  # bit de poids faible en premier
+    rows = []
+    position = digits.find('1')
+    while position >= 0:
+        rows.append(position)
+        position = digits.find('1', position + 1)
+    return rows
+
+
+def offset_union(a: tuple, b: tuple) -> tuple:
+    """Union de deux bitsets décalés."""
+    a_low, a_bits = a
+    b_low, b_bits = b
+    if not a_bits:
+        return b
+    if not b_bits:
+        return a
+    low = min(a_low, b_low)
+    return low, (a_bits << (a_low - low)) | (b_bits << (b_low - low))
+
+
+def offset_bitset(bitset: tuple) -> int:
+    """Bitset décalé ramené à un bitset simple."""
+    low, bits = bitset
+    return bits << low
+
+
+def offset_rows(bitset: tuple) -> list:
+    low, bits = bitset
+    return [low + row for row in bitset_rows(bits)]
@@ -0,0 +1,205 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from config import app_cfg
+
+
+# Fichier append-only : en-tête puis une suite de segments, un par analyse de workflow.
+#   segment : en-tête SEGMENT | offsets des chaînes (uint32 x n+1) | chaînes utf-8 (alignées sur 4) | lignes (uint32 x 7)
+# Les chaînes 0 et 1 d'un segment sont le nom du workflow et le hash du wfd.
+# Pour un même workflow, le dernier segment écrit fait foi.
+MAGIC = b'XETCAT01'
+SEGMENT = struct.Struct('<4sIII')  # marqueur, nombre de lignes, nombre de chaînes, taille des chaînes
+SEGMENT_MARKER = b'SEGM'
+FIELDS = ('workflow', 'condition_id', 'condition_group', 'type', 'format', 'text', 'path')
+ROW = struct.Struct(f'<{len(FIELDS)}I')
+NONE_ID = 0xFFFFFFFF
+CATALOGUE_FILE = 'exceptions.catalogue'
+
+
+def encode_segment(workflow: str, digest: str, exceptions) -> bytes:
+    strings = [workflow, digest]
+    ids = {workflow: 0, digest: 1}
+
+    def string_id(value):
+        if value is None:
+            return NONE_ID
+        value = str(value)
+        if value not in ids:
+            ids[value] = len(strings)
+            strings.append(value)
+        return ids[value]
+
+    rows = bytearray()
+    for exception in exceptions:
+        values = [workflow] + [exception.get(field) for field in FIELDS[1:]]
+        rows += ROW.pack(*(string_id(v) for v in values))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    blob = b''.join(encoded)
+    blob += b'\0' * (-len(blob) % 4)
+
+    return (SEGMENT.pack(SEGMENT_MARKER, len(rows) // ROW.size, len(strings), len(blob))
+            + struct.pack(f'<{len(offsets)}I', *offsets) + blob + bytes(rows))
+
+
+class Segment:
+    """Vue sur un segment du fichier mappé ; les chaînes ne sont décodées qu'à la lecture."""
+
+    def __init__(self, buffer, offset: int):
+        marker, self.row_count, self.string_count, strings_size = SEGMENT.unpack_from(buffer, offset)
+        if marker != SEGMENT_MARKER:
+            raise ValueError(f"Corrupted catalogue segment at offset {offset}")
+        self.buffer = buffer
+        self.offsets_start = offset + SEGMENT.size
+        self.strings_start = self.offsets_start + 4 * (self.string_count + 1)
+        self.rows_start = self.strings_start + strings_size
+        self.end = self.rows_start + self.row_count * ROW.size
+        self.workflow = self.string(0)
+        self.digest = self.string(1)
+
+    def string(self, string_id: int):
+        if string_id == NONE_ID:
+            return None
+        start, end = struct.unpack_from('<II', self.buffer, self.offsets_start + 4 * string_id)
+        return bytes(self.buffer[self.strings_start + start:self.strings_start + end]).decode('utf-8')
+
+    def row(self, i: int) -> dict:
+        ids = ROW.unpack_from(self.buffer, self.rows_start + i * ROW.size)
+        return {field: self.string(string_id) for field, string_id in zip(FIELDS, ids)}
+
+    def rows(self):
+        for i in range(self.row_count):
+            yield self.row(i)
+
+
+class Catalogue:
+    """
+    Catalogue des exceptions analysées, partagé entre process via un fichier mappé en lecture seule.
+    Les écritures ajoutent un segment complet en un seul appel en mode append ; un segment incomplet
+    en fin de fichier (écriture en cours) est ignoré jusqu'au prochain refresh.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mapping = None
+        self.scanned = 0
+        self.latest = {}
+        self.lookup_index = {}  # workflow -> (condition_id, groupe) -> ligne, construit à la demande
+
+    def refresh(self):
+        """Mappe les segments ajoutés depuis le dernier appel (par ce process ou un autre)."""
+        with self.lock:
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                return
+            if size < len(MAGIC) or (self.mapping is not None and size == len(self.mapping)):
+                return
+            with open(self.path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapping[:len(MAGIC)] != MAGIC:
+                mapping.close()
+                raise ValueError(f"{self.path} is not an exception catalogue")
+
+            offset = max(self.scanned, len(MAGIC))
+            latest = dict(self.latest)
+            while offset + SEGMENT.size <= len(mapping):
+                segment = Segment(mapping, offset)
+                if segment.end > len(mapping):
+                    break
+                latest[segment.workflow] = segment
+                offset = segment.end
+
+            # Les segments déjà lus pointent vers l'ancien mapping : on les relit sur le nouveau
+            self.latest = {name: Segment(mapping, seg.offsets_start - SEGMENT.size) for name, seg in latest.items()}
+            self.mapping = mapping
+            self.scanned = offset
+            self.lookup_index = {}
+
+    def create(self):
+        """
+        Crée le fichier avec son en-tête s'il n'existe pas. Le fichier temporaire contenant l'en-tête est lié
+        sous le nom final (os.link échoue si un autre process l'a déjà créé) : le catalogue n'est jamais
+        visible sans en-tête, et aucun segment ne peut être écrit avant lui.
+        """
+        if os.path.exists(self.path):
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=CATALOGUE_FILE, suffix='.tmp')
+        try:
+            os.write(fd, MAGIC)
+            os.close(fd)
+            os.link(tmp_path, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    def append(self, workflow: str, digest: str, exceptions):
+        """Ajoute (ou remplace) l'analyse d'un workflow."""
+        data = encode_segment(workflow, digest, exceptions)
+        self.create()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | getattr(os, 'O_BINARY', 0))
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        self.refresh()
+
+    def segment(self, workflow: str, digest: str = None):
+        self.refresh()
+        segment = self.latest.get(workflow)
+        if segment is None or (digest is not None and segment.digest != digest):
+            return None
+        return segment
+
+    def workflows(self) -> list:
+        self.refresh()
+        return sorted(self.latest)
+
+    def exceptions(self, workflow: str, digest: str = None):
+        """Exceptions du workflow (None si absent ou si le wfd a changé depuis l'export)."""
+        segment = self.segment(workflow, digest)
+        if segment is None:
+            return None
+        return [{field: value for field, value in row.items() if field != 'workflow'} for row in segment.rows()]
+
+    def lookup(self, workflow: str, condition_id: str, group: str):
+        """Ligne du catalogue pour (condition_id, groupe) dans la dernière analyse de 'workflow'."""
+        self.refresh()
+        with self.lock:
+            segment = self.latest.get(workflow)
+            if segment is None:
+                return None
+            index = self.lookup_index.get(workflow)
+            if index is None:
+                index = {}
+                for i in range(segment.row_count):
+                    ids = ROW.unpack_from(segment.buffer, segment.rows_start + i * ROW.size)
+                    index.setdefault((segment.string(ids[1]), segment.string(ids[2])), i)
+                self.lookup_index[workflow] = index
+            found = index.get((condition_id, group))
+        if found is None:
+            return None
+        return segment.row(found)
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue(json_path: str = app_cfg['JSON_PATH']) -> Catalogue:
+    """Catalogue du process (un seul mapping par process)."""
+    global _catalogue
+    with _catalogue_lock:
+        if _catalogue is None:
+            _catalogue = Catalogue(os.path.normpath(os.path.join(json_path, CATALOGUE_FILE)))
+        return _catalogue
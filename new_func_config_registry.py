@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from config import app_cfg
+
+
+class ConfigFile:
+    """
+    Fichier JSON chargé une fois puis revalidé par un simple stat (date de modification et taille).
+    Les abonnés sont appelés avec (ancien contenu, nouveau contenu) à chaque changement détecté.
+    """
+
+    def __init__(self, path: str, default=None):
+        self.path = path
+        self.default = default
+        self.lock = threading.Lock()
+        self.signature = None
+        self.data = None
+        self.version = 0
+        self.subscribers = []
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            print(f"Avertissement: Le fichier JSON '{self.path}' n'existe pas.")
+        except json.JSONDecodeError:
+            print(f"Erreur: Le fichier JSON '{self.path}' est corrompu.")
+        return json.loads(json.dumps(self.default))
+
+    def get(self):
+        """Contenu du fichier, relu seulement s'il a changé depuis le dernier appel."""
+        signature = self._signature()
+        with self.lock:
+            if self.version and signature == self.signature:
+                return self.data
+            previous, self.data = self.data, self._load()
+            self.signature = signature
+            self.version += 1
+            changed = self.version > 1 and previous != self.data
+            data = self.data
+        if changed:
+            self._notify(previous, data)
+        return data
+
+    def save(self, data, indent: int = 4):
+        """Ecrit le fichier (remplacement atomique) et prévient les abonnés sans attendre le prochain stat."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, self.path)
+        with self.lock:
+            self.signature = None
+        self.get()
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def _notify(self, previous, data):
+        for callback in list(self.subscribers):
+            try:
+                callback(previous, data)
+            except Exception as e:
+                print(f"Config subscriber failed for {self.path}: {e}")
+
+
+class ConfigRegistry:
+    """Fichiers de configuration partagés par toutes les sessions du process, un ConfigFile par chemin."""
+
+    def __init__(self):
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def file(self, path: str, default=None) -> ConfigFile:
+        path = os.path.normpath(path)
+        with self.lock:
+            if path not in self.files:
+                self.files[path] = ConfigFile(path, default)
+            return self.files[path]
+
+    def get(self, path: str, default=None):
+        return self.file(path, default).get()
+
+    def subscribe(self, path: str, callback, default=None):
+        self.file(path, default).subscribe(callback)
+
+
+registry = ConfigRegistry()
+
+
+def prompt_config() -> ConfigFile:
+    return registry.file(app_cfg['JSON_PROMPT'], default={"prompt_default": ""})
+
+
+def stp_list_config(json_path: str = app_cfg['JSON_PATH']) -> ConfigFile:
+    return registry.file(os.path.join(json_path, 'stp_list.json'), default={"stp_list": []})
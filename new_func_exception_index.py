@@ -0,0 +1,63 @@
+from collections import Counter, defaultdict
+
+
+def assign_duplicate_ordinal(exception, seen_ids):
+    """Numérote les exceptions ayant le même condition_id et condition_group (0 pour la première)."""
+    key = (exception.condition_id, exception.condition_group)
+    ordinal = seen_ids[key] + 1 if key in seen_ids else 0
+    seen_ids[key] = ordinal
+    return exception.with_ordinal(ordinal) if ordinal != exception.ordinal else exception
+
+
+class ExceptionIndex:
+    """
+    Index précalculé des exceptions d'un workflow, construit une fois au chargement.
+    Les lignes sont ordonnées par groupe (ordre de première apparition) puis par ordre d'origine,
+    comme l'affichage groupé.
+    """
+
+    def __init__(self, exceptions: list):
+        seen_ids = {}
+        self.exceptions = [assign_duplicate_ordinal(exception, seen_ids) for exception in exceptions]
+
+        self.by_group = defaultdict(list)
+        self.by_type = defaultdict(set)
+        self.search_text = []
+        for row, exception in enumerate(self.exceptions):
+            self.by_group[exception.condition_group].append(row)
+            self.by_type[exception.type].add(row)
+            self.search_text.append(f"{exception.display_id} {exception.text or ''}".lower())
+
+        self.groups = list(self.by_group.keys())
+        self.types = sorted(t for t in self.by_type if t is not None)
+
+    def __len__(self):
+        return len(self.exceptions)
+
+    def filter(self, groups: list = None, types: list = None, text: str = '') -> list:
+        """Lignes correspondant à tous les filtres renseignés, dans l'ordre d'affichage."""
+        type_rows = set().union(*(self.by_type.get(t, ()) for t in types)) if types else None
+        needle = text.strip().lower()
+
+        rows = []
+        for group in self.groups:
+            if groups is not None and group not in groups:
+                continue
+            for row in self.by_group[group]:
+                if type_rows is not None and row not in type_rows:
+                    continue
+                if needle and needle not in self.search_text[row] and not self._path_matches(row, needle):
+                    continue
+                rows.append(row)
+        return rows
+
+    def _path_matches(self, row: int, needle: str) -> bool:
+        # Chemin construit seulement pour les lignes non trouvées par l'id ou le texte
+        path = self.exceptions[row].path
+        return path is not None and needle in str(path).lower()
+
+    def count_by_group(self, rows: list) -> Counter:
+        return Counter(self.exceptions[row].condition_group for row in rows)
+
+    def group_size(self, group: str) -> int:
+        return len(self.by_group.get(group, ()))
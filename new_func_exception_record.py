@@ -0,0 +1,64 @@
+import sys
+from dataclasses import dataclass, replace
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(frozen=True, slots=True)
+class ExceptionRecord:
+    """
+    Exception extraite d'un wfd. Immuable : les doublons (même condition_id et même groupe)
+    sont distingués par 'ordinal' au lieu de modifier condition_id.
+    """
+    condition_id: str
+    condition_group: str
+    type: str
+    format: str
+    text: str
+    path: object = None  # PathRef, chaîne (JSON / catalogue) ou None
+    ordinal: int = 0
+    loops: tuple = ()  # boucles (LoopRegion.id) traversées par le chemin, condition comprise ; hors schéma JSON
+
+    def __post_init__(self):
+        # Peu de valeurs distinctes : une seule chaîne partagée par valeur
+        for field in ('condition_group', 'type', 'format'):
+            object.__setattr__(self, field, _intern(getattr(self, field)))
+
+    @property
+    def display_id(self) -> str:
+        """Identifiant unique dans son groupe, au format historique 'id___N' pour les doublons."""
+        return f"{self.condition_id}___{self.ordinal}" if self.ordinal else self.condition_id
+
+    def with_ordinal(self, ordinal: int):
+        return replace(self, ordinal=ordinal)
+
+    def to_dict(self) -> dict:
+        """Schéma JSON des fichiers de module (le chemin est laissé tel quel, PathRef compris)."""
+        return {
+            "condition_id": self.condition_id,
+            "condition_group": self.condition_group,
+            "type": self.type,
+            "format": self.format,
+            "text": self.text,
+            "path": self.path,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        condition_id = data["condition_id"]
+        base_id, separator, ordinal = str(condition_id).rpartition('___')
+        if separator and ordinal.isdigit():
+            condition_id = base_id
+        else:
+            ordinal = ''
+        return cls(
+            condition_id=condition_id,
+            condition_group=data.get("condition_group", "None"),
+            type=data.get("type"),
+            format=data.get("format"),
+            text=data.get("text", "None"),
+            path=data.get("path"),
+            ordinal=int(ordinal) if ordinal.isdigit() else 0,
+        )
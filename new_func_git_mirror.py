@@ -0,0 +1,98 @@
+import os
+import subprocess
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def run_git(*args, git_dir: str = None):
+    command = ['git']
+    if git_dir:
+        command += ['--git-dir', git_dir]
+    result = subprocess.run(command + list(args), capture_output=True, check=True)
+    return result.stdout
+
+
+def update_mirror(url: str, mirror_path: str, ref: str = 'HEAD'):
+    """
+    Crée le miroir bare au premier appel puis le met à jour par 'git fetch' (seuls les deltas sont transférés).
+    Retourne l'id du commit pointé par 'ref'.
+    """
+    if not os.path.exists(os.path.join(mirror_path, 'HEAD')):
+        print(f"Cloning mirror of {url} into {mirror_path}")
+        os.makedirs(os.path.dirname(os.path.abspath(mirror_path)), exist_ok=True)
+        run_git('clone', '--mirror', '--quiet', url, mirror_path)
+    else:
+        print(f"Fetching mirror {mirror_path}")
+        run_git('fetch', '--prune', '--quiet', 'origin', git_dir=mirror_path)
+    return resolve_ref(mirror_path, ref)
+
+
+def resolve_ref(mirror_path: str, ref: str = 'HEAD'):
+    return run_git('rev-parse', f"{ref}^{{commit}}", git_dir=mirror_path).decode().strip()
+
+
+def list_tree(mirror_path: str, commit: str, paths: list):
+    """Fichiers des sous-arborescences 'paths' au commit donné : liste de (blob_id, taille, chemin)."""
+    output = run_git('ls-tree', '-r', '-z', '--long', commit, '--', *paths, git_dir=mirror_path)
+    files = []
+    for entry in output.split(b'\0'):
+        if not entry:
+            continue
+        meta, path = entry.split(b'\t', 1)
+        mode, object_type, blob_id, size = meta.split()
+        # Sous-modules et liens symboliques ignorés
+        if object_type != b'blob' or mode == b'120000':
+            continue
+        files.append((blob_id.decode(), int(size), path.decode('utf-8', errors='surrogateescape')))
+    return files
+
+
+def write_blobs(mirror_path: str, blobs: list):
+    """
+    Ecrit chaque (blob_id, chemin local) sur disque via un unique 'git cat-file --batch', par blocs.
+    Génère (chemin local, taille) après chaque fichier écrit.
+    En cas d'erreur (ou si l'appelant s'arrête avant la fin), le process est tué : il pourrait sinon rester
+    bloqué en écriture sur une sortie que plus personne ne lit.
+    """
+    if not blobs:
+        return
+    process = subprocess.Popen(['git', '--git-dir', mirror_path, 'cat-file', '--batch'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    completed = False
+    tmp_path = None
+    try:
+        for blob_id, filepath in blobs:
+            process.stdin.write(f"{blob_id}\n".encode())
+            process.stdin.flush()
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                raise RuntimeError(f"Missing object {blob_id} in mirror {mirror_path}")
+            size = int(header[2])
+
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            tmp_path = filepath + '.part'
+            with open(tmp_path, 'wb') as f:
+                remaining = size
+                while remaining:
+                    chunk = process.stdout.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise RuntimeError(f"Truncated object {blob_id} in mirror {mirror_path}")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            process.stdout.read(1)  # '\n' de fin d'objet
+            os.replace(tmp_path, filepath)
+            tmp_path = None
+            yield filepath, size
+        completed = True
+    finally:
+        if not completed:
+            process.kill()
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.stdout.close()
+        process.wait()
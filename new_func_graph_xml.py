@@ -1,20 +1,481 @@
-import xml.etree.ElementTree as ET
+import sys
+from typing import NamedTuple
 import networkx as nx
 from config import xml_cfg
+from func_bitset import EMPTY, offset_rows, offset_union
+from func_exception_record import ExceptionRecord
+from func_path_trie import PathTrie, PathRef
+from func_xml_engine import PARSE_ERRORS, get_engine
+
+
+class WorkflowAnalysis(NamedTuple):
+    """
+    Résultat de l'analyse d'un wfd. Partagé entre sessions : ne pas modifier.
+    'graph', 'loops' et 'reachability' valent None si le XML n'a pas pu être analysé ou si les exceptions viennent
+    du catalogue ('from_catalogue').
+    """
+    graph: nx.DiGraph
+    exceptions: tuple
+    loops: 'WorkflowLoops' = None
+    reachability: 'ReachabilityIndex' = None
+    from_catalogue: bool = False
+
+    @property
+    def unresolved_jumps(self) -> list:
+        """Jumps sans label correspondant : [(noeud source, location), ...]."""
+        return self.graph.graph.get("unresolved_jumps", []) if self.graph is not None else []
+
+
+def analyze_workflow(xml_file, memoize: bool = True):
+    """
+    Construit le graphe du workflow et en extrait les exceptions, en une seule lecture en flux du XML.
+    Les sous-arbres répétés partagent leurs conditions (voir stream_workflow), donc aussi leurs ExceptionRecord.
+    """
+    graph, start_id, conditions = stream_workflow(xml_file, memoize=memoize)
+    if graph is None:
+        return WorkflowAnalysis(graph=None, exceptions=())
+
+    loops = WorkflowLoops(graph)
+    paths = PathFinder(graph, start_id, PathTrie())
+    path_loops = {}
+    records = {}  # id de l'entrée de condition -> ExceptionRecord, une seule fois par entrée partagée
+    exceptions = []
+    for entry in conditions:
+        condition_id, condition_group, attributes = entry
+        if attributes is None:
+            continue
+        record = records.get(id(entry))
+        if record is None:
+            path = paths.path(condition_id)
+            record = records[id(entry)] = exception_record(condition_id, condition_group, attributes, path,
+                                                           loops.path_regions(path, condition_id, path_loops))
+        exceptions.append(record)
+    exceptions = tuple(exceptions)
+    return WorkflowAnalysis(graph=graph, exceptions=exceptions, loops=loops,
+                            reachability=ReachabilityIndex(loops, exceptions))
+
+
+class LoopRegion(NamedTuple):
+    """Boucle du workflow : composante fortement connexe à plusieurs noeuds (retry par jump / label) ou noeud
+    bouclant sur lui-même."""
+    id: int
+    members: tuple  # dans l'ordre d'insertion du graphe
+    entries: tuple  # membres atteints depuis l'extérieur de la boucle
+    exits: tuple  # membres ayant un successeur hors de la boucle
+    labels: tuple  # labels de la boucle (cibles des jumps)
+
+    def __str__(self):
+        return f"loop #{self.id} ({len(self.members)} nodes, entry {', '.join(map(str, self.entries)) or '-'})"
+
+
+class WorkflowLoops:
+    """
+    Composantes fortement connexes du graphe, calculées une fois par workflow, et DAG condensé
+    (un noeud par composante). Chaque boucle est résumée par une LoopRegion ; ses arêtes internes ne sont
+    listées qu'à la demande (expand), et les chemins peuvent être affichés boucles repliées (collapse).
+    """
+
+    def __init__(self, graph: nx.DiGraph):
+        self.graph = graph
+        self.condensed = nx.condensation(graph)
+        self.component = self.condensed.graph["mapping"]  # noeud -> composante
+
+        members = {}
+        for node in graph:
+            members.setdefault(self.component[node], []).append(node)
+        self.regions = {}  # composante -> LoopRegion
+        for component, nodes in members.items():
+            if len(nodes) == 1 and not graph.has_edge(nodes[0], nodes[0]):
+                continue
+            inside = set(nodes)
+            self.regions[component] = LoopRegion(
+                id=len(self.regions) + 1,
+                members=tuple(nodes),
+                entries=tuple(n for n in nodes if any(p not in inside for p in graph.predecessors(n))),
+                exits=tuple(n for n in nodes if any(s not in inside for s in graph.successors(n))),
+                labels=tuple(n for n in nodes if graph.nodes[n].get("type") == "label"),
+            )
+        self.by_id = {region.id: region for region in self.regions.values()}
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def region(self, node):
+        """LoopRegion contenant 'node', None hors boucle."""
+        component = self.component.get(node)
+        return self.regions.get(component) if component is not None else None
+
+    def expand(self, region_id: int) -> list:
+        """Arêtes internes d'une boucle : [(source, label, destination), ...]."""
+        region = self.by_id[region_id]
+        inside = set(region.members)
+        return [(src, data.get("label", ""), dst)
+                for src in region.members for dst, data in self.graph[src].items() if dst in inside]
+
+    def path_regions(self, path, target, memo: dict = None) -> tuple:
+        """
+        Identifiants des boucles traversées par un chemin (PathRef) puis par sa cible, dans l'ordre.
+        'memo' (index du trie -> boucles) évite de reparcourir les préfixes partagés entre chemins.
+        """
+        if path is None:
+            return ()
+        memo = {} if memo is None else memo
+        trie = path.trie
+        # Remonte jusqu'au premier préfixe déjà connu, puis complète en redescendant
+        pending = []
+        index = path.index
+        while index != trie.ROOT and index not in memo:
+            pending.append(index)
+            index = trie.parents[index]
+        regions = memo.get(index, ())
+        for index in reversed(pending):
+            regions = memo[index] = self._add_region(regions, trie.nodes[index])
+        return self._add_region(regions, target)
+
+    def _add_region(self, regions: tuple, node) -> tuple:
+        region = self.region(node)
+        if region is None or region.id in regions:
+            return regions
+        return regions + (region.id,)
+
+    def collapse(self, steps, target=None) -> str:
+        """Chemin affiché avec chaque passage dans une boucle replié en '[loop #N]'."""
+        parts = []
+        current = None
+        for node, label in list(steps) + ([(target, "")] if target is not None else []):
+            region = self.region(node)
+            if region is not None and region is current:
+                parts[-1] = f"[loop #{region.id}]/{label}" if label else f"[loop #{region.id}]"
+                continue
+            current = region
+            name = f"[loop #{region.id}]" if region is not None else node
+            parts.append(f"{name}/{label}" if label else name)
+        return " -> ".join(parts)
+
+
+class ReachabilityIndex:
+    """
+    Exceptions en aval de chaque noeud, précalculées une fois par workflow sur le DAG condensé : les composantes
+    sont parcourues en ordre topologique inverse et chacune reçoit l'union de ses propres exceptions et de
+    celles de ses successeurs. Une boucle partage donc un seul ensemble pour tous ses membres.
+    Ensembles en bitsets sur les lignes de 'exceptions' (ordre du document) : ceux d'un même sous-arbre étant
+    contigus, chaque bitset est gardé décalé de sa plus petite ligne, en couple (décalage, bits).
+    """
+
+    def __init__(self, loops: WorkflowLoops, exceptions: tuple):
+        self.graph = loops.graph
+        self.component = loops.component
+        self.exceptions = exceptions
+        condensed = loops.condensed
+        self.order = list(nx.topological_sort(condensed))
+
+        own = {}
+        for row, exception in enumerate(exceptions):
+            component = self.component.get(exception.condition_id)
+            if component is not None:
+                own[component] = offset_union(own.get(component, EMPTY), (row, 1))
+
+        self.reach = {}  # composante -> bitset, composantes sans exception en aval omises
+        for component in reversed(self.order):
+            bitset = own.get(component, EMPTY)
+            for successor in condensed.successors(component):
+                bitset = offset_union(bitset, self.reach.get(successor, EMPTY))
+            if bitset[1]:
+                self.reach[component] = bitset
+
+    def bitset(self, node, branch: str = None) -> tuple:
+        """
+        Exceptions atteignables depuis 'node' (y compris la sienne) ; avec 'branch' ('Success' / 'Failure'),
+        seulement celles atteignables en sortant par cette branche.
+        """
+        if node not in self.component:
+            return EMPTY
+        if branch is None:
+            return self.reach.get(self.component[node], EMPTY)
+        bitset = EMPTY
+        for successor, data in self.graph[node].items():
+            if data.get("label") == branch:
+                bitset = offset_union(bitset, self.reach.get(self.component[successor], EMPTY))
+        return bitset
+
+    def downstream(self, node, branch: str = None) -> list:
+        """Lignes (dans 'exceptions') des exceptions en aval de 'node', voir bitset()."""
+        return offset_rows(self.bitset(node, branch))
+
+    def count(self, node, branch: str = None) -> int:
+        return self.bitset(node, branch)[1].bit_count()
+
+    def nbytes(self) -> int:
+        return sum(sys.getsizeof(bits) for _, bits in self.reach.values()) + len(self.reach) * 100
+
+
+class PathFinder:
+    """
+    Premier chemin en profondeur d'abord (successeurs dans l'ordre d'insertion) de 'start' vers chaque cible.
+    Un seul parcours pour toutes les cibles, chaque noeud n'étant visité qu'une fois : linéaire même en
+    présence de boucles, là où la recherche avec retour arrière explosait. Sans cycle, le chemin trouvé est
+    le même qu'avec le retour arrière. Les chemins sont insérés dans 'trie' à la demande.
+    """
+
+    def __init__(self, graph: nx.DiGraph, start, trie: PathTrie):
+        self.graph = graph
+        self.trie = trie
+        self.parents = {}
+        self.indexes = {}  # noeud -> index du trie de son chemin
+        if start not in graph:
+            return
+        self.parents[start] = None
+        self.indexes[start] = trie.ROOT
+        stack = [(start, iter(graph.successors(start)))]
+        while stack:
+            node, successors = stack[-1]
+            for successor in successors:
+                if successor not in self.parents:
+                    self.parents[successor] = node
+                    stack.append((successor, iter(graph.successors(successor))))
+                    break
+            else:
+                stack.pop()
+
+    def path(self, target):
+        """PathRef du chemin vers 'target', None si elle n'est pas atteignable."""
+        if target not in self.parents:
+            return None
+        pending = []
+        node = target
+        while node not in self.indexes:
+            pending.append(node)
+            node = self.parents[node]
+        index = self.indexes[node]
+        for node in reversed(pending):
+            parent = self.parents[node]
+            # Chaque noeud n'est inséré qu'une fois (self.indexes) : pas de recherche d'étape identique
+            index = self.indexes[node] = self.trie.append(index, parent, self.graph[parent][node].get("label", ""))
+        return PathRef(self.trie, index)
+
+
+class JumpTable:
+    """
+    Table des labels d'un workflow, remplie pendant la lecture : chaque <jump location=...> est relié au noeud
+    de son <label id=...> en O(1). L'arête d'un jump vers un label pas encore lu est créée tout de suite, pour
+    garder l'ordre des successeurs (et donc les chemins) ; resolve() retire en fin de lecture les jumps restés
+    sans label et les retourne comme diagnostics.
+    """
+
+    def __init__(self, graph: nx.DiGraph):
+        self.graph = graph
+        self.labels = set()
+        self.pending = []  # (source, location) vers un label pas encore lu
+
+    def add_label(self, label_id):
+        self.labels.add(label_id)
+        self.graph.add_node(label_id, type="label")
+
+    def add_jump(self, source, location, edge_label=None):
+        if location not in self.labels:
+            self.pending.append((source, location))
+            if location is None:
+                return
+        self.graph.add_edge(source, location, label=edge_label if edge_label else "", jump=True)
+
+    def resolve(self) -> list:
+        unresolved = [(source, location) for source, location in self.pending if location not in self.labels]
+        for source, location in unresolved:
+            if location not in self.graph:
+                continue
+            if "type" not in self.graph.nodes[location]:
+                # Noeud créé par le jump seul
+                self.graph.remove_node(location)
+            elif self.graph.has_edge(source, location) and self.graph[source][location].get("jump"):
+                self.graph.remove_edge(source, location)
+        if unresolved:
+            print(f"{len(unresolved)} jump(s) sans label : "
+                  + ", ".join(f"{location} (depuis {source})" for source, location in unresolved[:10]))
+        self.graph.graph["unresolved_jumps"] = unresolved
+        return unresolved
+
+
+# Traitement des enfants d'un élément ouvert, selon son rôle dans le parcours du workflow
+EXPLORE, FORK, CONDITION, GROUP, IGNORE = range(5)
+# Balises ajoutées au graphe par explore_element, et traitement de leurs propres enfants
+EXPLORED_TAGS = {
+    "fork": FORK,
+    "condition": CONDITION,
+    "operation": EXPLORE,
+    "jump": IGNORE,
+    "end": IGNORE,
+    "conditionGroup": GROUP,
+    "label": EXPLORE,
+}
+
+
+class OpenElement:
+    """Elément ouvert de la pile : son rôle et, pour une condition, son entrée dans la liste des conditions."""
+    __slots__ = ('role', 'node_id', 'edge_label', 'seen', 'condition')
+
+    def __init__(self, role, node_id=None, edge_label=None, condition=None):
+        self.role = role
+        self.node_id = node_id
+        self.edge_label = edge_label
+        self.seen = set()
+        self.condition = condition
+
+
+def subtree_digest(element, children: list) -> int:
+    """Empreinte structurelle d'un sous-arbre : balise, attributs triés et empreintes des enfants."""
+    return hash((element.tag, tuple(sorted(element.attrib.items())), tuple(children)))
+
+
+def stream_workflow(xml_file, memoize: bool = True):
+    """
+    Version en flux de build_workflow_graph + extract_exceptions : les noeuds et arêtes sont créés à l'arrivée
+    des événements 'start', seule la pile des éléments ouverts est gardée et chaque élément terminé est libéré.
+    Les jumps sont reliés à leur label par une JumpTable, sans autre passe sur le XML.
+    Retourne (graphe, id du start, conditions) où conditions liste [condition_id, groupe, attributs de
+    l'exception ou None] dans l'ordre du document ; graphe None si le XML est illisible ou sans <start>.
+    Les branches success / failure d'un fork sont parcourues dans l'ordre du document (success d'abord dans
+    nos wfd, ce qui donne le même graphe que build_workflow_graph).
+    Avec 'memoize', l'empreinte structurelle de chaque sous-arbre est calculée à sa fermeture : les conditions
+    d'une copie d'un sous-arbre déjà vu sont remplacées par celles de la première copie (mêmes objets, dont
+    les textes d'exception).
+    Le graphe n'y gagne rien : ses noeuds sont identifiés par leur id et ont déjà été ajoutés à l'ouverture.
+    """
+    graph = nx.DiGraph()
+    jumps = JumpTable(graph)
+    conditions = []
+    elements = []  # éléments ouverts
+    stack = []  # rôle de chaque élément ouvert
+    ignored = OpenElement(IGNORE)  # partagé par les éléments sans rôle (ni condition)
+    start_id = None
+    started = False
+    children_digests = []  # empreintes des enfants déjà fermés de chaque élément ouvert
+    first_conditions = []  # taille de 'conditions' à l'ouverture de chaque élément
+    subtrees = {}  # empreinte -> (début, fin) dans 'conditions' de la première copie du sous-arbre
+
+    def add_child(parent, element):
+        """Equivalent d'une itération de explore_element : ajoute le noeud et retourne son rôle."""
+        tag = element.tag
+        if tag == "jump":
+            jumps.add_jump(parent.node_id, element.get("location"), parent.edge_label)
+            return OpenElement(IGNORE)
+        node_id = element.get("id")
+        if tag == "label":
+            jumps.add_label(node_id)
+        else:
+            graph.add_node(node_id, type=tag)
+        graph.add_edge(parent.node_id, node_id, label=parent.edge_label if parent.edge_label else "")
+        return OpenElement(EXPLORED_TAGS[tag], node_id)
+
+    try:
+        with open(xml_file, 'rb') as f:
+            for event, element in get_engine().iterparse(f, events=("start", "end")):
+                if event == "end":
+                    stack.pop()
+                    elements.pop()
+                    if memoize:
+                        digest = subtree_digest(element, children_digests.pop())
+                        if children_digests:
+                            children_digests[-1].append(digest)
+                        begin = first_conditions.pop()
+                        if begin < len(conditions):
+                            first = subtrees.setdefault(digest, (begin, len(conditions)))
+                            # Comparaison des conditions : une collision d'empreintes ne partage rien
+                            if first[0] != begin and conditions[first[0]:first[1]] == conditions[begin:]:
+                                conditions[begin:] = conditions[first[0]:first[1]]
+                    element.clear()
+                    if elements:
+                        del elements[-1][-1]
+                    continue
+
+                parent = stack[-1] if stack else None
+                tag = element.tag
+                opened = ignored
+                begin = len(conditions)
+
+                if parent is None:
+                    pass
+                elif not started and tag == "start":
+                    started = True
+                    start_id = element.get("id")
+                    graph.add_node(start_id, type="start")
+                    opened = OpenElement(EXPLORE, start_id)
+                elif parent.role == EXPLORE and tag in EXPLORED_TAGS:
+                    opened = add_child(parent, element)
+                elif parent.role in (FORK, CONDITION) and tag not in parent.seen and (
+                        tag == "success" or (tag == "failure" and parent.role == FORK)):
+                    # Seule la première branche de chaque type est explorée, comme avec find()
+                    parent.seen.add(tag)
+                    opened = OpenElement(EXPLORE, parent.node_id, "Success" if tag == "success" else "Failure")
+                elif parent.role == GROUP and tag == "condition":
+                    condition_id = element.get("id")
+                    graph.add_node(condition_id, type="condition")
+                    graph.add_edge(parent.node_id, condition_id)
+
+                # Exceptions : toutes les conditions du document, qu'elles soient dans le graphe ou non
+                if parent is not None and tag == "condition":
+                    if opened is ignored:
+                        opened = OpenElement(IGNORE)
+                    opened.condition = [element.get("id"), element.get("conditionG", "None"), None]
+                    conditions.append(opened.condition)
+                elif tag == "exception" and parent is not None and parent.condition is not None \
+                        and "exception" not in parent.seen:
+                    parent.seen.add("exception")
+                    parent.condition[2] = dict(element.attrib)
+
+                stack.append(opened)
+                elements.append(element)
+                if memoize:
+                    children_digests.append([])
+                    first_conditions.append(begin)
+    except PARSE_ERRORS as e:
+        print(f"Erreur lors de l'analyse du XML : {e}")
+        return None, None, []
 
+    if not started:
+        print("Élément <start> introuvable.")
+        return None, None, []
+    jumps.resolve()
+    return graph, start_id, conditions
+
+
+def exception_record(condition_id, condition_group, attributes, path, loops=()):
+    return ExceptionRecord(
+        condition_id=condition_id,
+        condition_group=condition_group,
+        type=attributes.get("type"),
+        format=attributes.get("format"),
+        text=attributes.get("text", "None"),
+        path=path,
+        loops=loops,
+    )
 
-def build_workflow_graph(xml_file):
 
+def find_path_with_labels(graph, start, end, trie: PathTrie):
+    """Premier chemin (profondeur d'abord) de start à end, sous forme de PathRef dans 'trie'."""
+    return PathFinder(graph, start, trie).path(end)
+
+
+def parse_xml(xml_file):
     try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-    except ET.ParseError as e:
+        return get_engine().parse(xml_file)
+    except PARSE_ERRORS as e:
         print(f"Erreur lors de l'analyse du XML : {e}")
         return None
 
-    graph = nx.DiGraph() 
 
-    start_node = root.find(".//start")
+def build_workflow_graph(xml_file, root=None):
+
+    root = parse_xml(xml_file) if root is None else root
+    if root is None:
+        return None
+
+    graph = nx.DiGraph()
+    jumps = JumpTable(graph)
+
+    start_node = get_engine().find_first(root, "start")
     if start_node is None:
         print("Élément <start> introuvable.")
         return None
@@ -46,9 +507,7 @@ def build_workflow_graph(xml_file):
                 explore_element(child, operation_id)
 
             elif child.tag == "jump":
-                target_location = child.get("location")
-                graph.add_node(target_location, type="jump")
-                graph.add_edge(source_node_id, target_location, label=edge_label if edge_label else "")
+                jumps.add_jump(source_node_id, child.get("location"), edge_label)
 
             elif child.tag == "end":
                 end_id = child.get("id")
@@ -63,7 +522,7 @@ def build_workflow_graph(xml_file):
 
             elif child.tag == "label":
                 label_id = child.get("id")
-                graph.add_node(label_id, type="label")
+                jumps.add_label(label_id)
                 graph.add_edge(source_node_id, label_id, label=edge_label if edge_label else "")
                 explore_element(child, label_id)
 
@@ -90,71 +549,30 @@ def build_workflow_graph(xml_file):
                 graph.add_edge(condition_group_id, condition_id)
 
     explore_element(start_node, start_id)
+    jumps.resolve()
 
     return graph
 
 
-def extract_exceptions(graph, xml_file):
+def extract_exceptions(graph, xml_file, root=None):
 
-    try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-    except ET.ParseError as e:
-        print(f"Erreur lors de l'analyse du XML : {e}")
+    root = parse_xml(xml_file) if root is None else root
+    if root is None:
         return []
+    engine = get_engine()
 
     exceptions_data = []
 
-    def find_path_with_labels(graph, start, end):
-        def get_path_with_labels(current, target, visited, path):
-            visited.add(current)
-    
-            if current == target:
-                return True
-    
-            for neighbor in graph.successors(current):
-                edge_label = graph.get_edge_data(current, neighbor).get("label", "")
-                if neighbor not in visited:
-                    path.append((current, edge_label, neighbor))
-                    if get_path_with_labels(neighbor, target, visited, path):
-                        return True
-                    path.pop()
-    
-            visited.remove(current)
-            return False
-    
-        visited = set()
-        path = []
-        found = get_path_with_labels(start, end, visited, path)
-    
-        if not found:
-            return None
-    
-        formatted = []
-        for src, label, dst in path:
-            if label:
-                label = '/' + label
-            else:
-                label = ''
-            formatted.append(f"{src}{label}")
-        return " -> ".join(formatted)
-
-
-    for condition in root.findall(".//condition"):
+    start_node = engine.find_first(root, "start")
+    if start_node is None:
+        return []
+    paths = PathFinder(graph, start_node.get("id"), PathTrie())
+    for condition in engine.find_all(root, "condition"):
         exception_element = condition.find("exception")
         if exception_element is not None:
             condition_id = condition.get("id")
-            start_node_id = root.find(".//start").get("id")
-            path = find_path_with_labels(graph, start_node_id, condition_id)
-
-            exception_info = {
-                "condition_id": condition_id,
-                "condition_group": condition.get("conditionG", "None"),
-                "type": exception_element.get("type"),
-                "format": exception_element.get("format"),
-                "text": exception_element.get("text", "None"),
-                "path": path,
-            }
-            exceptions_data.append(exception_info)
+            path = paths.path(condition_id)
+            exceptions_data.append(exception_record(condition_id, condition.get("conditionG", "None"),
+                                                    exception_element.attrib, path))
 
     return exceptions_data
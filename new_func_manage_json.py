@@ -1,6 +1,10 @@
 import json
 import os
+import struct
 from config import app_cfg
+from func_catalogue import FIELDS as CATALOGUE_FIELDS, get_catalogue
+from func_config_registry import stp_list_config
+from func_path_trie import PathTrie, PathRef
 
 class JsonManager:
     """
@@ -50,8 +54,15 @@ class JsonManager:
         else:
             data = {"exceptions": []}  # Initialize with an empty list of exceptions
 
+        # Paths are stored as indexes into the module's path trie
+        trie = PathTrie.from_list(data.get("path_trie", []))
+
+        def comparable(exception):
+            # Compare on the materialized path, whatever the storage format (older files hold strings)
+            return json.dumps({**exception, "path": self._path_string(exception.get("path"), trie)}, sort_keys=True)
+
         # Convert existing exceptions to a set for efficient duplicate checking
-        existing_exceptions = set(json.dumps(ex, sort_keys=True) for ex in data.get("exceptions", []))
+        existing_exceptions = set(comparable(ex) for ex in data.get("exceptions", []))
         new_exceptions = []
         for exception in exceptions_data:
             # Initialize 'ai_explanation' if it doesn't exist
@@ -59,16 +70,48 @@ class JsonManager:
                 exception["prompt"] = None
             if "ai_explanation" not in exception:
                 exception["ai_explanation"] = None
-            if json.dumps(exception, sort_keys=True) not in existing_exceptions:
-                new_exceptions.append(exception)
+            stored = dict(exception)
+            if isinstance(stored.get("path"), PathRef):
+                stored["path"] = trie.insert(stored["path"].steps())
+            # Only entries already saved are skipped: duplicates within the batch are kept, as before
+            if comparable(stored) not in existing_exceptions:
+                new_exceptions.append(stored)
 
         # Add the new exceptions
         if new_exceptions:
             data["exceptions"] = data.get("exceptions", []) + new_exceptions  # Append, don't overwrite
+        self._choose_path_storage(data, trie)
 
         self.save_json(module_name, data)  # Save the updated JSON for this module
         print(f"Exceptions for '{module_name}' added/updated in '{self._get_json_file_path(module_name)}'.")
 
+    @classmethod
+    def _choose_path_storage(cls, data: dict, trie: PathTrie):
+        # The trie only pays off for long paths sharing prefixes: when it is not smaller than
+        # the strings it replaces, every path of the module is stored as a plain string
+        data.pop("path_trie", None)
+        if not len(trie):
+            return
+        references = [ex for ex in data.get("exceptions", []) if cls._is_trie_index(ex.get("path"))]
+        lengths = trie.path_lengths()
+        strings_size = sum(lengths[ex["path"]] + len('""') for ex in references)
+        trie_list = trie.to_list()
+        if strings_size > len(json.dumps(trie_list, indent=4)):
+            data["path_trie"] = trie_list
+            return
+        for ex in references:
+            ex["path"] = trie.materialize(ex["path"])
+
+    @staticmethod
+    def _is_trie_index(path) -> bool:
+        return isinstance(path, int) and not isinstance(path, bool)
+
+    @classmethod
+    def _path_string(cls, path, trie: PathTrie):
+        if cls._is_trie_index(path):
+            return trie.materialize(path)
+        return path
+
     def module_exists(self, module_name: str) -> bool:
         
         file_path = self._get_json_file_path(module_name)
@@ -92,11 +135,23 @@ class JsonManager:
 
     def get_exception_value(self, module_name: str, condition_id: str, group: str, value_name: str):
 
+        # Champs d'analyse : lus dans le catalogue mappé (analyse du même module) plutôt qu'en rechargeant le JSON
+        if value_name in CATALOGUE_FIELDS:
+            try:
+                row = get_catalogue().lookup(module_name, condition_id, group)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"Error reading the catalogue: {e}")
+                row = None
+            if row is not None:
+                return row[value_name]
+
         data = self.load_json(module_name)
         if "exceptions" in data:
             for exception in data["exceptions"]:
                 if ("condition_id" in exception and exception["condition_id"] == condition_id and
                     "condition_group" in exception and exception["condition_group"] == group):  # Added group check
+                    if value_name == "path" and "path" in exception:
+                        return self._path_string(exception["path"], PathTrie.from_list(data.get("path_trie", [])))
                     if value_name in exception:
                         return exception[value_name]
                     else:
@@ -109,46 +164,26 @@ class JsonManager:
             return None
         
     def change_stp_list(stp_list: list, json_path: str = app_cfg['JSON_PATH']):
-        json_path = os.path.normpath(os.path.join(json_path, 'stp_list.json'))
+        config = stp_list_config(json_path)
         try:
-            if os.path.exists(json_path):
-                with open(json_path, 'r') as f:
-                    try:
-                        data = json.load(f)
-                    except json.JSONDecodeError:
-                        print(f"Erreur: Le fichier JSON '{json_path}' est corrompu.  Il sera réinitialisé.")
-                        data = {"stp_list": []}
-            else:
-                data = {"stp_list": []}
-
+            data = dict(config.get())
             data["stp_list"] = stp_list
+            config.save(data, indent=2)
 
-            with open(json_path, 'w') as f:
-                json.dump(data, f, indent=2)  
-
-            print(f"La liste 'stp_list' a été mise à jour dans '{json_path}'.")
+            print(f"La liste 'stp_list' a été mise à jour dans '{config.path}'.")
 
         except Exception as e:
             print(f"Une erreur s'est produite : {e}")
 
     def get_stp_list(json_path: str = app_cfg['JSON_PATH']):
-        json_path = os.path.normpath(os.path.join(json_path, 'stp_list.json'))
+        # Fichier relu seulement s'il a changé (stat), les appels répétés ne coûtent qu'un stat
+        config = stp_list_config(json_path)
         try:
-            if os.path.exists(json_path):
-                with open(json_path, 'r') as f:
-                    try:
-                        data = json.load(f)
-                        if "stp_list" in data:
-                            return data["stp_list"]
-                        else:
-                            print(f"Avertissement: Le fichier JSON '{json_path}' ne contient pas la clé 'stp_list'. Retourne une liste vide.")
-                            return []
-                    except json.JSONDecodeError:
-                        print(f"Erreur: Le fichier JSON '{json_path}' est corrompu. Retourne une liste vide.")
-                        return []
-            else:
-                print(f"Avertissement: Le fichier JSON '{json_path}' n'existe pas. Retourne une liste vide.")
-                return []
+            data = config.get()
+            if "stp_list" in data:
+                return list(data["stp_list"])
+            print(f"Avertissement: Le fichier JSON '{config.path}' ne contient pas la clé 'stp_list'. Retourne une liste vide.")
+            return []
         except Exception as e:
             print(f"Une erreur s'est produite : {e}. Retourne une liste vide.")
             return []
@@ -0,0 +1,107 @@
+import sys
+from array import array
+
+
+class PathTrie:
+    """
+    Chemins depuis le start partagés sous forme d'arbre de préfixes.
+    Chaque noeud du trie est une étape (noeud du graphe, label de la branche prise) et pointe vers son parent :
+    les chemins de conditions voisines ne stockent leur préfixe commun qu'une fois.
+    Les étapes sont rangées en tableaux parallèles (parent, noeud, label) : une vingtaine d'octets par étape,
+    les noms étant partagés avec le graphe. L'index de déduplication n'est construit qu'au premier add().
+    """
+
+    ROOT = 0
+
+    def __init__(self):
+        self.parents = array('i', [-1])
+        self.nodes = [None]
+        self.labels = [None]
+        self._children = None
+
+    def __len__(self):
+        return len(self.nodes) - 1
+
+    def append(self, parent: int, node: str, label: str) -> int:
+        """Ajoute une étape sans chercher d'étape identique : l'appelant sait qu'elle est nouvelle."""
+        index = len(self.nodes)
+        self.parents.append(parent)
+        self.nodes.append(node)
+        self.labels.append(label)
+        if self._children is not None:
+            self._children[(parent, node, label)] = index
+        return index
+
+    def add(self, parent: int, node: str, label: str) -> int:
+        """Etape (parent, noeud, label), réutilisée si elle existe déjà."""
+        if self._children is None:
+            self._children = {(self.parents[i], self.nodes[i], self.labels[i]): i for i in range(1, len(self.nodes))}
+        index = self._children.get((parent, node, label))
+        if index is None:
+            index = self.append(parent, node, label)
+        return index
+
+    def insert(self, steps) -> int:
+        index = self.ROOT
+        for node, label in steps:
+            index = self.add(index, node, label)
+        return index
+
+    def path_steps(self, index: int) -> list:
+        steps = []
+        while index != self.ROOT:
+            steps.append((self.nodes[index], self.labels[index]))
+            index = self.parents[index]
+        steps.reverse()
+        return steps
+
+    def materialize(self, index: int) -> str:
+        return " -> ".join(f"{node}/{label}" if label else node for node, label in self.path_steps(index))
+
+    def path_lengths(self) -> list:
+        """Longueur de la chaîne matérialisée de chaque chemin du trie, sans construire les chaînes."""
+        lengths = [0] * len(self.nodes)
+        for i in range(1, len(self.nodes)):
+            # Un parent est toujours ajouté avant ses enfants
+            parent = self.parents[i]
+            step = len(self.nodes[i]) + (len(self.labels[i]) + 1 if self.labels[i] else 0)
+            lengths[i] = step if parent == self.ROOT else lengths[parent] + len(" -> ") + step
+        return lengths
+
+    def to_list(self) -> list:
+        """Sérialisation compacte : [[parent, noeud, label], ...] (le noeud racine est omis)."""
+        return [[self.parents[i], self.nodes[i], self.labels[i]] for i in range(1, len(self.nodes))]
+
+    @classmethod
+    def from_list(cls, items: list):
+        trie = cls()
+        for parent, node, label in items:
+            trie.add(parent, *(sys.intern(v) if isinstance(v, str) else v for v in (node, label)))
+        return trie
+
+
+class PathRef:
+    """Référence vers un chemin du trie ; la chaîne n'est construite qu'à l'affichage ou à l'export."""
+
+    __slots__ = ('trie', 'index')
+
+    def __init__(self, trie: PathTrie, index: int):
+        self.trie = trie
+        self.index = index
+
+    def steps(self) -> list:
+        return self.trie.path_steps(self.index)
+
+    def __str__(self):
+        return self.trie.materialize(self.index)
+
+    def __repr__(self):
+        return f"PathRef({str(self)!r})"
+
+    def __eq__(self, other):
+        if isinstance(other, PathRef):
+            return self.steps() == other.steps()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self.steps()))
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import numpy as np
+
+
+NO_VALUE = -1  # condition sans contrainte sur le champ
+MAX_CELLS = 8_000_000  # taille max d'un bloc événements x conditions décompressé en une fois
+
+
+class PrefilterEngine:
+    """
+    Plan d'évaluation compilé des prefilters de toutes les entités.
+    Chaque champ a un dictionnaire valeur -> code et une table code -> bits des conditions satisfaites
+    (toujours à 1 pour les conditions qui ne contraignent pas le champ ; la dernière ligne sert aux valeurs
+    inconnues). Un lot d'événements est encodé puis évalué par un ET vectorisé NumPy des lignes de table
+    de chaque champ, bits des conditions compressés en octets.
+    Une condition sans aucun 'champ==valeur' (ex : NO_CONDITION) capture tous les événements.
+    Une condition qui ne peut jamais être vraie (même champ exigé à deux valeurs) ou qu'on ne sait pas évaluer
+    (clause autre que '==', ex : 'A!=1') ne capture aucun événement ; les secondes sont listées dans 'unevaluable'.
+    """
+
+    def __init__(self, prefilters_by_entity: dict):
+        self.entities = []
+        self.conditions = []
+        self.unevaluable = []
+        parsed = []
+        possible = []
+        for entity, conditions in prefilters_by_entity.items():
+            for condition in conditions:
+                self.entities.append(entity)
+                self.conditions.append(condition)
+                clauses, unsupported = condition_clauses(condition)
+                if unsupported:
+                    self.unevaluable.append((entity, condition, unsupported))
+                parts = {}
+                for name, value in clauses:
+                    parts.setdefault(name, set()).add(value)
+                # ET de plusieurs égalités sur un même champ : jamais vrai si les valeurs diffèrent
+                possible.append(not unsupported and all(len(values) == 1 for values in parts.values()))
+                parsed.append({name: values.pop() for name, values in parts.items() if len(values) == 1})
+        # Bits des conditions qui peuvent être vraies : point de départ du ET de chaque bloc
+        self.possible = np.packbits(np.array(possible, dtype=bool), bitorder='little')
+
+        self.fields = sorted({name for parts in parsed for name in parts})
+        field_index = {field: f for f, field in enumerate(self.fields)}
+        self.codes = {field: {} for field in self.fields}
+        self.required = np.full((len(self.fields), len(parsed)), NO_VALUE, dtype=np.int32)
+        for row, parts in enumerate(parsed):
+            for name, value in parts.items():
+                codes = self.codes[name]
+                self.required[field_index[name], row] = codes.setdefault(value, len(codes))
+
+        self.tables = {}
+        for f, field in enumerate(self.fields):
+            unconstrained = self.required[f] == NO_VALUE
+            table = np.repeat(unconstrained[None, :], len(self.codes[field]) + 1, axis=0)
+            constrained = np.flatnonzero(~unconstrained)
+            table[self.required[f, constrained], constrained] = True
+            self.tables[field] = np.packbits(table, axis=1, bitorder='little')
+
+    def __len__(self):
+        return len(self.conditions)
+
+    def encode(self, records: dict, start: int, stop: int) -> dict:
+        """Codes des valeurs des événements [start, stop) pour chaque champ utilisé par les prefilters."""
+        encoded = {}
+        for field in self.fields:
+            column = records.get(field)
+            codes = self.codes[field]
+            unknown = len(codes)
+            if column is None:
+                encoded[field] = np.full(stop - start, unknown, dtype=np.int32)
+            else:
+                encoded[field] = np.fromiter(
+                    (unknown if v is None else codes.get(str(v).strip(), unknown) for v in column[start:stop]),
+                    dtype=np.int32, count=stop - start)
+        return encoded
+
+    def match_blocks(self, records: dict):
+        """Génère (début, masque booléen événements x conditions) par blocs d'événements."""
+        record_count = records_length(records)
+        block_size = max(1, MAX_CELLS // max(1, len(self.conditions)))
+        for start in range(0, record_count, block_size):
+            stop = min(start + block_size, record_count)
+            encoded = self.encode(records, start, stop)
+            packed = np.repeat(self.possible[None, :], stop - start, axis=0)
+            for field, table in self.tables.items():
+                packed &= table[encoded[field]]
+            yield start, np.unpackbits(packed, axis=1, count=len(self.conditions), bitorder='little').view(bool)
+
+    def evaluate(self, records: dict) -> list:
+        """Pour chaque événement : entités et conditions qui le capturent."""
+        results = []
+        for start, mask in self.match_blocks(records):
+            record_rows, condition_rows = np.nonzero(mask)
+            bounds = np.searchsorted(record_rows, np.arange(len(mask) + 1))
+            for offset in range(len(mask)):
+                rows = condition_rows[bounds[offset]:bounds[offset + 1]].tolist()
+                results.append({
+                    "record": start + offset,
+                    "entities": list(dict.fromkeys(self.entities[row] for row in rows)),
+                    "conditions": [self.conditions[row] for row in rows],
+                })
+        return results
+
+
+def condition_clauses(condition: str):
+    """
+    Clauses 'champ==valeur' d'une condition de prefilter 'f1==v1,f2==v2;' et clauses non évaluables
+    (autre opérateur). NO_CONDITION et les parties vides ne contraignent rien.
+    """
+    clauses, unsupported = [], []
+    for part in condition.split(','):
+        part = part.strip().replace(";", "")
+        if not part or part == 'NO_CONDITION':
+            continue
+        if "==" in part:
+            name, value = part.split("==", 1)
+            clauses.append((name.strip(), value.strip()))
+        else:
+            unsupported.append(part)
+    return clauses, unsupported
+
+
+def records_length(records: dict) -> int:
+    return max((len(column) for column in records.values()), default=0)
+
+
+def load_records(data: bytes, filename: str) -> dict:
+    """
+    Evénements d'un fichier CSV (une colonne par champ) ou JSON (liste d'objets ou objet de listes),
+    renvoyés en colonnes : champ -> liste de valeurs.
+    """
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        content = json.loads(text)
+        if isinstance(content, dict):
+            # Colonnes de longueurs différentes complétées par None
+            length = max((len(values) for values in content.values()), default=0)
+            return {field: list(values) + [None] * (length - len(values)) for field, values in content.items()}
+        rows = content
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    # DictReader range les valeurs en trop sous la clé None
+    fields = {field for row in rows for field in row if field is not None}
+    return {field: [row.get(field) for row in rows] for field in fields}
@@ -0,0 +1,424 @@
+import argparse
+import re
+import sys
+import time
+from typing import NamedTuple
+
+from func_bitset import bitset_rows, offset_bitset, rows_to_bitset
+
+
+class QueryError(ValueError):
+    """Requête mal formée, ou impossible à évaluer sur ce workflow (prédicat de graphe sans graphe)."""
+
+
+# Syntaxe :
+#   requête   := terme ('or' terme)*
+#   terme     := facteur ('and' facteur)*
+#   facteur   := 'not' facteur | '(' requête ')' | prédicat
+#   prédicat  := CHAMP ('=' | '!=') VALEUR
+#              | CHAMP 'in' '(' VALEUR (',' VALEUR)* ')'
+#              | CHAMP 'contains' VALEUR
+#              | 'reachable' ['via' ('Success' | 'Failure')] ('of' | 'from') [TYPE] NOEUD
+#              | 'in' 'loop'
+# ex : type = X and reachable via Failure of fork F and text contains 'IBAN'
+# Mots-clés insensibles à la casse ; valeurs entre quotes si elles contiennent des espaces ou des symboles.
+FIELDS = ('id', 'group', 'type', 'format', 'text', 'path')
+NODE_TYPES = ('start', 'fork', 'condition', 'operation', 'label', 'end', 'conditionGroup', 'node')
+BRANCHES = {'success': 'Success', 'failure': 'Failure'}
+KEYWORDS = {'and', 'or', 'not', 'in', 'contains', 'reachable', 'via', 'of', 'from', 'loop'}
+
+TOKEN = re.compile(r"""\s*(?:(?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|(?P<symbol>!=|=|\(|\)|,)|(?P<word>[^\s=!(),'"]+))""")
+
+
+class Token(NamedTuple):
+    kind: str  # 'string', 'symbol', 'word' ou 'end'
+    value: str
+    position: int
+
+    def keyword(self):
+        return self.value.lower() if self.kind == 'word' and self.value.lower() in KEYWORDS else None
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            position += len(text[position:]) - len(text[position:].lstrip())
+            raise QueryError(f"Unexpected character at position {position}: {text[position:position + 10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        tokens.append(Token(kind, value, match.start(kind)))
+        position = match.end()
+    tokens.append(Token('end', '', len(text)))
+    return tokens
+
+
+# Arbre de la requête
+class And(NamedTuple):
+    children: tuple
+
+
+class Or(NamedTuple):
+    children: tuple
+
+
+class Not(NamedTuple):
+    child: object
+
+
+class Match(NamedTuple):
+    """CHAMP = / in : valeurs exactes, évaluées par index (par parcours pour le chemin)."""
+    field: str
+    values: tuple
+
+
+class Contains(NamedTuple):
+    """CHAMP contains : recherche insensible à la casse, évaluée ligne à ligne."""
+    field: str
+    needle: str
+
+
+class Reachable(NamedTuple):
+    node: str
+    branch: str = None
+    node_type: str = None
+
+
+class InLoop(NamedTuple):
+    pass
+
+
+class Parser:
+
+    def __init__(self, text: str):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self) -> Token:
+        return self.tokens[self.position]
+
+    def next(self) -> Token:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def error(self, expected: str):
+        token = self.peek()
+        found = 'end of query' if token.kind == 'end' else repr(token.value)
+        return QueryError(f"Expected {expected} at position {token.position}, found {found}")
+
+    def expect_keyword(self, keyword: str):
+        if self.peek().keyword() != keyword:
+            raise self.error(f"'{keyword}'")
+        self.next()
+
+    def expect_symbol(self, symbol: str):
+        token = self.peek()
+        if token.kind != 'symbol' or token.value != symbol:
+            raise self.error(f"'{symbol}'")
+        self.next()
+
+    def value(self) -> str:
+        token = self.peek()
+        if token.kind == 'string' or (token.kind == 'word' and token.keyword() is None):
+            return self.next().value
+        raise self.error("a value")
+
+    def parse(self):
+        if self.peek().kind == 'end':
+            raise QueryError("Empty query")
+        node = self.query()
+        if self.peek().kind != 'end':
+            raise self.error("'and', 'or' or end of query")
+        return node
+
+    def query(self):
+        children = [self.term()]
+        while self.peek().keyword() == 'or':
+            self.next()
+            children.append(self.term())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def term(self):
+        children = [self.factor()]
+        while self.peek().keyword() == 'and':
+            self.next()
+            children.append(self.factor())
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def factor(self):
+        token = self.peek()
+        if token.keyword() == 'not':
+            self.next()
+            return Not(self.factor())
+        if token.kind == 'symbol' and token.value == '(':
+            self.next()
+            node = self.query()
+            self.expect_symbol(')')
+            return node
+        if token.keyword() == 'reachable':
+            return self.reachable()
+        if token.keyword() == 'in':
+            self.next()
+            self.expect_keyword('loop')
+            return InLoop()
+        return self.predicate()
+
+    def reachable(self):
+        self.next()
+        branch = None
+        if self.peek().keyword() == 'via':
+            self.next()
+            branch = BRANCHES.get(self.value().lower())
+            if branch is None:
+                raise QueryError(f"Unknown branch, expected one of: {', '.join(BRANCHES.values())}")
+        if self.peek().keyword() not in ('of', 'from'):
+            raise self.error("'of' or 'from'")
+        self.next()
+        node_type = None
+        following = self.tokens[self.position + 1] if self.peek().kind != 'end' else self.peek()
+        if self.peek().kind == 'word' and self.peek().value in NODE_TYPES \
+                and following.kind in ('word', 'string') and following.keyword() is None:
+            node_type = self.next().value
+        return Reachable(self.value(), branch, None if node_type == 'node' else node_type)
+
+    def predicate(self):
+        token = self.peek()
+        field = token.value.lower() if token.kind == 'word' else None
+        if field not in FIELDS:
+            raise self.error(f"a field ({', '.join(FIELDS)}), 'reachable', 'in loop', 'not' or '('")
+        self.next()
+
+        token = self.peek()
+        if token.kind == 'symbol' and token.value in ('=', '!='):
+            self.next()
+            node = Match(field, (self.value(),))
+            return Not(node) if token.value == '!=' else node
+        if token.keyword() == 'contains':
+            self.next()
+            return Contains(field, self.value().lower())
+        if token.keyword() == 'in':
+            self.next()
+            self.expect_symbol('(')
+            values = [self.value()]
+            while self.peek().kind == 'symbol' and self.peek().value == ',':
+                self.next()
+                values.append(self.value())
+            self.expect_symbol(')')
+            return Match(field, tuple(values))
+        raise self.error("'=', '!=', 'in' or 'contains'")
+
+
+def parse_query(text: str):
+    return Parser(text).parse()
+
+
+# Coût d'évaluation, du plus sélectif / moins cher au plus cher
+INDEX, GRAPH, SCAN = range(3)
+
+
+def cost(node) -> int:
+    if isinstance(node, (And, Or)):
+        return max(cost(child) for child in node.children)
+    if isinstance(node, Not):
+        return cost(node.child)
+    if isinstance(node, Match):
+        return SCAN if node.field == 'path' else INDEX
+    if isinstance(node, (Reachable, InLoop)):
+        return GRAPH
+    return SCAN
+
+
+def field_value(exception, field: str):
+    if field == 'id':
+        return exception.condition_id
+    if field == 'group':
+        return exception.condition_group
+    return getattr(exception, field)
+
+
+class WorkflowQuery:
+    """
+    Requêtes sur les exceptions d'un workflow. Chaque prédicat est évalué en bitset sur les lignes de l'index
+    (mêmes lignes que analysis.exceptions) :
+    - champ = valeur / in : index valeur -> lignes construit à la première requête sur le champ, bitset gardé
+      pour chaque valeur demandée ; le chemin (PathRef ou chaîne selon l'origine de l'analyse) est comparé
+      sous forme de texte, ligne à ligne comme pour 'contains' ;
+    - reachable / in loop : index d'atteignabilité et boucles du graphe (None si l'analyse vient du catalogue) ;
+    - contains : parcours des seules lignes encore candidates (colonne en minuscules gardée, sauf le chemin).
+    Le planificateur évalue les 'and' du moins cher au plus cher, chaque prédicat ne travaillant que sur les
+    lignes retenues par les précédents ; un 'or' ne réexamine pas les lignes déjà trouvées.
+    Partagé entre sessions : les index construits à la demande ne sont jamais modifiés ensuite.
+    """
+
+    def __init__(self, index, analysis=None):
+        self.index = index
+        self.reachability = analysis.reachability if analysis is not None else None
+        self.graph = analysis.graph if analysis is not None else None
+        self.all = (1 << len(index)) - 1
+        self.rows_by_value = {}  # champ -> valeur -> lignes
+        self.bitsets = {}  # (champ, valeur) -> bitset, pour les valeurs déjà demandées
+        self.lowered = {}  # champ -> valeurs en minuscules, pour 'contains'
+
+    def value_bitset(self, field: str, value) -> int:
+        key = (field, value)
+        bitset = self.bitsets.get(key)
+        if bitset is None:
+            rows_by_value = self.rows_by_value.get(field)
+            if rows_by_value is None:
+                rows_by_value = {}
+                for row, exception in enumerate(self.index.exceptions):
+                    rows_by_value.setdefault(field_value(exception, field), []).append(row)
+                self.rows_by_value[field] = rows_by_value
+            bitset = self.bitsets[key] = rows_to_bitset(rows_by_value.get(value, ()), len(self.index))
+        return bitset
+
+    def path_rows(self, candidates: int, accept) -> int:
+        """Lignes candidates dont le chemin, construit seulement pour elles, satisfait 'accept'."""
+        exceptions = self.index.exceptions
+        rows = [row for row in bitset_rows(candidates) if accept(str(exceptions[row].path or ''))]
+        return rows_to_bitset(rows, len(self.index))
+
+    def contains(self, field: str, needle: str, candidates: int) -> int:
+        if field == 'path':
+            return self.path_rows(candidates, lambda path: needle in path.lower())
+        values = self.lowered.get(field)
+        if values is None:
+            values = self.lowered[field] = [str(field_value(exception, field) or '').lower()
+                                            for exception in self.index.exceptions]
+        rows = [row for row in bitset_rows(candidates) if needle in values[row]]
+        return rows_to_bitset(rows, len(self.index))
+
+    def require_graph(self, predicate: str):
+        if self.reachability is None:
+            raise QueryError(f"'{predicate}' needs the workflow graph, not available for exceptions "
+                             f"loaded from the catalogue")
+
+    def evaluate(self, node, candidates: int) -> int:
+        """Lignes de 'candidates' satisfaisant 'node'."""
+        if not candidates:
+            return 0
+        if isinstance(node, And):
+            for child in sorted(node.children, key=cost):
+                candidates = self.evaluate(child, candidates)
+                if not candidates:
+                    break
+            return candidates
+        if isinstance(node, Or):
+            found = 0
+            for child in sorted(node.children, key=cost):
+                found |= self.evaluate(child, candidates & ~found)
+            return found
+        if isinstance(node, Not):
+            return candidates & ~self.evaluate(node.child, candidates)
+        if isinstance(node, Match) and node.field == 'path':
+            values = set(node.values)
+            return self.path_rows(candidates, values.__contains__)
+        if isinstance(node, Match):
+            bitset = 0
+            for value in node.values:
+                bitset |= self.value_bitset(node.field, value)
+            return candidates & bitset
+        if isinstance(node, Contains):
+            return self.contains(node.field, node.needle, candidates)
+        if isinstance(node, Reachable):
+            self.require_graph('reachable')
+            if node.node not in self.graph:
+                raise QueryError(f"Unknown node '{node.node}'")
+            node_type = self.graph.nodes[node.node].get('type')
+            if node.node_type is not None and node_type != node.node_type:
+                raise QueryError(f"'{node.node}' is of type {node_type}, not {node.node_type}")
+            return candidates & offset_bitset(self.reachability.bitset(node.node, node.branch))
+        if isinstance(node, InLoop):
+            self.require_graph('in loop')
+            if 'in loop' not in self.bitsets:
+                self.bitsets['in loop'] = rows_to_bitset(
+                    [row for row, exception in enumerate(self.index.exceptions) if exception.loops],
+                    len(self.index))
+            return candidates & self.bitsets['in loop']
+        raise TypeError(node)
+
+    def run(self, text: str) -> list:
+        """Lignes de l'index correspondant à la requête, par ordre croissant."""
+        return bitset_rows(self.evaluate(parse_query(text), self.all))
+
+
+def explain(node, depth: int = 0) -> str:
+    """Plan d'évaluation : enfants dans l'ordre où ils sont évalués."""
+    indent = "  " * depth
+    names = {INDEX: "index", GRAPH: "graph", SCAN: "scan"}
+    if isinstance(node, (And, Or)):
+        lines = [f"{indent}{type(node).__name__.upper()}"]
+        lines += [explain(child, depth + 1) for child in sorted(node.children, key=cost)]
+        return "\n".join(lines)
+    if isinstance(node, Not):
+        return f"{indent}NOT\n{explain(node.child, depth + 1)}"
+    return f"{indent}{node} [{names[cost(node)]}]"
+
+
+def load_targets(args) -> list:
+    """(nom, WorkflowQuery) pour chaque wfd analysé, ou chaque workflow du catalogue."""
+    from func_catalogue import get_catalogue
+    from func_exception_index import ExceptionIndex
+    from func_exception_record import ExceptionRecord
+    from func_graph_xml import analyze_workflow
+
+    targets = []
+    for path in args.wfd:
+        analysis = analyze_workflow(path)
+        targets.append((path, WorkflowQuery(ExceptionIndex(list(analysis.exceptions)), analysis)))
+    if args.catalogue:
+        catalogue = get_catalogue()
+        for workflow in args.workflow or catalogue.workflows():
+            exceptions = catalogue.exceptions(workflow)
+            if exceptions is None:
+                print(f"'{workflow}' is not in the catalogue.", file=sys.stderr)
+                continue
+            index = ExceptionIndex([ExceptionRecord.from_dict(e) for e in exceptions])
+            targets.append((workflow, WorkflowQuery(index)))
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the exceptions of analyzed workflows.",
+                                     epilog="Example: type = X and reachable via Failure of fork F "
+                                            "and text contains 'IBAN'")
+    parser.add_argument("query")
+    parser.add_argument("wfd", nargs="*", help="wfd files to analyze (graph predicates available)")
+    parser.add_argument("--catalogue", action="store_true",
+                        help="query the workflows of the exception catalogue (no graph predicates)")
+    parser.add_argument("--workflow", action="append", help="catalogue workflow to query (default: all)")
+    parser.add_argument("--explain", action="store_true", help="print the evaluation plan")
+    args = parser.parse_args()
+
+    try:
+        node = parse_query(args.query)
+    except QueryError as e:
+        parser.error(str(e))
+    if args.explain:
+        print(explain(node))
+
+    total = 0
+    for name, query in load_targets(args):
+        start = time.perf_counter()
+        try:
+            rows = bitset_rows(query.evaluate(node, query.all))
+        except QueryError as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            continue
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {len(rows)} exception(s) in {elapsed * 1000:.1f} ms")
+        for row in rows:
+            exception = query.index.exceptions[row]
+            print(f"  {exception.condition_group}\t{exception.display_id}\t{exception.type}\t{exception.text}")
+        total += len(rows)
+    print(f"{total} exception(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+from config import app_cfg
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from func_update_bitbucket import main as update_bitbucket
+
+
+STATUS_FILE = 'sync_status.json'
+LOCK_FILE = 'sync_status.lock'
+# Au-delà de ce délai sans battement, un job 'running' est considéré comme abandonné (process arrêté)
+HEARTBEAT_TIMEOUT = 60
+HEARTBEAT_INTERVAL = 10
+MAX_ERRORS_KEPT = 20
+
+
+def status_path(json_path: str = app_cfg['JSON_PATH']):
+    return os.path.normpath(os.path.join(json_path, STATUS_FILE))
+
+
+def read_status(json_path: str = app_cfg['JSON_PATH']) -> dict:
+    """Dernier état persisté du job de synchronisation ({'state': 'idle'} si aucun)."""
+    try:
+        with open(status_path(json_path), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"state": "idle"}
+
+
+def write_status(status: dict, json_path: str = app_cfg['JSON_PATH']):
+    path = status_path(json_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def try_lock_job(json_path: str = app_cfg['JSON_PATH']):
+    """
+    Verrou système (flock / msvcrt) posé sur un fichier à côté du statut, partagé par tous les process.
+    Retourne le fichier verrouillé, à garder ouvert pendant le job, ou None si un autre job le détient.
+    Le système libère le verrou si le process s'arrête : aucun verrou orphelin à nettoyer.
+    """
+    path = os.path.join(os.path.dirname(status_path(json_path)), LOCK_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_file = open(path, 'a')
+    try:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def is_running(status: dict) -> bool:
+    return (status.get("state") == "running"
+            and time.time() - status.get("heartbeat", 0) < HEARTBEAT_TIMEOUT)
+
+
+class SyncProgress:
+    """
+    Compteurs d'avancement d'une synchronisation, persistés au plus une fois par 'flush_interval' secondes.
+    """
+
+    def __init__(self, json_path: str = app_cfg['JSON_PATH'], flush_interval: float = 1.0):
+        self.json_path = json_path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_flush = 0.0
+        self.status = {
+            "state": "running",
+            "started_at": self.started_at,
+            "finished_at": None,
+            "heartbeat": self.started_at,
+            "files_done": 0,
+            "files_expected": 0,
+            "bytes": 0,
+            "error_count": 0,
+            "errors": [],
+            "eta_seconds": None,
+        }
+        self.flush(force=True)
+
+    def expect(self, files: int):
+        with self.lock:
+            self.status["files_expected"] = files
+        self.flush()
+
+    def advance(self, files: int = 1, nbytes: int = 0):
+        with self.lock:
+            self.status["files_done"] += files
+            self.status["bytes"] += nbytes
+        self.flush()
+
+    def error(self, message: str):
+        with self.lock:
+            self.status["error_count"] += 1
+            self.status["errors"] = (self.status["errors"] + [message])[-MAX_ERRORS_KEPT:]
+        self.flush()
+
+    def finish(self, state: str):
+        with self.lock:
+            self.status["state"] = state
+            self.status["finished_at"] = time.time()
+            self.status["eta_seconds"] = 0
+        self.flush(force=True)
+
+    def _eta(self):
+        done, expected = self.status["files_done"], self.status["files_expected"]
+        if not done or expected <= done:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed / done * (expected - done))
+
+    def flush(self, force: bool = False):
+        now = time.time()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        with self.lock:
+            self.last_flush = now
+            self.status["heartbeat"] = now
+            if self.status["state"] == "running":
+                self.status["eta_seconds"] = self._eta()
+            write_status(self.status, self.json_path)
+
+
+_job_lock = threading.Lock()
+_job_thread = None
+
+
+def start_sync(json_path: str = app_cfg['JSON_PATH']) -> dict:
+    """
+    Lance la synchronisation Bitbucket dans un thread d'arrière-plan et rend la main immédiatement.
+    Un seul job à la fois : si une synchronisation tourne déjà (ce process ou un autre), on la rejoint.
+    Le verrou de _job_lock couvre les threads de ce process, celui de try_lock_job les autres process.
+    """
+    global _job_thread
+
+    with _job_lock:
+        if _job_thread is not None and _job_thread.is_alive():
+            return read_status(json_path)
+        lock_file = try_lock_job(json_path)
+        if lock_file is None:
+            return read_status(json_path)
+
+        try:
+            progress = SyncProgress(json_path=json_path)
+        except Exception:
+            lock_file.close()
+            raise
+
+        def run():
+            finished = threading.Event()
+
+            def heartbeat():
+                # Maintient le job visible comme actif pendant les requêtes longues
+                while not finished.wait(HEARTBEAT_INTERVAL):
+                    progress.flush(force=True)
+
+            threading.Thread(target=heartbeat, daemon=True).start()
+            try:
+                update_bitbucket(progress=progress)
+                progress.finish("done")
+            except Exception as e:
+                print(f"Bitbucket update failed: {e}")
+                progress.error(str(e))
+                progress.finish("failed")
+            finally:
+                finished.set()
+                lock_file.close()
+
+        _job_thread = threading.Thread(target=run, name="bitbucket-sync", daemon=True)
+        _job_thread.start()
+        return progress.status
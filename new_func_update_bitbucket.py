@@ -1,33 +1,272 @@
+import hashlib
+import json
 import os
+import queue
+import tarfile
+import threading
 import xml.etree.ElementTree as ET
+import requests
 from api_bitbucket import BitbucketClient
 from config import xml_cfg, bitbucket_cfg
+from func_git_mirror import update_mirror, list_tree, write_blobs
 from func_manage_json import JsonManager
 
 
+REPO_ENDPOINT = "/projects/M29SUMTCI/repos/m29_linux_prod"
+MANIFEST_FILE = '.sync_manifest.json'
+CHUNK_SIZE = 64 * 1024
+PAGE_SIZE = bitbucket_cfg.get('PAGE_SIZE', 500)
+
+SYNC_MODE = bitbucket_cfg.get('SYNC_MODE', 'browse')  # 'browse', 'archive' ou 'git'
+MIRROR_PATH = bitbucket_cfg.get('MIRROR_PATH', os.path.normpath(xml_cfg['XML_PATH']) + '_mirror.git')
+
+BASE_XML_PATH = 'etc/stpcfg'
+BASE_CODES_PATH = 'src/stk/stp'
+BASE_INCLUDE_PATH = 'include'
+UTILS_PATHS = ['MK_Utils', 'TCI_Utils']
+
+
 def bitbucket_request(path: str, file: str = '', limit: int = 1300, start: int = 0):
     client = BitbucketClient(bitbucket_cfg['TOKEN'], None)
-    endpoint = f"/projects/M29SUMTCI/repos/m29_linux_prod/browse/{path}"
+    endpoint = f"{REPO_ENDPOINT}/browse/{path}"
     if file:
         endpoint += f"/{file}"
 
     return client._make_request(method="GET", endpoint=endpoint, limit=limit, start=start)
 
 
+def iter_pages(path: str, file: str = '', page_size: int = PAGE_SIZE, prefetch: bool = True):
+    """
+    Parcourt toutes les pages d'une réponse browse en suivant isLastPage / nextPageStart.
+    Avec 'prefetch', la page suivante est téléchargée dans un thread pendant que l'appelant traite la courante.
+    """
+    def fetch_all():
+        start = 0
+        while True:
+            page = bitbucket_request(path=path, file=file, limit=page_size, start=start)
+            yield page
+            # Les dossiers sont paginés dans 'children', les fichiers à la racine de la réponse
+            paged = page.get('children', page)
+            if paged.get('isLastPage', True) or paged.get('nextPageStart') is None:
+                return
+            start = paged['nextPageStart']
+
+    if not prefetch:
+        yield from fetch_all()
+        return
+
+    pages = queue.Queue(maxsize=2)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for page in fetch_all():
+                if not put(('page', page)):
+                    return
+            put(('done', None))
+        except Exception as e:
+            put(('error', e))
+
+    threading.Thread(target=producer, daemon=True).start()
+    try:
+        while True:
+            kind, value = pages.get()
+            if kind == 'done':
+                return
+            if kind == 'error':
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+def iter_directory(path: str, page_size: int = PAGE_SIZE, prefetch: bool = True):
+    """Renvoie les enfants d'un dossier au fur et à mesure de l'arrivée des pages."""
+    for page in iter_pages(path, page_size=page_size, prefetch=prefetch):
+        yield from page.get('children', {}).get('values', [])
+
+
+def get_file_content(path: str, file: str, page_size: int = PAGE_SIZE):
+    """Contenu complet d'un fichier (toutes les pages de 'lines'). Les fichiers binaires sont renvoyés tels quels."""
+    content = None
+    for page in iter_pages(path, file=file, page_size=page_size, prefetch=False):
+        if 'lines' not in page:
+            return page
+        if content is None:
+            content = page
+        else:
+            content['lines'].extend(page['lines'])
+    return content
+
+
+def get_latest_commit():
+    """Id du dernier commit de la branche par défaut, None si indisponible."""
+    client = BitbucketClient(bitbucket_cfg['TOKEN'], None)
+    try:
+        commits = client._make_request(method="GET", endpoint=f"{REPO_ENDPOINT}/commits", limit=1, start=0)
+        return commits['values'][0]['id'] if commits.get('values') else None
+    except Exception as e:
+        print(f"Error fetching latest commit: {e}")
+        return None
+
+
+def get_last_modified(path: str):
+    """Revision (id du dernier commit) de chaque enfant direct de 'path', fichiers et dossiers."""
+    client = BitbucketClient(bitbucket_cfg['TOKEN'], None)
+    try:
+        result = client._make_request(method="GET", endpoint=f"{REPO_ENDPOINT}/last-modified/{path}", limit=1300, start=0)
+        return {name: commit['id'] for name, commit in result.get('files', {}).items()}
+    except Exception as e:
+        print(f"Error fetching revisions for {path}: {e}")
+        return {}
+
+
+def _manifest_path():
+    return os.path.join(xml_cfg['XML_PATH'], MANIFEST_FILE)
+
+
+def load_manifest():
+    """Charge le manifest local : {commit, stp_list, mode, dirs: {path: revision}, files: {path: {revision, hash}}}."""
+    empty = {"commit": None, "stp_list": None, "mode": None, "dirs": {}, "files": {}}
+    try:
+        with open(_manifest_path(), 'r') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return empty
+    for key, value in empty.items():
+        manifest.setdefault(key, value)
+    return manifest
+
+
+def save_manifest(manifest: dict):
+    os.makedirs(xml_cfg['XML_PATH'], exist_ok=True)
+    with open(_manifest_path(), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def content_hash(content: str):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def file_hash(filepath: str, header: bytes = b''):
+    """sha1 du contenu local (précédé de 'header'), comparable au 'hash' enregistré en mode browse ou archive."""
+    digest = hashlib.sha1(header)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def git_blob_id(filepath: str):
+    """Id de blob git du contenu local, comparable à la révision enregistrée en mode git."""
+    return file_hash(filepath, f"blob {os.path.getsize(filepath)}\0".encode())
+
+
+def use_mode(manifest: dict, mode: str):
+    """
+    Chaque mode enregistre sa propre sorte de révision (commit de dernière modification en browse, commit
+    synchronisé en archive, id de blob en git) : comparées d'un mode à l'autre, elles ne correspondent jamais.
+    Au changement de mode, les révisions sont oubliées et les hashs recalculés depuis les fichiers locaux,
+    pour que seuls les fichiers réellement modifiés soient réécrits.
+    """
+    # Manifest antérieur à l'enregistrement du mode : supposé produit par le mode courant
+    if manifest['mode'] not in (None, mode):
+        print(f"Sync mode changed from {manifest['mode']} to {mode}, revisions reset.")
+        for key, entry in manifest['files'].items():
+            filepath = os.path.join(xml_cfg['XML_PATH'], key)
+            entry['revision'] = None
+            entry['hash'] = file_hash(filepath) if os.path.exists(filepath) else None
+        manifest['dirs'] = {}
+    manifest['mode'] = mode
+
+
+def _manifest_key(filepath: str):
+    return os.path.relpath(filepath, xml_cfg['XML_PATH']).replace("\\", "/")
+
+
+def is_manifest_intact(manifest: dict):
+    """Vérifie que tous les fichiers du manifest sont toujours présents localement."""
+    return all(os.path.exists(os.path.join(xml_cfg['XML_PATH'], key)) for key in manifest['files'])
+
+
+def sync_file(manifest: dict, seen: set, filepath: str, revision, fetch, progress=None):
+    """
+    Télécharge un fichier seulement si sa révision amont a changé.
+    'fetch' renvoie le contenu distant (réponse browse) et n'est appelé qu'en cas de besoin.
+    """
+    key = _manifest_key(filepath)
+    seen.add(key)
+    entry = manifest['files'].get(key)
+    if entry and revision and entry.get('revision') == revision and os.path.exists(filepath):
+        if progress:
+            progress.advance()
+        return True
+
+    file_content = fetch()
+    if 'lines' not in file_content:
+        print(f"Skipping binary file: {key}")
+        return True
+
+    lines = [line['text'] for line in file_content['lines']]
+    content = '\n'.join(lines)
+    digest = content_hash(content)
+    if not (entry and entry.get('hash') == digest and os.path.exists(filepath)):
+        save_file_content(filepath, lines)
+    manifest['files'][key] = {"revision": revision, "hash": digest}
+    if progress:
+        progress.advance(nbytes=len(content))
+    return True
+
+
+def mark_directory_seen(manifest: dict, seen: set, dest_prefix: str, progress=None):
+    """Conserve les fichiers d'un dossier inchangé en amont sans le parcourir."""
+    prefix = _manifest_key(dest_prefix).rstrip('/') + '/'
+    kept = [key for key in manifest['files'] if key.startswith(prefix)]
+    seen.update(kept)
+    if progress:
+        progress.advance(files=len(kept))
+
+
+def delete_removed_files(manifest: dict, seen: set):
+    """Supprime localement les fichiers qui ont disparu en amont."""
+    for key in [k for k in manifest['files'] if k not in seen]:
+        filepath = os.path.join(xml_cfg['XML_PATH'], key)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+            print(f"File deleted: {filepath}")
+        del manifest['files'][key]
+
+
+def is_valid_dispatchserver(name):
+    return 'dispatchserver' in name and any(x in name for x in ['.CLS', '.DSM', '.FAX', '.SWIFT'])
+
+
+def is_valid_xml_name(name: str, valid_names: list):
+    """Filtre STP / dispatchserver appliqué aux fichiers de etc/stpcfg."""
+    return (name.endswith('.xml')
+            and ('_wfd' in name or '_cfg' in name or '_ini' in name)
+            and (any(valid in name for valid in valid_names) or is_valid_dispatchserver(name)))
+
+
 def get_xml_files(files):
 
     valid_names = JsonManager.get_stp_list()
 
-    def is_valid_dispatchserver(name):
-        return 'dispatchserver' in name and any(x in name for x in ['.CLS', '.DSM', '.FAX', '.SWIFT'])
-
     return [
         f
         for f in files
         if f['type'] == 'FILE'
         and f['path']['extension'] == 'xml'
-        and ('_wfd' in f['path']['name'] or '_cfg' in f['path']['name'] or '_ini' in f['path']['name'])
-        and (any(name in f['path']['name'] for name in valid_names) or is_valid_dispatchserver(f['path']['name']))
+        and is_valid_xml_name(f['path']['name'], valid_names)
     ]
 
 
@@ -38,86 +277,295 @@ def save_file_content(filepath: str, lines: list):
     print(f"File saved to: {filepath}")
 
 
-def process_directory(base_path: str, repo_path: str, dest_folder: str):
-    full_path = os.path.join(base_path, repo_path).replace("\\", "/")
+def process_directory(base_path: str, repo_path: str, dest_folder: str, manifest: dict, seen: set, progress=None):
+    """
+    Synchronise récursivement un dossier. Les sous-dossiers dont la révision amont n'a pas changé
+    depuis la dernière synchronisation ne sont pas parcourus.
+    Retourne False si une erreur est survenue (la révision du dossier n'est alors pas enregistrée).
+    """
+    full_path = os.path.join(base_path, repo_path).replace("\\", "/").rstrip('/')
 
     print(f"Processing directory: {full_path}")
-    try:
-        directory_content = bitbucket_request(path=full_path)
-    except Exception as e:
-        print(f"Error fetching directory content for {full_path}: {e}")
-        return
+    revisions = get_last_modified(full_path)
+    complete = True
 
-    if 'children' in directory_content:
-        for item in directory_content['children']['values']:
+    try:
+        for item in iter_directory(full_path):
             item_path = item['path']['toString']
             full_item_path = os.path.join(repo_path, item_path).replace("\\", "/")
+            revision = revisions.get(item['path']['name'])
 
             if item['type'] == 'FILE':
-                print(f"Found file: {item_path}")
+                filepath = os.path.normpath(os.path.join(xml_cfg['XML_PATH'], dest_folder, item_path))
                 try:
-                    file_content = bitbucket_request(path=full_path, file=item['path']['name'])
-                    if 'lines' in file_content:
-                        lines = [line['text'] for line in file_content['lines']]
-                        filepath = os.path.normpath(os.path.join(xml_cfg['XML_PATH'], dest_folder, item_path))
-                        save_file_content(filepath, lines)
-                    else:
-                        print(f"Skipping binary file: {item_path}")
+                    sync_file(manifest, seen, filepath, revision,
+                              lambda: get_file_content(path=full_path, file=item['path']['name']), progress)
                 except Exception as e:
                     print(f"Error processing file {item_path}: {e}")
+                    if progress:
+                        progress.error(f"{item_path}: {e}")
+                    complete = False
 
             elif item['type'] == 'DIRECTORY':
-                process_directory(base_path, full_item_path, os.path.join(dest_folder, item_path))
+                dir_key = f"{full_path}/{item_path}"
+                item_dest = os.path.join(dest_folder, item_path)
+                if revision and manifest['dirs'].get(dir_key) == revision:
+                    mark_directory_seen(manifest, seen, os.path.join(xml_cfg['XML_PATH'], item_dest), progress)
+                    continue
+                if process_directory(base_path, full_item_path, item_dest, manifest, seen, progress) and revision:
+                    manifest['dirs'][dir_key] = revision
+                else:
+                    manifest['dirs'].pop(dir_key, None)
+                    complete = False
+    except Exception as e:
+        print(f"Error fetching directory content for {full_path}: {e}")
+        if progress:
+            progress.error(f"{full_path}: {e}")
+        return False
 
+    return complete
 
-def main():
-    print('--------- Starting Bitbucket update ---------')
 
-    base_xml_path = 'etc/stpcfg'
-    base_codes_path = 'src/stk/stp'
-    base_include_path = 'include'
-    utils_paths = ['MK_Utils', 'TCI_Utils']
+def sync_browse(manifest: dict, seen: set, progress=None):
+    """Synchronisation fichier par fichier via l'endpoint browse."""
+    complete = True
 
-    print(f"Fetching XML files from: {base_xml_path}")
+    print(f"Fetching XML files from: {BASE_XML_PATH}")
+    valid_names = JsonManager.get_stp_list()
+    revisions = get_last_modified(BASE_XML_PATH)
     try:
-        xml_extraction = bitbucket_request(path=base_xml_path)
+        for xml_file in iter_directory(BASE_XML_PATH):
+            file_name = xml_file['path']['name']
+            if xml_file['type'] != 'FILE' or not is_valid_xml_name(file_name, valid_names):
+                continue
+            filepath = os.path.normpath(os.path.join(xml_cfg['XML_PATH'], file_name))
+            try:
+                sync_file(manifest, seen, filepath, revisions.get(file_name),
+                          lambda: get_file_content(path=BASE_XML_PATH, file=file_name), progress)
+            except Exception as e:
+                print(f"Error processing XML file {file_name}: {e}")
+                if progress:
+                    progress.error(f"{file_name}: {e}")
+                complete = False
         print('XML extraction done.')
-
-        if 'children' in xml_extraction:
-            xml_files = get_xml_files(xml_extraction['children']['values'])
-            for xml_file in xml_files:
-                file_name = xml_file['path']['name']
-                print(f"Processing XML file: {file_name}")
-                try:
-                    file_extraction = bitbucket_request(path=base_xml_path, file=file_name)
-                    if 'lines' in file_extraction:
-                        lines = [line['text'] for line in file_extraction['lines']]
-                        filepath = os.path.normpath(os.path.join(xml_cfg['XML_PATH'], file_name))
-                        save_file_content(filepath, lines)
-
-                    else:
-                        print(f"No content found for XML file: {file_name}")
-                except Exception as e:
-                    print(f"Error processing XML file {file_name}: {e}")
-        else:
-            print("No XML files found in the extraction.")
     except Exception as e:
         print(f"Error fetching XML files: {e}")
+        if progress:
+            progress.error(f"{BASE_XML_PATH}: {e}")
+        complete = False
+
+    complete &= process_directory(BASE_CODES_PATH, '', 'codes', manifest, seen, progress)
+
+    for utils_path in UTILS_PATHS:
+        complete &= process_directory(BASE_INCLUDE_PATH, utils_path, utils_path, manifest, seen, progress)
+
+    return complete
+
+
+def repo_destination(member_path: str, valid_names: list):
+    """
+    Chemin local (relatif à XML_PATH) d'un fichier du dépôt, avec la même arborescence que sync_browse.
+    Retourne None pour les fichiers à ignorer.
+    """
+    parts = member_path.split('/')
+    if '..' in parts or member_path.startswith('/'):
+        return None
+
+    xml_parts = BASE_XML_PATH.split('/')
+    if parts[:len(xml_parts)] == xml_parts:
+        rest = parts[len(xml_parts):]
+        if len(rest) == 1 and is_valid_xml_name(rest[0], valid_names):
+            return rest[0]
+        return None
+
+    codes_parts = BASE_CODES_PATH.split('/')
+    if parts[:len(codes_parts)] == codes_parts and len(parts) > len(codes_parts):
+        return '/'.join(['codes'] + parts[len(codes_parts):])
+
+    if parts[0] == BASE_INCLUDE_PATH and len(parts) > 2 and parts[1] in UTILS_PATHS:
+        return '/'.join(parts[1:])
+
+    return None
+
+
+def bitbucket_archive_stream(paths: list, at: str = None):
+    """Ouvre l'archive tar.gz des sous-arborescences 'paths' en streaming (rien n'est chargé en mémoire)."""
+    params = [('format', 'tar.gz')] + [('path', p) for p in paths]
+    if at:
+        params.append(('at', at))
+    response = requests.get(f"{bitbucket_cfg['URL'].rstrip('/')}/rest/api/1.0{REPO_ENDPOINT}/archive",
+                            headers={"Authorization": f"Bearer {bitbucket_cfg['TOKEN']}"},
+                            params=params, stream=True, timeout=60)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return response
+
+
+def extract_member(archive, member, filepath: str, known_hash: str = None):
+    """
+    Ecrit un membre de l'archive sur disque par blocs et retourne le sha1 de son contenu.
+    Si ce sha1 est 'known_hash' et que le fichier existe, le fichier local n'est pas remplacé.
+    """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    digest = hashlib.sha1()
+    source = archive.extractfile(member)
+    tmp_path = filepath + '.part'
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        if digest.hexdigest() == known_hash and os.path.exists(filepath):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, filepath)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest()
+
+
+def sync_archive(manifest: dict, seen: set, revision: str = None, progress=None):
+    """
+    Synchronisation en un seul flux tar.gz pour toutes les sous-arborescences.
+    Les fichiers sont écrits tels quels (fins de ligne d'origine conservées).
+    """
+    valid_names = JsonManager.get_stp_list()
+    paths = sync_paths()
+
+    print(f"Fetching archive for: {', '.join(paths)}")
+    with bitbucket_archive_stream(paths, at=revision) as response:
+        with tarfile.open(fileobj=response.raw, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                destination = repo_destination(member.name, valid_names)
+                if destination is None:
+                    continue
+                filepath = os.path.normpath(os.path.join(xml_cfg['XML_PATH'], destination))
+                key = _manifest_key(filepath)
+                seen.add(key)
+                entry = manifest['files'].get(key) or {}
+                digest = extract_member(archive, member, filepath, entry.get('hash'))
+                manifest['files'][key] = {"revision": revision, "hash": digest}
+                if digest != entry.get('hash'):
+                    print(f"File saved to: {filepath}")
+                if progress:
+                    progress.advance(nbytes=member.size)
+
+    # Les révisions par dossier ne sont pas connues en mode archive
+    manifest['dirs'] = {}
+    return True
+
+
+def sync_paths():
+    return [BASE_XML_PATH, BASE_CODES_PATH] + [f"{BASE_INCLUDE_PATH}/{p}" for p in UTILS_PATHS]
+
+
+def sync_git(manifest: dict, seen: set, commit: str, progress=None):
+    """
+    Matérialise les sous-arborescences depuis le miroir git local.
+    L'id de blob sert de révision : seuls les fichiers dont le contenu a changé sont réécrits.
+    """
+    valid_names = JsonManager.get_stp_list()
+    changed = []
+
+    for blob_id, size, path in list_tree(MIRROR_PATH, commit, sync_paths()):
+        destination = repo_destination(path, valid_names)
+        if destination is None:
+            continue
+        filepath = os.path.normpath(os.path.join(xml_cfg['XML_PATH'], destination))
+        key = _manifest_key(filepath)
+        seen.add(key)
+        entry = manifest['files'].get(key)
+        if entry and entry.get('revision') == blob_id and os.path.exists(filepath):
+            if progress:
+                progress.advance()
+            continue
+        # Révision inconnue (changement de mode) : le fichier local peut déjà avoir ce contenu
+        if entry and entry.get('revision') is None and os.path.exists(filepath) and git_blob_id(filepath) == blob_id:
+            manifest['files'][key] = {"revision": blob_id, "hash": blob_id}
+            if progress:
+                progress.advance()
+            continue
+        changed.append((blob_id, filepath))
+
+    if progress:
+        progress.expect(len(seen))
+    blob_ids = {filepath: blob_id for blob_id, filepath in changed}
+    for filepath, size in write_blobs(MIRROR_PATH, changed):
+        print(f"File saved to: {filepath}")
+        blob_id = blob_ids[filepath]
+        manifest['files'][_manifest_key(filepath)] = {"revision": blob_id, "hash": blob_id}
+        if progress:
+            progress.advance(nbytes=size)
+
+    manifest['dirs'] = {}
+    return True
+
+
+def main(progress=None):
+    """
+    Synchronise XML_PATH avec Bitbucket.
+    'progress' (optionnel) reçoit advance(files, nbytes), error(message) et expect(files) pendant la synchronisation.
+    """
+    print('--------- Starting Bitbucket update ---------')
+
+    manifest = load_manifest()
+    stp_list = sorted(JsonManager.get_stp_list())
+    if SYNC_MODE == 'git':
+        latest_commit = update_mirror(bitbucket_cfg['GIT_URL'], MIRROR_PATH, bitbucket_cfg.get('BRANCH', 'HEAD'))
+    else:
+        latest_commit = get_latest_commit()
+    if progress:
+        progress.expect(len(manifest['files']))
+
+    if (latest_commit and manifest['commit'] == latest_commit
+            and manifest['stp_list'] == stp_list and is_manifest_intact(manifest)):
+        print(f"Already up to date with commit {latest_commit}.")
+        print('--------- Bitbucket update completed ---------')
+        return
+
+    # Un changement de sélection des STP invalide le filtrage précédent
+    if manifest['stp_list'] != stp_list:
+        manifest['dirs'] = {}
 
-    process_directory(base_codes_path, '', 'codes')
+    seen = set()
+    if SYNC_MODE == 'git':
+        use_mode(manifest, 'git')
+        complete = sync_git(manifest, seen, latest_commit, progress)
+    elif SYNC_MODE == 'archive':
+        try:
+            use_mode(manifest, 'archive')
+            complete = sync_archive(manifest, seen, latest_commit, progress)
+        except Exception as e:
+            print(f"Archive download failed ({e}), falling back to file browsing.")
+            seen = set()
+            use_mode(manifest, 'browse')
+            complete = sync_browse(manifest, seen, progress)
+    else:
+        use_mode(manifest, 'browse')
+        complete = sync_browse(manifest, seen, progress)
 
-    for utils_path in utils_paths:
-        process_directory(base_include_path, utils_path, utils_path)
+    # Sans listing complet, on ne peut pas distinguer une suppression d'une erreur réseau
+    if complete:
+        delete_removed_files(manifest, seen)
+        manifest['commit'] = latest_commit
+    else:
+        manifest['commit'] = None
+    manifest['stp_list'] = stp_list
+    save_manifest(manifest)
 
     print('--------- Bitbucket update completed ---------')
 
 
 def get_stp_list():
-    base_xml_path = 'etc/stpcfg'
-    xml_extraction = bitbucket_request(path=base_xml_path)
     stp_list = []
-    if 'children' in xml_extraction:
-        for f in xml_extraction['children']['values']:
-            if '_cfg' in f['path']['name']:
-                stp_list.append(f['path']['name'].replace('_cfg', '').replace('.xml', ''))
+    for f in iter_directory(BASE_XML_PATH):
+        if '_cfg' in f['path']['name']:
+            stp_list.append(f['path']['name'].replace('_cfg', '').replace('.xml', ''))
     return stp_list
@@ -1,29 +1,99 @@
-import json
 import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 from config import app_cfg, environment
+from func_config_registry import registry
 
 
-def is_admin():
-    ip = st.context.ip_address
-    machine = None
+LOCAL_MACHINE = "512988"
+
+
+def reverse_dns(ip: str) -> str:
+    return socket.gethostbyaddr(ip)[0]
+
+
+def machine_name(hostname: str) -> str:
+    return hostname.split('.')[0].replace('lp', '')
+
+
+class AdminResolver:
+    """
+    Résolution IP -> poste -> admin, mise en cache.
+    - nom de poste gardé 'ttl' secondes par IP, un échec de résolution 'negative_ttl' secondes ;
+    - résolution DNS limitée à 'timeout' secondes (le thread bloqué se termine en arrière-plan) ;
+    - liste des admins lue via le registre de configuration (relue seulement si le fichier change).
+    'resolver' (ip -> nom d'hôte) et 'clock' sont remplaçables, pour les tests notamment.
+    """
+
+    def __init__(self, adminlist_path: str, resolver=reverse_dns, ttl: float = 300, negative_ttl: float = 30,
+                 timeout: float = 1.0, clock=time.monotonic):
+        self.adminlist_path = adminlist_path
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='dns')
+        self.machines = {}  # ip -> (nom de poste ou None, expiration)
+        self.pending = {}  # ip -> résolution en cours, partagée par les reruns concurrents
+
+    def machine(self, ip: str):
+        """Nom de poste de l'IP, None si la résolution échoue ou dépasse le délai."""
+        now = self.clock()
+        with self.lock:
+            cached = self.machines.get(ip)
+            if cached is not None and cached[1] > now:
+                return cached[0]
+            future = self.pending.get(ip)
+            if future is None:
+                future = self.pending[ip] = self.executor.submit(self.resolver, ip)
+
+        try:
+            machine = machine_name(future.result(timeout=self.timeout))
+        except Exception:  # délai dépassé ou résolution impossible
+            machine = None
+
+        with self.lock:
+            self.pending.pop(ip, None)
+            self.machines[ip] = (machine, self.clock() + (self.ttl if machine else self.negative_ttl))
+        return machine
+
+    def admins(self) -> dict:
+        """Contenu de 'admin_name' du fichier des admins (poste -> nom)."""
+        return registry.get(self.adminlist_path, default={"admin_name": {}}).get('admin_name', {})
+
+    def clear(self):
+        with self.lock:
+            self.machines.clear()
+
+
+@st.cache_resource
+def get_admin_resolver() -> AdminResolver:
+    return AdminResolver(app_cfg['ADMINLIST'],
+                         ttl=app_cfg.get('ADMIN_CACHE_TTL', 300),
+                         negative_ttl=app_cfg.get('ADMIN_CACHE_NEGATIVE_TTL', 30),
+                         timeout=app_cfg.get('DNS_TIMEOUT', 1.0))
+
+
+def is_admin(ip: str = None, resolver: AdminResolver = None):
+    ip = st.context.ip_address if ip is None else ip
+    resolver = get_admin_resolver() if resolver is None else resolver
     username = ""
     isadmin = False
 
-    try:
-        machine = socket.gethostbyaddr(ip)[0].split('.')[0].replace('lp', '')
-    except:
+    machine = resolver.machine(ip) if ip else None
+    if not machine:
         if environment == "local":
-            machine = "512988"
+            machine = LOCAL_MACHINE
         else:
             return isadmin, username
-           
-    if machine: 
-        with open(app_cfg['ADMINLIST'], 'r') as f:
-            whitelist_json = json.load(f)
-
-        if 'admin_name' in whitelist_json and machine in whitelist_json['admin_name']:
-            isadmin = True
-            username = whitelist_json['admin_name'][machine]
+
+    admin_names = resolver.admins()
+    if machine in admin_names:
+        isadmin = True
+        username = admin_names[machine]
 
     return isadmin, username
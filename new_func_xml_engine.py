@@ -0,0 +1,157 @@
+import argparse
+import time
+import xml.etree.ElementTree as ET
+from config import xml_cfg
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+class XmlParseError(ValueError):
+    """Document illisible même en mode 'recover'."""
+
+
+# Erreurs de parsing à intercepter, quel que soit le moteur
+PARSE_ERRORS = (ET.ParseError, XmlParseError) + ((lxml_etree.XMLSyntaxError,) if lxml_etree is not None else ())
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ElementTreeEngine:
+    """Moteur de la bibliothèque standard."""
+
+    name = "etree"
+
+    def parse(self, source):
+        return ET.parse(source).getroot()
+
+    def find_first(self, root, tag: str):
+        """Premier descendant <tag> (équivalent de root.find('.//tag'))."""
+        return root.find(f".//{tag}")
+
+    def find_all(self, root, tag: str) -> list:
+        return root.findall(f".//{tag}")
+
+    def pull_parser(self, events):
+        return ET.XMLPullParser(events=events)
+
+    def iterparse(self, reader, events=("end",)):
+        """
+        Comme iterparse, à partir d'un objet ayant une méthode read(size) (texte ou octets).
+        """
+        parser = self.pull_parser(events)
+        while True:
+            data = reader.read(CHUNK_SIZE)
+            if not data:
+                break
+            parser.feed(data)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+
+class LxmlEngine(ElementTreeEngine):
+    """
+    Moteur lxml : parsing plus rapide que ElementTree.
+    Strict par défaut (même erreur que ElementTree sur un fichier mal formé) ; avec recover=True les fichiers
+    mal formés sont lus quand même et chaque erreur récupérée est affichée.
+    Les recherches passent par des XPath compilées une fois par balise.
+    Les commentaires et instructions de traitement sont écartés pour produire les mêmes arbres que ElementTree.
+    """
+
+    name = "lxml"
+
+    def __init__(self, recover: bool = False):
+        self.recover = recover
+        self.parser = lxml_etree.XMLParser(recover=recover, huge_tree=True, resolve_entities=False, no_network=True,
+                                           remove_comments=True, remove_pis=True)
+        self.xpaths = {}
+
+    def parse(self, source):
+        root = lxml_etree.parse(source, self.parser).getroot()
+        if self.recover:
+            for error in self.parser.error_log:
+                print(f"XML récupéré ({source}, ligne {error.line}) : {error.message}")
+        if root is None:
+            raise XmlParseError(f"No element found in {source}")
+        return root
+
+    def xpath(self, expression: str):
+        """XPath compilée une fois par expression."""
+        if expression not in self.xpaths:
+            self.xpaths[expression] = lxml_etree.XPath(expression)
+        return self.xpaths[expression]
+
+    def find_first(self, root, tag: str):
+        found = self.xpath(f"(descendant::{tag})[1]")(root)
+        return found[0] if found else None
+
+    def find_all(self, root, tag: str) -> list:
+        return self.xpath(f"descendant::{tag}")(root)
+
+    def pull_parser(self, events):
+        return lxml_etree.XMLPullParser(events=events, recover=self.recover, huge_tree=True, resolve_entities=False,
+                                        no_network=True, remove_comments=True, remove_pis=True)
+
+
+_engines = {}
+
+
+def get_engine(name: str = None):
+    """
+    Moteur XML : 'lxml', 'etree' ou 'auto' (lxml s'il est installé). Par défaut xml_cfg['XML_ENGINE'] ou 'auto'.
+    Le mode 'recover' de lxml n'est activé que par xml_cfg['XML_RECOVER'].
+    """
+    name = name or xml_cfg.get('XML_ENGINE', 'auto')
+    if name in ('auto', 'lxml') and lxml_etree is None:
+        if name == 'lxml':
+            print("lxml n'est pas installé : utilisation de ElementTree.")
+        name = 'etree'
+    elif name == 'auto':
+        name = 'lxml'
+    if name not in _engines:
+        _engines[name] = LxmlEngine(recover=xml_cfg.get('XML_RECOVER', False)) if name == 'lxml' else ElementTreeEngine()
+    return _engines[name]
+
+
+def element_signature(element) -> tuple:
+    """Représentation comparable d'un sous-arbre (balise, attributs, enfants)."""
+    return (element.tag, tuple(sorted(element.attrib.items())),
+            tuple(element_signature(child) for child in element if isinstance(child.tag, str)))
+
+
+def benchmark(paths: list, tags=("start", "condition", "wfd"), repeat: int = 3):
+    """Compare les deux moteurs sur des fichiers réels : temps de parsing / recherche et arbres identiques."""
+    engines = [ElementTreeEngine()] + ([LxmlEngine()] if lxml_etree is not None else [])
+    if len(engines) == 1:
+        print("lxml n'est pas installé : seul ElementTree est mesuré.")
+
+    for path in paths:
+        print(path)
+        signatures = {}
+        for engine in engines:
+            parse_time = find_time = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                root = engine.parse(path)
+                parse_time = min(parse_time, time.perf_counter() - start)
+                start = time.perf_counter()
+                found = {tag: (engine.find_first(root, tag), engine.find_all(root, tag)) for tag in tags}
+                find_time = min(find_time, time.perf_counter() - start)
+            signatures[engine.name] = (element_signature(root),
+                                       {tag: (first is not None and first.attrib.get('id'), len(all_found))
+                                        for tag, (first, all_found) in found.items()})
+            print(f"  {engine.name:6} parse {parse_time * 1000:8.1f} ms   find {find_time * 1000:8.1f} ms")
+        if len(signatures) > 1:
+            identical = len({repr(signature) for signature in signatures.values()}) == 1
+            print(f"  identical output: {identical}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the ElementTree and lxml engines on XML files.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    benchmark(args.paths, repeat=args.repeat)
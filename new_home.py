@@ -1,17 +1,22 @@
-from collections import defaultdict
-import json
 import os
+import time
 import streamlit as st
 import streamlit_nested_layout 
 
 from config import xml_cfg, app_cfg
-from comps_exceptions import display_exceptions
-from comps_init_stp import show_ini_files, display_ini_result
-from func_graph_xml import build_workflow_graph, extract_exceptions
+from comps_exceptions import display_exceptions, exceptions_state, exceptions_data
+from comps_init_stp import display_ini_result
+from comps_node_impact import display_node_impact, impact_state
+from func_analysis_cache import get_analysis_cache
+from func_config_registry import prompt_config
+from func_exception_index import ExceptionIndex
 from func_manage_json import JsonManager
 from func_manage_xml import get_xml_files, get_workflow_info
-from func_update_bitbucket import main as update_bitbucket, get_stp_list
+from func_sync_job import start_sync, read_status, is_running
+from func_update_bitbucket import get_stp_list
 from func_utils import is_admin
+from sessionstate_manager import SessionStateManager
+from xml_parser import show_ini_files_cached
 
 
 st.set_page_config(layout="wide", 
@@ -26,9 +31,19 @@ def initialize_session_state():
         st.session_state.exceptions_loaded = False
     if 'exceptions' not in st.session_state:
         st.session_state.exceptions = []
-    if 'llm_results' not in st.session_state:
-        st.session_state.llm_results = defaultdict(str)
-    
+    if 'exception_index' not in st.session_state:
+        st.session_state.exception_index = ExceptionIndex([])
+
+
+def load_workflow(cached):
+    """La session ne garde que des références vers l'analyse partagée entre sessions."""
+    st.session_state.workflow_analysis = cached.analysis
+    st.session_state.exceptions = cached.analysis.exceptions
+    st.session_state.exception_index = cached.index
+    st.session_state.workflow_loops = cached.analysis.loops
+    st.session_state.unresolved_jumps = cached.analysis.unresolved_jumps
+    st.session_state.workflow_query = cached.query
+
 
 def main():
     
@@ -48,17 +63,15 @@ def main():
         st.title('Settings')
 
         st.subheader('Default prompt')
-        with open(app_cfg["JSON_PROMPT"], 'r') as f:
-                json_prompt = json.load(f)
+        json_prompt = dict(prompt_config().get())
         default_prompt = json_prompt["prompt_default"]
         prompt_area = st.text_area(label='Change', 
                              key='default_prompt_text_area',
                              value=default_prompt)
         if st.button(label='Save', key='buttonSavePrompt'):
             json_prompt["prompt_default"] = prompt_area
-    
-            with open(app_cfg["JSON_PROMPT"], 'w') as f:
-                json.dump(json_prompt, f, indent=4)
+            # Les caches abonnés au prompt par défaut sont prévenus
+            prompt_config().save(json_prompt, indent=4)
             st.success("Changes saved successfully!")
 
         st.subheader('STP to download')
@@ -77,6 +90,15 @@ def main():
             JsonManager.change_stp_list(stp_list=selected_stp)
             st.success("Changes saved successfully!")
 
+        st.subheader('Analysis cache')
+        stats = get_analysis_cache().stats()
+        st.write(f"{stats['entries']} workflows, {stats['bytes'] / 1_000_000:.1f} / {stats['max_bytes'] / 1_000_000:.0f} MB, "
+                 f"{stats['hits']} hits, {stats['misses']} misses")
+
+        st.subheader('Session state')
+        st.write(f"{SessionStateManager().key_count()} keys, {exceptions_state.key_count()} for exceptions, "
+                 f"{exceptions_data.key_count()} cached exception values")
+
         with st.sidebar:
                 c1, c2, c3 = st.columns([2, 10, 1])
                 with c2:
@@ -96,7 +118,9 @@ def main():
 
         colu1, colu2, colu3, colu4, colu5, colu8 = st.columns([1, 1, 1, 1, 1, 1])
         with colu8:
-            st.button(label='Update code', key='button2', use_container_width=True, on_click=update_bitbucket)
+            st.button(label='Update code', key='button2', use_container_width=True, on_click=start_sync)
+            sync_running = is_running(read_status())
+            st.fragment(sync_status_panel, run_every=2 if sync_running else None)(sync_running)
         
         st.title('STP Workflow Tracer')
 
@@ -116,7 +140,7 @@ def main():
             initialization_path = os.path.join(xml_cfg['XML_PATH'], initialization)
             wfd_path = os.path.join(xml_cfg['XML_PATH'], workflow_diagram)
 
-            result = show_ini_files(initialization_path)
+            result = show_ini_files_cached(initialization_path)
 
             manage_json = JsonManager()
 
@@ -125,13 +149,16 @@ def main():
                 display_ini_result(result)
 
             if st.button('Get exceptions', key='button1'):
-                graph = build_workflow_graph(xml_file=wfd_path)
-                st.session_state.exceptions = extract_exceptions(graph=graph, xml_file=wfd_path)
+                cached = get_analysis_cache().get(wfd_path, workflow_name=workflow_name)
+                load_workflow(cached)
                 st.session_state.exceptions_loaded = True
-                all_groups = set(exception.get('condition_group', 'Autre') for exception in st.session_state.exceptions)
-                st.session_state.selected_groups = list(all_groups)
+                # Etat des exceptions du workflow précédent supprimé, données lues sur disque rechargées
+                exceptions_state.track("workflow", wfd_path)
+                impact_state.track("workflow", wfd_path)
+                exceptions_data.clear_scope()
+                st.session_state.selected_groups = list(cached.index.groups)
                 manage_json.add_exceptions(module_name=workflow_name, 
-                                    exceptions_data=st.session_state.exceptions)
+                                    exceptions_data=[exception.to_dict() for exception in cached.analysis.exceptions])
 
             # Side bar
             with st.sidebar:
@@ -143,13 +170,14 @@ def main():
 
                 if st.session_state.exceptions_loaded:
                     st.header("Exception group")
-                    exceptions = st.session_state.exceptions
-                    if exceptions:
-                        all_groups = sorted(list(set(exception.get('condition_group', 'Autre') for exception in exceptions)))
+                    index = st.session_state.exception_index
+                    if len(index):
+                        all_groups = sorted(index.groups)
                         
                         # Create checkboxes for each exception group
                         for group in all_groups:
                             group_display = "No exception group" if group == 'None' else group
+                            group_display = f"{group_display} ({index.group_size(group)})"
                             is_selected = st.checkbox(group_display, value=(group in st.session_state.selected_groups))
                             
                             if is_selected and group not in st.session_state.selected_groups:
@@ -159,13 +187,44 @@ def main():
 
             # WorkFlow Diagram
             if st.session_state.exceptions_loaded:
-                exceptions = st.session_state.exceptions
-                if exceptions:
-                    display_exceptions(exceptions, st.session_state.selected_groups)
+                unresolved_jumps = st.session_state.get("unresolved_jumps")
+                if unresolved_jumps:
+                    st.warning(f"{len(unresolved_jumps)} jump(s) without a matching label: "
+                               + ", ".join(f"{location} (from {source})" for source, location in unresolved_jumps[:20]))
+                with st.expander('Node impact', expanded=False):
+                    display_node_impact(st.session_state.workflow_analysis, lambda: load_workflow(
+                        get_analysis_cache().get(wfd_path, workflow_name=workflow_name, with_graph=True)))
+                index = st.session_state.exception_index
+                if len(index):
+                    display_exceptions(index, st.session_state.selected_groups,
+                                       loops=st.session_state.get("workflow_loops"),
+                                       query=st.session_state.get("workflow_query"))
                 else:
                     st.write("0 exception found.")
 
 
+def sync_status_panel(was_running: bool):
+    """Avancement de la synchronisation Bitbucket, rafraîchi sans bloquer le reste de la page."""
+    status = read_status()
+    if is_running(status):
+        done, expected = status.get("files_done", 0), status.get("files_expected", 0)
+        eta = status.get("eta_seconds")
+        text = f"{done} files, {status.get('bytes', 0) / 1_000_000:.1f} MB"
+        if eta is not None:
+            text += f", ~{eta}s left"
+        if status.get("error_count"):
+            text += f", {status['error_count']} errors"
+        st.progress(min(done / expected, 1.0) if expected else 0.0, text=text)
+    elif was_running:
+        # Fin du job : relance complète pour recharger la liste des workflows et arrêter le polling
+        st.rerun()
+    elif status.get("state") in ("done", "failed") and time.time() - (status.get("finished_at") or 0) < 300:
+        if status["state"] == "failed" or status.get("error_count"):
+            st.warning(f"Update finished with {status.get('error_count', 0)} errors.")
+        else:
+            st.caption(f"Code updated ({status.get('files_done', 0)} files).")
+
+
 def style():
     st.markdown(
         """
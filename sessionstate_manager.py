@@ -2,6 +2,9 @@ import streamlit as st
 from collections import defaultdict
 from typing import Any, Callable
 
+SEPARATOR = ":"
+
+
 class SessionStateManager:
     """
     Gestion centralisée du session_state Streamlit
@@ -11,12 +14,24 @@ class SessionStateManager:
         """
         namespace : préfixe appliqué à toutes les clés pour éviter les collisions
         """
-        self.ns = f"{namespace}:" if namespace else ""
+        self.ns = f"{namespace}{SEPARATOR}" if namespace else ""
 
     def _full_key(self, key: str) -> str:
         """Ajoute le namespace au nom de la clé"""
         return f"{self.ns}{key}"
 
+    def key(self, key: str) -> str:
+        """
+        Nom complet d'une clé, à utiliser comme 'key' des widgets pour les rattacher au namespace.
+        """
+        return self._full_key(key)
+
+    def scope(self, name: str) -> "SessionStateManager":
+        """
+        Namespace imbriqué (ex : une exception dans le namespace des exceptions).
+        """
+        return SessionStateManager(self._full_key(name))
+
     def init(self, key: str, default: Any):
         """
         Initialise une clé avec une valeur par défaut si elle n'existe pas déjà.
@@ -75,3 +90,33 @@ class SessionStateManager:
         fk = self._full_key(key)
         self.set(key, func(st.session_state.get(fk)))
 
+    def keys(self) -> list:
+        """
+        Clés du session_state appartenant au namespace, namespaces imbriqués compris.
+        """
+        return [k for k in st.session_state.keys() if isinstance(k, str) and k.startswith(self.ns)]
+
+    def key_count(self) -> int:
+        """
+        Nombre de clés du namespace (tout le session_state pour le namespace racine).
+        """
+        return len(self.keys())
+
+    def clear_scope(self):
+        """
+        Supprime toutes les clés du namespace et de ses namespaces imbriqués.
+        """
+        for k in self.keys():
+            del st.session_state[k]
+
+    def track(self, key: str, value: Any) -> bool:
+        """
+        Vide le namespace quand la valeur suivie change (ex : changement de workflow).
+        Retourne True si le namespace a été vidé.
+        """
+        fk = self._full_key(key)
+        if fk in st.session_state and st.session_state[fk] == value:
+            return False
+        self.clear_scope()
+        st.session_state[fk] = value
+        return True
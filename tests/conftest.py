@@ -0,0 +1,70 @@
+"""
+Configuration commune des tests.
+- Les modules new_*.py sont importés sous leur nom de déploiement (func_git_mirror -> new_func_git_mirror.py).
+- Un module 'config' de test pointe tous les dossiers vers un répertoire temporaire.
+- Un module 'api_bitbucket' de test remplace le client Bitbucket externe (non versionné) : les tests
+  substituent leur propre serveur à BitbucketClient.
+"""
+import importlib.abc
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_DIR = tempfile.mkdtemp(prefix="aidoc-tests-")
+
+
+class DeployedNames(importlib.abc.MetaPathFinder):
+    """Résout 'func_x' vers new_func_x.py lorsque seul le fichier new_ existe dans le dépôt."""
+
+    def find_spec(self, name, path=None, target=None):
+        if '.' in name or os.path.exists(os.path.join(ROOT, f"{name}.py")):
+            return None
+        filename = os.path.join(ROOT, f"new_{name}.py")
+        if not os.path.exists(filename):
+            return None
+        return importlib.util.spec_from_file_location(name, filename)
+
+
+def make_config():
+    config = types.ModuleType("config")
+    config.environment = "test"
+    config.xml_cfg = {"XML_PATH": os.path.join(TEST_DIR, "xml")}
+    config.app_cfg = {
+        "JSON_PATH": os.path.join(TEST_DIR, "json"),
+        "JSON_PROMPT": os.path.join(TEST_DIR, "json", "prompt.json"),
+        "ADMINLIST": os.path.join(TEST_DIR, "json", "adminlist.json"),
+        "LOGO_PATH": "",
+    }
+    config.bitbucket_cfg = {
+        "URL": "http://127.0.0.1",
+        "TOKEN": "test",
+        "SYNC_MODE": "git",
+        "MIRROR_PATH": os.path.join(TEST_DIR, "mirror.git"),
+    }
+    return config
+
+
+def make_api_bitbucket():
+    api_bitbucket = types.ModuleType("api_bitbucket")
+
+    class BitbucketClient:
+        """Client sans serveur : toute requête non interceptée par un test échoue."""
+
+        def __init__(self, *args):
+            pass
+
+        def _make_request(self, method, endpoint, limit, start):
+            raise RuntimeError(f"No Bitbucket server in tests: {method} {endpoint}")
+
+    api_bitbucket.BitbucketClient = BitbucketClient
+    return api_bitbucket
+
+
+sys.meta_path.append(DeployedNames())
+sys.modules.setdefault("config", make_config())
+sys.modules.setdefault("api_bitbucket", make_api_bitbucket())
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+
+import pytest
+
+from func_catalogue import MAGIC, Catalogue
+
+
+def exception(condition_id, group="G", text="failed", path="start -> op"):
+    return {"condition_id": condition_id, "condition_group": group, "type": "T", "format": "F",
+            "text": text, "path": path}
+
+
+def append_segments(path, worker, count, barrier):
+    catalogue = Catalogue(path)
+    barrier.wait()
+    for i in range(count):
+        catalogue.append(f"WF{worker}", f"digest{i}", [exception(f"C.{worker}.{i}")])
+
+
+def test_concurrent_first_appends_keep_header(tmp_path):
+    # Plusieurs process créent le catalogue en même temps : l'en-tête doit précéder tous les segments
+    path = str(tmp_path / "exceptions.catalogue")
+    context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+    barrier = context.Barrier(4)
+    workers = [context.Process(target=append_segments, args=(path, worker, 20, barrier)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    with open(path, "rb") as f:
+        assert f.read(len(MAGIC)) == MAGIC
+    catalogue = Catalogue(path)
+    assert catalogue.workflows() == ["WF0", "WF1", "WF2", "WF3"]
+    for worker in range(4):
+        assert catalogue.exceptions(f"WF{worker}", "digest19")[0]["condition_id"] == f"C.{worker}.19"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_last_segment_wins(tmp_path):
+    catalogue = Catalogue(str(tmp_path / "exceptions.catalogue"))
+    catalogue.append("WF", "v1", [exception("C.1", text="old")])
+    catalogue.append("WF", "v2", [exception("C.1", text="new")])
+
+    assert catalogue.exceptions("WF", "v1") is None
+    assert catalogue.exceptions("WF", "v2")[0]["text"] == "new"
+    # Un autre process (autre instance) voit les mêmes segments
+    assert Catalogue(catalogue.path).exceptions("WF")[0]["text"] == "new"
+
+
+def test_lookup_is_scoped_to_workflow(tmp_path):
+    catalogue = Catalogue(str(tmp_path / "exceptions.catalogue"))
+    catalogue.append("PAY", "d1", [exception("Svc.Check", text="payment check")])
+    catalogue.append("FX", "d2", [exception("Svc.Check", text="fx check")])
+
+    assert catalogue.lookup("PAY", "Svc.Check", "G")["text"] == "payment check"
+    assert catalogue.lookup("FX", "Svc.Check", "G")["text"] == "fx check"
+    assert catalogue.lookup("OTHER", "Svc.Check", "G") is None
+    assert catalogue.lookup("PAY", "Svc.Check", "other group") is None
+
+    # Index de recherche reconstruit après un nouvel export du workflow
+    catalogue.append("PAY", "d3", [exception("Svc.Check", text="payment check v2")])
+    assert catalogue.lookup("PAY", "Svc.Check", "G")["text"] == "payment check v2"
+
+
+def test_not_a_catalogue(tmp_path):
+    path = tmp_path / "exceptions.catalogue"
+    path.write_bytes(b"garbage that is not a catalogue")
+    with pytest.raises(ValueError):
+        Catalogue(str(path)).exceptions("WF")
+
+
+WORKFLOW = """<?xml version="1.0"?>
+<workflow><start id="start"><operation id="op">
+<condition id="Svc.Check" conditionG="G"><exception type="T" format="F" text="check failed"/></condition>
+</operation></start></workflow>
+"""
+
+
+@pytest.fixture
+def analysis_cache(monkeypatch, tmp_path):
+    pytest.importorskip("streamlit")
+    pytest.importorskip("networkx")
+    import func_analysis_cache
+    import func_catalogue
+
+    monkeypatch.setattr(func_catalogue, "_catalogue", Catalogue(str(tmp_path / "exceptions.catalogue")))
+    xml_file = tmp_path / "PAY_wfd.xml"
+    xml_file.write_text(WORKFLOW)
+    return func_analysis_cache, str(xml_file)
+
+
+def test_load_analysis_exports_then_reads_catalogue(analysis_cache):
+    cache, xml_file = analysis_cache
+    digest = cache.file_digest(xml_file)
+
+    analysis = cache.load_analysis(xml_file, "PAY", digest)
+    assert analysis.graph is not None and not analysis.from_catalogue
+    cached = cache.load_analysis(xml_file, "PAY", digest)
+    assert cached.from_catalogue
+    assert [e.condition_id for e in cached.exceptions] == ["Svc.Check"]
+
+
+def test_load_analysis_falls_back_on_corrupted_catalogue(analysis_cache):
+    cache, xml_file = analysis_cache
+    catalogue = cache.get_catalogue()
+    with open(catalogue.path, "wb") as f:
+        f.write(b"not a catalogue at all")
+
+    analysis = cache.load_analysis(xml_file, "PAY", cache.file_digest(xml_file))
+    assert analysis.graph is not None
+    assert [e.condition_id for e in analysis.exceptions] == ["Svc.Check"]
@@ -0,0 +1,164 @@
+import os
+import subprocess
+import threading
+
+import pytest
+
+from func_git_mirror import list_tree, update_mirror, write_blobs
+
+
+def git(repo, *args):
+    return subprocess.run(['git', '-C', str(repo), *args], check=True, capture_output=True).stdout.decode().strip()
+
+
+def commit_files(repo, files: dict, message: str):
+    for path, content in files.items():
+        filepath = repo / path
+        if content is None:
+            filepath.unlink()
+            continue
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_bytes(content)
+    git(repo, 'add', '-A')
+    git(repo, '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', message)
+    return git(repo, 'rev-parse', 'HEAD')
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """Dépôt local servant d'origine au miroir."""
+    repo = tmp_path / 'origin'
+    repo.mkdir()
+    git(repo, 'init', '-q')
+    commit_files(repo, {
+        'etc/stpcfg/PAY_wfd.xml': b'<workflow/>',
+        'etc/stpcfg/OTHER_wfd.xml': b'<other/>',
+        'src/stk/stp/Pay/check.cc': b'int check() { return 0; }\n',
+        'include/MK_Utils/utils.h': b'#pragma once\n',
+        'README': b'not synchronized\n',
+    }, 'initial')
+    return repo
+
+
+def test_update_mirror_clones_then_fetches(origin, tmp_path):
+    mirror = str(tmp_path / 'mirror.git')
+    first = update_mirror(str(origin), mirror)
+    assert first == git(origin, 'rev-parse', 'HEAD')
+
+    second = commit_files(origin, {'etc/stpcfg/PAY_wfd.xml': b'<workflow version="2"/>'}, 'update')
+    assert update_mirror(str(origin), mirror) == second
+
+
+def test_list_tree_limits_to_paths(origin, tmp_path):
+    mirror = str(tmp_path / 'mirror.git')
+    commit = update_mirror(str(origin), mirror)
+
+    files = list_tree(mirror, commit, ['etc/stpcfg', 'src/stk/stp'])
+    by_path = {path: (blob_id, size) for blob_id, size, path in files}
+    assert sorted(by_path) == ['etc/stpcfg/OTHER_wfd.xml', 'etc/stpcfg/PAY_wfd.xml', 'src/stk/stp/Pay/check.cc']
+    assert by_path['etc/stpcfg/PAY_wfd.xml'] == (git(origin, 'rev-parse', 'HEAD:etc/stpcfg/PAY_wfd.xml'), 11)
+
+
+def test_write_blobs_writes_contents(origin, tmp_path):
+    mirror = str(tmp_path / 'mirror.git')
+    commit = update_mirror(str(origin), mirror)
+    files = list_tree(mirror, commit, ['etc/stpcfg', 'src/stk/stp'])
+    blobs = [(blob_id, str(tmp_path / 'out' / path)) for blob_id, _, path in files]
+
+    written = list(write_blobs(mirror, blobs))
+
+    assert [path for path, _ in written] == [path for _, path in blobs]
+    for (_, size, path), (filepath, written_size) in zip(files, written):
+        assert written_size == size
+        assert open(filepath, 'rb').read() == (origin / path).read_bytes()
+    assert not [f for _, _, f in os.walk(tmp_path / 'out') for f in f if f.endswith('.part')]
+
+
+def run_with_timeout(function, timeout=20):
+    """Exécute 'function' dans un thread ; échoue si elle ne rend pas la main (process git bloqué)."""
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = function()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "write_blobs did not return: git cat-file is blocked"
+    return outcome
+
+
+def test_write_blobs_missing_object_raises(origin, tmp_path):
+    mirror = str(tmp_path / 'mirror.git')
+    update_mirror(str(origin), mirror)
+
+    outcome = run_with_timeout(lambda: list(write_blobs(mirror, [('0' * 40, str(tmp_path / 'out' / 'missing'))])))
+    assert isinstance(outcome.get('error'), RuntimeError)
+
+
+def test_write_blobs_error_with_unread_output_does_not_hang(origin, tmp_path):
+    # Blob plus gros que le tampon du pipe : cat-file reste bloqué en écriture si personne ne le lit
+    commit = commit_files(origin, {'src/stk/stp/Pay/big.bin': os.urandom(4 * 1024 * 1024)}, 'big file')
+    mirror = str(tmp_path / 'mirror.git')
+    update_mirror(str(origin), mirror)
+    blob_id = git(origin, 'rev-parse', f'{commit}:src/stk/stp/Pay/big.bin')
+    # Le dossier de destination est un fichier : l'écriture échoue après la lecture de l'en-tête
+    (tmp_path / 'blocked').write_text('')
+
+    outcome = run_with_timeout(lambda: list(write_blobs(mirror, [(blob_id, str(tmp_path / 'blocked' / 'big.bin'))])))
+    assert isinstance(outcome.get('error'), OSError)
+
+
+def test_write_blobs_consumer_stops_early(origin, tmp_path):
+    commit = commit_files(origin, {'src/stk/stp/Pay/big.bin': os.urandom(4 * 1024 * 1024)}, 'big file')
+    mirror = str(tmp_path / 'mirror.git')
+    update_mirror(str(origin), mirror)
+    files = list_tree(mirror, commit, ['src/stk/stp'])
+    blobs = [(blob_id, str(tmp_path / 'out' / path)) for blob_id, _, path in files]
+
+    def first_only():
+        generator = write_blobs(mirror, blobs)
+        next(generator)
+        generator.close()
+
+    outcome = run_with_timeout(first_only)
+    assert 'error' not in outcome
+
+
+@pytest.fixture
+def bitbucket(monkeypatch, tmp_path):
+    """Module de synchronisation pointé vers un miroir et un XML_PATH temporaires."""
+    pytest.importorskip('requests')
+    import func_update_bitbucket as bitbucket
+    from func_manage_json import JsonManager
+
+    monkeypatch.setitem(bitbucket.xml_cfg, 'XML_PATH', str(tmp_path / 'xml'))
+    monkeypatch.setattr(bitbucket, 'MIRROR_PATH', str(tmp_path / 'mirror.git'))
+    monkeypatch.setattr(JsonManager, 'get_stp_list', staticmethod(lambda *args: ['PAY']))
+    return bitbucket
+
+
+def test_sync_git_writes_changed_files_only(bitbucket, origin, tmp_path):
+    commit = update_mirror(str(origin), bitbucket.MIRROR_PATH)
+    manifest = {'files': {}, 'dirs': {}}
+    seen = set()
+
+    assert bitbucket.sync_git(manifest, seen, commit)
+    xml_path = tmp_path / 'xml'
+    assert (xml_path / 'PAY_wfd.xml').read_bytes() == b'<workflow/>'
+    assert (xml_path / 'codes' / 'Pay' / 'check.cc').exists()
+    assert (xml_path / 'MK_Utils' / 'utils.h').exists()
+    # Hors sélection des STP
+    assert not (xml_path / 'OTHER_wfd.xml').exists()
+    assert seen == {'PAY_wfd.xml', 'codes/Pay/check.cc', 'MK_Utils/utils.h'}
+
+    unchanged = (xml_path / 'codes' / 'Pay' / 'check.cc').stat().st_mtime_ns
+    commit = commit_files(origin, {'etc/stpcfg/PAY_wfd.xml': b'<workflow version="2"/>'}, 'update')
+    update_mirror(str(origin), bitbucket.MIRROR_PATH)
+    assert bitbucket.sync_git(manifest, set(), commit)
+    assert (xml_path / 'PAY_wfd.xml').read_bytes() == b'<workflow version="2"/>'
+    assert (xml_path / 'codes' / 'Pay' / 'check.cc').stat().st_mtime_ns == unchanged
+    assert manifest['files']['PAY_wfd.xml']['revision'] == git(origin, 'rev-parse', 'HEAD:etc/stpcfg/PAY_wfd.xml')
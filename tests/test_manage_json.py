@@ -0,0 +1,54 @@
+from func_manage_json import JsonManager
+from func_path_trie import PathRef, PathTrie
+
+
+def exception(condition_id, path):
+    return {"condition_id": condition_id, "condition_group": "G", "type": "T", "format": "F", "text": "failed",
+            "path": path}
+
+
+def deep_path(trie, branch, depth):
+    steps = [("start", "")] + [(f"Branch{branch}.Fork{d}", "Success") for d in range(depth)]
+    return PathRef(trie, trie.insert(steps))
+
+
+def test_add_exceptions_stores_long_shared_paths_in_trie(tmp_path):
+    manager = JsonManager(str(tmp_path))
+    trie = PathTrie()
+    paths = [deep_path(trie, 0, depth) for depth in range(1, 30)]
+    manager.add_exceptions("PAY", [exception(f"C.{i}", path) for i, path in enumerate(paths)])
+
+    data = manager.load_json("PAY")
+    assert all(isinstance(e["path"], int) for e in data["exceptions"])
+    assert manager.get_exception_value("PAY", "C.28", "G", "path") == str(paths[28])
+
+
+def test_add_exceptions_stores_short_paths_as_strings(tmp_path):
+    manager = JsonManager(str(tmp_path))
+    trie = PathTrie()
+    path = PathRef(trie, trie.insert([("start", ""), ("fork", "Failure"), ("C.1", "")]))
+    manager.add_exceptions("PAY", [exception("C.1", path)])
+
+    data = manager.load_json("PAY")
+    assert data["exceptions"][0]["path"] == "start -> fork/Failure -> C.1"
+    assert "path_trie" not in data
+
+
+def test_path_lengths_match_materialized_paths():
+    trie = PathTrie()
+    indexes = [trie.insert([("start", ""), ("fork", "Failure")]), trie.insert([("start", ""), ("C.1", "")]),
+               deep_path(trie, 1, 5).index]
+    lengths = trie.path_lengths()
+    assert [lengths[i] for i in indexes] == [len(trie.materialize(i)) for i in indexes]
+
+
+def test_add_exceptions_skips_saved_duplicates_only(tmp_path):
+    manager = JsonManager(str(tmp_path))
+    trie = PathTrie()
+    path = PathRef(trie, trie.insert([("start", ""), ("C.1", "")]))
+    manager.add_exceptions("PAY", [exception("C.1", path)])
+
+    # Identiques à une exception déjà enregistrée (chemin comparé sous forme de texte) : ignorées.
+    # Identiques entre elles dans le même lot : ajoutées toutes les deux, comme avant le trie.
+    manager.add_exceptions("PAY", [exception("C.1", "start -> C.1"), exception("C.2", path), exception("C.2", path)])
+    assert [e["condition_id"] for e in manager.load_json("PAY")["exceptions"]] == ["C.1", "C.2", "C.2"]
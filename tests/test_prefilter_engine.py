@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from func_prefilter_engine import PrefilterEngine, condition_clauses
+
+
+RECORDS = {
+    "A": ["1", "2", "1", None],
+    "B": ["x", "x", "y", "x"],
+}
+
+
+def routed(prefilters, records=RECORDS):
+    return [result["conditions"] for result in PrefilterEngine(prefilters).evaluate(records)]
+
+
+def test_equality_clauses_are_anded():
+    assert routed({"E1": ["A==1,B==x;"], "E2": ["B==x"]}) == [
+        ["A==1,B==x;", "B==x"], ["B==x"], [], ["B==x"]]
+
+
+def test_no_condition_matches_everything():
+    assert routed({"E": ["NO_CONDITION"]}) == [["NO_CONDITION"]] * 4
+
+
+def test_repeated_field_is_an_impossible_and():
+    engine = PrefilterEngine({"E": ["A==1,A==2", "A==1,A==1"]})
+    assert [result["conditions"] for result in engine.evaluate(RECORDS)] == [["A==1,A==1"], [], ["A==1,A==1"], []]
+    assert engine.unevaluable == []
+
+
+def test_unsupported_clause_never_matches_and_is_reported():
+    engine = PrefilterEngine({"E1": ["A!=1"], "E2": ["B==x,A>2"], "E3": ["B==y"]})
+    assert [result["entities"] for result in engine.evaluate(RECORDS)] == [[], [], ["E3"], []]
+    assert engine.unevaluable == [("E1", "A!=1", ["A!=1"]), ("E2", "B==x,A>2", ["A>2"])]
+
+
+def test_condition_clauses():
+    assert condition_clauses(" A == 1 , B==x; ") == ([("A", "1"), ("B", "x")], [])
+    assert condition_clauses("A!=1,B==2") == ([("B", "2")], ["A!=1"])
+
+
+def test_blocks_cover_all_records(monkeypatch):
+    import func_prefilter_engine
+    monkeypatch.setattr(func_prefilter_engine, "MAX_CELLS", 3)
+    records = {"A": [str(i % 3) for i in range(10)]}
+    results = PrefilterEngine({"E": ["A==0", "A==1,A==0", "NO_CONDITION"]}).evaluate(records)
+    assert [result["record"] for result in results] == list(range(10))
+    assert [len(result["conditions"]) for result in results] == [2 if i % 3 == 0 else 1 for i in range(10)]
@@ -0,0 +1,152 @@
+import sys
+
+import pytest
+
+from func_query import (And, Contains, InLoop, Match, Not, Or, QueryError, Reachable, WorkflowQuery, explain,
+                        parse_query)
+
+# F2 est sous le label L1, et Op.Retry y revient par un jump : C.Timeout est dans une boucle
+WORKFLOW = """<workflow>
+<start id="start">
+  <fork id="F1">
+    <success>
+      <operation id="Op.OK">
+        <condition id="C.Iban" conditionG="G1"><exception type="X" format="F" text="IBAN invalid"/></condition>
+      </operation>
+    </success>
+    <failure>
+      <label id="L1">
+        <fork id="F2">
+          <success>
+            <condition id="C.Timeout" conditionG="G2"><exception type="Y" format="F" text="Timeout"/></condition>
+          </success>
+          <failure>
+            <operation id="Op.Retry"><jump location="L1"/></operation>
+          </failure>
+        </fork>
+      </label>
+    </failure>
+  </fork>
+</start>
+<unused><condition id="C.Orphan" conditionG="G1"><exception type="X" format="F" text="Never reached"/></condition></unused>
+</workflow>
+"""
+IBAN_PATH = "start -> F1/Success -> Op.OK"
+TIMEOUT_PATH = "start -> F1/Failure -> L1 -> F2/Success"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("type = X", Match("type", ("X",))),
+    ("TYPE != 'a b'", Not(Match("type", ("a b",)))),
+    ("group in (G1, 'G 2')", Match("group", ("G1", "G 2"))),
+    ("text contains IBAN", Contains("text", "iban")),
+    ("id = A or id = B and not in loop",
+     Or((Match("id", ("A",)), And((Match("id", ("B",)), Not(InLoop())))))),
+    ("(id = A or id = B) and in loop", And((Or((Match("id", ("A",)), Match("id", ("B",)))), InLoop()))),
+    ("reachable via failure of fork F1", Reachable("F1", "Failure", "fork")),
+    ("reachable from node fork", Reachable("fork")),
+    ("reachable of 'F 1'", Reachable("F 1")),
+])
+def test_parse(text, expected):
+    assert parse_query(text) == expected
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "Empty query"),
+    ("name = X", "Expected a field \\(id, group, type, format, text, path\\)"),
+    ("type", "Expected '=', '!=', 'in' or 'contains' at position 4, found end of query"),
+    ("type = X and", "Expected a field"),
+    ("type = and", "Expected a value at position 7, found 'and'"),
+    ("(type = X", "Expected '\\)'"),
+    ("type = X)", "Expected 'and', 'or' or end of query"),
+    ("group in (G1 G2)", "Expected '\\)' at position 13"),
+    ("text contains 'IBAN", "Unexpected character at position 14"),
+    ("reachable via Retry of F1", "Unknown branch"),
+    ("reachable F1", "Expected 'of' or 'from'"),
+    ("in F1", "Expected 'loop'"),
+])
+def test_parse_errors(text, message):
+    with pytest.raises(QueryError, match=message):
+        parse_query(text)
+
+
+def test_explain_orders_index_then_graph_then_scan():
+    plan = explain(parse_query("text contains a and path = 'start' and reachable of F1 and type = X"))
+    assert [line.strip().rsplit(" ", 1)[-1] for line in plan.splitlines()] == \
+        ["AND", "[index]", "[graph]", "[scan]", "[scan]"]
+
+
+@pytest.fixture
+def wfd(tmp_path):
+    path = tmp_path / "PAY_wfd.xml"
+    path.write_text(WORKFLOW)
+    return str(path)
+
+
+@pytest.fixture
+def graph_query(wfd):
+    pytest.importorskip("networkx")
+    from func_exception_index import ExceptionIndex
+    from func_graph_xml import analyze_workflow
+
+    analysis = analyze_workflow(wfd)
+    return WorkflowQuery(ExceptionIndex(list(analysis.exceptions)), analysis)
+
+
+def ids(query, text):
+    return [query.index.exceptions[row].condition_id for row in query.run(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("type = X", ["C.Iban", "C.Orphan"]),
+    ("type != X", ["C.Timeout"]),
+    ("id in (C.Iban, C.Timeout, C.Unknown)", ["C.Iban", "C.Timeout"]),
+    ("group = G1 and text contains 'never'", ["C.Orphan"]),
+    ("path contains 'op.ok'", ["C.Iban"]),
+    (f"path = '{IBAN_PATH}'", ["C.Iban"]),
+    (f"path in ('{IBAN_PATH}', '{TIMEOUT_PATH}')", ["C.Iban", "C.Timeout"]),
+    ("reachable of F1", ["C.Iban", "C.Timeout"]),
+    ("reachable via Success of fork F1", ["C.Iban"]),
+    ("reachable via Failure of F1 and type = Y", ["C.Timeout"]),
+    ("in loop", ["C.Timeout"]),
+    ("not in loop and type = X", ["C.Iban", "C.Orphan"]),
+    ("id = C.Orphan or in loop", ["C.Timeout", "C.Orphan"]),
+])
+def test_predicates_on_analyzed_workflow(graph_query, text, expected):
+    assert ids(graph_query, text) == expected
+
+
+def test_graph_predicate_errors(graph_query):
+    with pytest.raises(QueryError, match="Unknown node 'F9'"):
+        graph_query.run("reachable of F9")
+    with pytest.raises(QueryError, match="'F1' is of type fork, not operation"):
+        graph_query.run("reachable of operation F1")
+
+
+def test_and_evaluates_cheap_predicates_first(graph_query):
+    # Aucune ligne après l'index : le prédicat de graphe sur un noeud inconnu n'est jamais évalué
+    assert ids(graph_query, "reachable of F9 and type = Z") == []
+
+
+def test_catalogue_rows_match_paths_without_graph():
+    from func_exception_index import ExceptionIndex
+    from func_exception_record import ExceptionRecord
+
+    records = [ExceptionRecord("C.Iban", "G1", "X", "F", "IBAN invalid", IBAN_PATH),
+               ExceptionRecord("C.Timeout", "G2", "Y", "F", "Timeout", TIMEOUT_PATH)]
+    query = WorkflowQuery(ExceptionIndex(records))
+    assert ids(query, f"path = '{TIMEOUT_PATH}'") == ["C.Timeout"]
+    with pytest.raises(QueryError, match="needs the workflow graph"):
+        query.run("reachable of F1")
+
+
+def test_cli_prints_matches_and_plan(graph_query, wfd, monkeypatch, capsys):
+    import func_query
+
+    monkeypatch.setattr(sys, "argv", ["func_query", "--explain", "type = X and in loop or id = C.Iban", wfd])
+    func_query.main()
+    output = capsys.readouterr().out
+    assert output.startswith("OR\n  Match(field='id'")
+    assert f"{wfd}: 1 exception(s)" in output
+    assert "C.Iban\tX\tIBAN invalid" in output
+    assert output.endswith("1 exception(s)\n")
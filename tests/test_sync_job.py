@@ -0,0 +1,63 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+pytest.importorskip('requests')
+
+import func_sync_job as sync_job
+
+
+@pytest.fixture
+def job(monkeypatch, tmp_path):
+    """Job dont la synchronisation attend 'release' avant de se terminer."""
+    release = threading.Event()
+    calls = []
+
+    def update(progress=None):
+        calls.append(progress)
+        release.wait(10)
+
+    monkeypatch.setattr(sync_job, 'update_bitbucket', update)
+    monkeypatch.setattr(sync_job, '_job_thread', None)
+    yield str(tmp_path), release, calls
+    release.set()
+    if sync_job._job_thread is not None:
+        sync_job._job_thread.join(10)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="the holder process uses fcntl")
+def test_lock_held_by_another_process_prevents_start(job):
+    json_path, release, calls = job
+    holder = subprocess.Popen(
+        [sys.executable, '-c', 'import sys, fcntl; f = open(sys.argv[1], "a"); '
+                               'fcntl.flock(f, fcntl.LOCK_EX); print("locked", flush=True); sys.stdin.read()',
+         f"{json_path}/{sync_job.LOCK_FILE}"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        # Statut périmé d'un job arrêté : seul le verrou fait foi
+        sync_job.write_status({"state": "idle"}, json_path)
+        assert sync_job.start_sync(json_path) == {"state": "idle"}
+        assert calls == []
+    finally:
+        holder.stdin.close()
+        holder.wait()
+
+    sync_job.start_sync(json_path)
+    release.set()
+    sync_job._job_thread.join(10)
+    assert len(calls) == 1
+    assert sync_job.read_status(json_path)["state"] == "done"
+
+
+def test_lock_is_released_when_the_job_ends(job):
+    json_path, release, calls = job
+    sync_job.start_sync(json_path)
+    assert sync_job.try_lock_job(json_path) is None
+    release.set()
+    sync_job._job_thread.join(10)
+    lock_file = sync_job.try_lock_job(json_path)
+    assert lock_file is not None
+    lock_file.close()
@@ -0,0 +1,226 @@
+import contextlib
+import io
+import os
+import tarfile
+import types
+
+import pytest
+
+pytest.importorskip('requests')
+
+import func_update_bitbucket as bitbucket
+from func_manage_json import JsonManager
+
+
+class FakeBitbucket:
+    """
+    Serveur Bitbucket de substitution : arborescence en mémoire, un commit par appel à commit().
+    Répond aux endpoints commits, last-modified et browse (pagination limit/start comprise).
+    """
+
+    def __init__(self, files: dict):
+        self.files = {}  # chemin -> (contenu, commit de dernière modification)
+        self.head = None
+        self.count = 0
+        self.requests = []
+        self.commit(files)
+
+    def commit(self, files: dict):
+        """Applique un commit ; un contenu None supprime le fichier."""
+        self.count += 1
+        self.head = f"{self.count:040x}"
+        for path, content in files.items():
+            if content is None:
+                del self.files[path]
+            else:
+                self.files[path] = (content, self.head)
+
+    def children(self, path: str):
+        """Enfants directs de 'path' : nom -> (type, commit de dernière modification)."""
+        children = {}
+        for filepath, (_, commit) in sorted(self.files.items()):
+            if not filepath.startswith(path + '/'):
+                continue
+            rest = filepath[len(path) + 1:]
+            name = rest.split('/')[0]
+            kind = 'DIRECTORY' if '/' in rest else 'FILE'
+            previous = children.get(name, (kind, commit))[1]
+            children[name] = (kind, max(commit, previous))
+        if not children:
+            raise RuntimeError(f"404: {path} not found")
+        return children
+
+    def _make_request(self, method, endpoint, limit, start):
+        kind, _, path = endpoint[len(bitbucket.REPO_ENDPOINT) + 1:].partition('/')
+        path = path.rstrip('/')
+        self.requests.append((kind, path))
+        if kind == 'commits':
+            return {'values': [{'id': self.head}]}
+        if kind == 'last-modified':
+            return {'files': {name: {'id': commit} for name, (_, commit) in self.children(path).items()}}
+        if path in self.files:
+            lines = [{'text': line} for line in self.files[path][0].split('\n')]
+            return dict(lines=lines[start:start + limit], **self.page(len(lines), limit, start))
+        values = [{'type': kind, 'path': {'toString': name, 'name': name, 'extension': name.rpartition('.')[2]}}
+                  for name, (kind, _) in self.children(path).items()]
+        return {'children': dict(values=values[start:start + limit], **self.page(len(values), limit, start))}
+
+    @staticmethod
+    def page(size: int, limit: int, start: int):
+        last = start + limit >= size
+        return {'isLastPage': last, 'nextPageStart': None if last else start + limit}
+
+    def fetched_files(self):
+        return sorted(path for kind, path in self.requests if kind == 'browse' and path in self.files)
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    server = FakeBitbucket({
+        'etc/stpcfg/PAY_wfd.xml': '<workflow>\n</workflow>',
+        'etc/stpcfg/OTHER_wfd.xml': '<other/>',
+        'src/stk/stp/Pay/check.cc': 'int check() {\n    return 0;\n}',
+        'src/stk/stp/Fx/rate.cc': 'double rate();',
+        'include/MK_Utils/utils.h': '#pragma once',
+        'include/TCI_Utils/tci.h': '#pragma once',
+        'README': 'not synchronized',
+    })
+    monkeypatch.setitem(bitbucket.xml_cfg, 'XML_PATH', str(tmp_path / 'xml'))
+    monkeypatch.setattr(bitbucket, 'SYNC_MODE', 'browse')
+    monkeypatch.setattr(bitbucket, 'BitbucketClient', lambda *args: server)
+    monkeypatch.setattr(JsonManager, 'get_stp_list', staticmethod(lambda *args: ['PAY']))
+    bitbucket.main()
+    server.requests.clear()
+    return server
+
+
+def local(path):
+    return os.path.join(bitbucket.xml_cfg['XML_PATH'], path)
+
+
+def test_initial_sync_downloads_selected_files(server):
+    assert open(local('PAY_wfd.xml')).read() == '<workflow>\n</workflow>'
+    assert open(local('codes/Pay/check.cc')).read() == 'int check() {\n    return 0;\n}'
+    assert os.path.exists(local('MK_Utils/utils.h'))
+    assert not os.path.exists(local('OTHER_wfd.xml'))
+    assert bitbucket.load_manifest()['commit'] == server.head
+
+
+def test_noop_sync_makes_a_single_request(server):
+    mtime = os.stat(local('codes/Pay/check.cc')).st_mtime_ns
+    bitbucket.main()
+    assert server.requests == [('commits', '')]
+    assert os.stat(local('codes/Pay/check.cc')).st_mtime_ns == mtime
+
+
+def test_unrelated_commit_fetches_no_file(server):
+    server.commit({'README': 'still not synchronized'})
+    bitbucket.main()
+    assert server.fetched_files() == []
+    # Dossiers inchangés non parcourus
+    assert ('browse', 'src/stk/stp/Pay') not in server.requests
+    assert bitbucket.load_manifest()['commit'] == server.head
+
+
+def test_changed_file_is_the_only_download(server):
+    unchanged = os.stat(local('codes/Fx/rate.cc')).st_mtime_ns
+    server.commit({'src/stk/stp/Pay/check.cc': 'int check() {\n    return 1;\n}'})
+    bitbucket.main()
+    assert server.fetched_files() == ['src/stk/stp/Pay/check.cc']
+    assert open(local('codes/Pay/check.cc')).read() == 'int check() {\n    return 1;\n}'
+    assert os.stat(local('codes/Fx/rate.cc')).st_mtime_ns == unchanged
+
+
+def test_deleted_file_is_removed_locally(server):
+    server.commit({'src/stk/stp/Fx/rate.cc': None, 'src/stk/stp/Fx/spot.cc': 'double spot();'})
+    bitbucket.main()
+    assert not os.path.exists(local('codes/Fx/rate.cc'))
+    assert open(local('codes/Fx/spot.cc')).read() == 'double spot();'
+    assert 'codes/Fx/rate.cc' not in bitbucket.load_manifest()['files']
+    assert server.fetched_files() == ['src/stk/stp/Fx/spot.cc']
+
+
+def test_listing_error_keeps_local_files(server, monkeypatch):
+    server.commit({'src/stk/stp/Fx/rate.cc': None})
+    listing = server._make_request
+
+    def failing(method, endpoint, limit, start):
+        if endpoint.endswith('/browse/src/stk/stp'):
+            raise RuntimeError("503")
+        return listing(method, endpoint, limit, start)
+
+    monkeypatch.setattr(server, '_make_request', failing)
+    bitbucket.main()
+    # Listing incomplet : pas de suppression, et la prochaine synchronisation reprend
+    assert os.path.exists(local('codes/Fx/rate.cc'))
+    assert bitbucket.load_manifest()['commit'] is None
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_iter_directory_follows_every_page(server, prefetch):
+    names = [child['path']['name'] for child in bitbucket.iter_directory('etc/stpcfg', page_size=1, prefetch=prefetch)]
+    assert names == ['OTHER_wfd.xml', 'PAY_wfd.xml']
+    assert server.requests == [('browse', 'etc/stpcfg')] * 2
+
+
+def test_get_file_content_joins_pages(server):
+    content = bitbucket.get_file_content('src/stk/stp/Pay', 'check.cc', page_size=1)
+    assert [line['text'] for line in content['lines']] == ['int check() {', '    return 0;', '}']
+
+
+def test_iter_pages_reraises_producer_error(server, monkeypatch):
+    listing = server._make_request
+
+    def failing(method, endpoint, limit, start):
+        if start == 1:
+            raise RuntimeError("page unavailable")
+        return listing(method, endpoint, limit, start)
+
+    monkeypatch.setattr(server, '_make_request', failing)
+    pages = bitbucket.iter_pages('etc/stpcfg', page_size=1)
+    assert next(pages)['children']['values'][0]['path']['name'] == 'OTHER_wfd.xml'
+    with pytest.raises(RuntimeError, match="page unavailable"):
+        next(pages)
+
+
+def serve_archive(server, monkeypatch):
+    """Sert l'archive tar.gz de l'arborescence courante du serveur à la place de l'endpoint archive."""
+    def archive_stream(paths, at=None):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            for filepath, (content, _) in sorted(server.files.items()):
+                if any(filepath.startswith(path + '/') for path in paths):
+                    data = content.encode('utf-8')
+                    info = tarfile.TarInfo(filepath)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+        buffer.seek(0)
+        return contextlib.nullcontext(types.SimpleNamespace(raw=buffer))
+
+    monkeypatch.setattr(bitbucket, 'bitbucket_archive_stream', archive_stream)
+
+
+def test_mode_change_rewrites_changed_files_only(server, monkeypatch):
+    serve_archive(server, monkeypatch)
+    unchanged = os.stat(local('codes/Fx/rate.cc')).st_mtime_ns
+    server.commit({'src/stk/stp/Pay/check.cc': 'int check() {\n    return 1;\n}'})
+    monkeypatch.setattr(bitbucket, 'SYNC_MODE', 'archive')
+    bitbucket.main()
+    assert open(local('codes/Pay/check.cc')).read() == 'int check() {\n    return 1;\n}'
+    assert os.stat(local('codes/Fx/rate.cc')).st_mtime_ns == unchanged
+
+    # Retour en browse : les révisions de l'archive ne sont pas comparées aux révisions par fichier
+    server.commit({'src/stk/stp/Pay/check.cc': 'int check() {\n    return 2;\n}'})
+    monkeypatch.setattr(bitbucket, 'SYNC_MODE', 'browse')
+    bitbucket.main()
+    assert open(local('codes/Pay/check.cc')).read() == 'int check() {\n    return 2;\n}'
+    assert os.stat(local('codes/Fx/rate.cc')).st_mtime_ns == unchanged
+    manifest = bitbucket.load_manifest()
+    assert manifest['mode'] == 'browse'
+    assert manifest['files']['codes/Fx/rate.cc']['revision'] == server.files['src/stk/stp/Fx/rate.cc'][1]
+
+    # Les révisions browse sont à nouveau fiables : plus aucun téléchargement inutile
+    server.requests.clear()
+    server.commit({'src/stk/stp/Pay/check.cc': 'int check() {\n    return 3;\n}'})
+    bitbucket.main()
+    assert server.fetched_files() == ['src/stk/stp/Pay/check.cc']
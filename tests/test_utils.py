@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('streamlit')
+
+import func_config_registry
+from func_utils import AdminResolver, is_admin
+
+
+class FakeResolver:
+    """Résolveur DNS de substitution : IP -> nom d'hôte, compte les appels."""
+
+    def __init__(self, hosts: dict, delay: threading.Event = None):
+        self.hosts = hosts
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, ip: str) -> str:
+        self.calls.append(ip)
+        if self.delay is not None:
+            self.delay.wait(5)
+        if ip not in self.hosts:
+            raise OSError(f"unknown host {ip}")
+        return self.hosts[ip]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def write_adminlist(path, admins: dict, mtime_ns: int):
+    path.write_text(json.dumps({"admin_name": admins}))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def adminlist(tmp_path):
+    path = tmp_path / "adminlist.json"
+    write_adminlist(path, {"123456": "Alice"}, 1_000_000_000)
+    return path
+
+
+def test_resolution_is_cached_until_ttl(adminlist):
+    dns, clock = FakeResolver({"10.0.0.1": "lp123456.corp.local"}), FakeClock()
+    resolver = AdminResolver(str(adminlist), resolver=dns, ttl=300, clock=clock)
+
+    assert is_admin("10.0.0.1", resolver) == (True, "Alice")
+    clock.now = 299
+    assert is_admin("10.0.0.1", resolver) == (True, "Alice")
+    assert dns.calls == ["10.0.0.1"]
+
+    clock.now = 301
+    assert resolver.machine("10.0.0.1") == "123456"
+    assert dns.calls == ["10.0.0.1"] * 2
+
+
+def test_failed_resolution_is_negatively_cached(adminlist):
+    dns, clock = FakeResolver({}), FakeClock()
+    resolver = AdminResolver(str(adminlist), resolver=dns, ttl=300, negative_ttl=30, clock=clock)
+
+    assert is_admin("10.0.0.2", resolver) == (False, "")
+    clock.now = 29
+    assert resolver.machine("10.0.0.2") is None
+    assert dns.calls == ["10.0.0.2"]
+
+    # Le poste devient résolvable : visible après expiration du cache négatif seulement
+    dns.hosts["10.0.0.2"] = "lp123456"
+    clock.now = 31
+    assert resolver.machine("10.0.0.2") == "123456"
+    assert dns.calls == ["10.0.0.2"] * 2
+
+
+def test_slow_resolution_times_out(adminlist):
+    release = threading.Event()
+    dns = FakeResolver({"10.0.0.3": "lp123456"}, delay=release)
+    resolver = AdminResolver(str(adminlist), resolver=dns, timeout=0.05, clock=FakeClock())
+    try:
+        start = time.perf_counter()
+        assert resolver.machine("10.0.0.3") is None
+        assert time.perf_counter() - start < 1
+        # Délai dépassé traité comme un échec : pas de nouvelle résolution avant negative_ttl
+        assert resolver.machine("10.0.0.3") is None
+        assert dns.calls == ["10.0.0.3"]
+    finally:
+        release.set()
+
+
+def test_adminlist_reloaded_only_when_mtime_changes(adminlist, monkeypatch):
+    loads = []
+    load = func_config_registry.ConfigFile._load
+
+    def counting_load(self):
+        loads.append(self.path)
+        return load(self)
+
+    monkeypatch.setattr(func_config_registry.ConfigFile, '_load', counting_load)
+    resolver = AdminResolver(str(adminlist), resolver=FakeResolver({}), clock=FakeClock())
+
+    assert resolver.admins() == {"123456": "Alice"}
+    assert resolver.admins() == {"123456": "Alice"}
+    assert len(loads) == 1
+
+    write_adminlist(adminlist, {"123456": "Bobby"}, 2_000_000_000)
+    assert resolver.admins() == {"123456": "Bobby"}
+    assert resolver.admins() == {"123456": "Bobby"}
+    assert len(loads) == 2
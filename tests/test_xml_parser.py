@@ -0,0 +1,36 @@
+import os
+
+import xml_parser
+from xml_parser import show_ini_files_cached
+
+
+def write_ini(path, conditions):
+    prefilters = "".join(f'<preFilter entities="E" condition="{c}"/>' for c in conditions)
+    path.write_text(f'<ini><preFilterList>{prefilters}</preFilterList></ini>')
+
+
+def test_cached_result_is_reused_until_the_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "PAY_ini.xml"
+    write_ini(path, ["A==1,B==2"])
+    parses = []
+    parse = xml_parser.show_ini_files
+    monkeypatch.setattr(xml_parser, "show_ini_files", lambda p: parses.append(p) or parse(p))
+
+    first = show_ini_files_cached(str(path))
+    assert show_ini_files_cached(str(path)) is first
+    assert len(parses) == 1
+    assert first["preFilterIndex"]["E"].query({"A": "1"}) == ["A==1,B==2"]
+
+    write_ini(path, ["A==1,B==2", "A==3,B==4"])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    second = show_ini_files_cached(str(path))
+    assert len(parses) == 2
+    assert second["preFilterIndex"]["E"].query({"A": "3"}) == ["A==3,B==4"]
+
+
+def test_errors_are_not_cached(tmp_path):
+    path = tmp_path / "missing_ini.xml"
+    assert "error" in show_ini_files_cached(str(path))
+    write_ini(path, ["A==1"])
+    assert show_ini_files_cached(str(path))["preFiltersGroupedByEntities"]["E"] == ["A==1"]
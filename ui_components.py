@@ -1,15 +1,7 @@
 import streamlit as st
-from collections import defaultdict
-
-def extract_filter_values(conditions):
-    """Extract all possible filter values from conditions."""
-    filter_values = defaultdict(set)
-    for condition in conditions:
-        for part in condition.split(','):
-            if "==" in part:
-                name, value = part.split("==")
-                filter_values[name.strip()].add(value.strip().replace(";", ""))
-    return {k: sorted(v) for k, v in filter_values.items()}
+from collections import Counter, defaultdict
+from func_prefilter_engine import PrefilterEngine, load_records
+from xml_parser import PrefilterIndex
 
 def display_ini_result(result: dict):
     """Display event groups and prefilters."""
@@ -25,25 +17,50 @@ def display_ini_result(result: dict):
             st.markdown(f"- {', '.join(f'{k}: {v}' for k, v in event.items())}")
 
     # Prefilters
+    indexes = result.get("preFilterIndex") or {}
     st.subheader("Prefilter per entities")
     for entity, conditions in result["preFiltersGroupedByEntities"].items():
         with st.expander(f"Entity: {entity} ({len(conditions)} conditions)"):
-            filter_values = extract_filter_values(conditions)
+            index = indexes.get(entity) or PrefilterIndex(conditions)
+            filter_values = index.values()
             filter_names = list(filter_values.keys())
-            if all(len(c.split(',')) == 1 for c in conditions):
+            if index.single_part:
                 for fname, values in filter_values.items():
                     st.markdown(f"- **{fname}**: {', '.join(values)}")
                 continue
             cols = st.columns(len(filter_names))
-            filters = {fname: cols[i].selectbox(fname, [""] + filter_values[fname]) for i, fname in enumerate(filter_names)}
-            results = []
-            for condition in conditions:
-                parts = [p.strip() for p in condition.split(',')]
-                if all(fv == "" or f"{fn}=={fv}" in condition for fn, fv in filters.items()):
-                    results.append(condition)
+            filters = {fname: cols[i].selectbox(fname, [""] + filter_values[fname], key=f"prefilter_{entity}_{fname}")
+                       for i, fname in enumerate(filter_names)}
+            results = index.query(filters)
             if results:
                 st.write(", ".join(results))
 
+    # Sample events routing
+    st.subheader("Route sample events")
+    uploaded = st.file_uploader("Events (CSV or JSON, one field per column / key)", type=["csv", "json"],
+                                key="prefilter_events_upload")
+    if uploaded is not None:
+        display_event_routing(result["preFiltersGroupedByEntities"], uploaded)
+
+def display_event_routing(prefilters_by_entity: dict, uploaded):
+    """Entities and prefilter conditions capturing each uploaded event."""
+    try:
+        records = load_records(uploaded.getvalue(), uploaded.name)
+    except (ValueError, AttributeError, TypeError) as e:
+        st.error(f"Unreadable events file: {e}")
+        return
+
+    engine = PrefilterEngine(prefilters_by_entity)
+    routed = engine.evaluate(records)
+    st.write(f"{len(routed)} events, {len(engine)} conditions")
+    if engine.unevaluable:
+        st.warning("Conditions that cannot be evaluated (only 'field==value' clauses are supported) never match: "
+                   + "; ".join(f"{entity}: {condition}" for entity, condition, _ in engine.unevaluable))
+    counts = Counter(entity for r in routed for entity in r["entities"])
+    st.markdown("  \n".join(f"**{entity}**: {counts[entity]}" for entity in prefilters_by_entity))
+    st.dataframe([{"Event": r["record"], "Entities": ", ".join(r["entities"]), "Conditions": " | ".join(r["conditions"])}
+                  for r in routed], use_container_width=True)
+
 def display_exceptions(exceptions, selected_groups, llm_request, print_code, replace_print_code, find_directory):
     """Display exceptions filtered by selected groups."""
     grouped = defaultdict(list)
@@ -1,6 +1,9 @@
 import os
-import xml.etree.ElementTree as ET
+import re
+import threading
 from collections import defaultdict
+from func_bitset import bitset_rows, rows_to_bitset
+from func_xml_engine import PARSE_ERRORS, get_engine
 
 def get_xml_files(xml_path: str):
     """Retrieve XML files from the specified path."""
@@ -13,48 +16,182 @@ def get_xml_files(xml_path: str):
 def parse_workflow_info(xml_file_path: str):
     """Parse workflow info from XML file."""
     try:
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
-        wfd = root.find(".//wfd")
+        engine = get_engine()
+        root = engine.parse(xml_file_path)
+        wfd = engine.find_first(root, "wfd")
         if wfd is None:
             return None, None, None
         return wfd.get("WorkflowName"), wfd.get("WorkflowDiagram"), wfd.get("Initialization")
-    except (FileNotFoundError, ET.ParseError, Exception):
+    except (FileNotFoundError, *PARSE_ERRORS, Exception):
         return None, None, None
 
+# '&' qui ne commence pas une entité XML valide (les 5 entités prédéfinies ou une référence numérique)
+BARE_AMPERSAND = re.compile(r'&(?!(?:amp|lt|gt|quot|apos|#[0-9]+|#x[0-9A-Fa-f]+);)')
+MAX_ENTITY_LENGTH = 16
+
+
+class AmpersandEscapingReader:
+    """
+    Lecteur texte qui échappe les '&' isolés à la volée. Un '&' en fin de bloc est conservé
+    pour le bloc suivant tant que l'entité qu'il commence peut encore se terminer.
+    """
+
+    def __init__(self, f, chunk_size: int = 64 * 1024):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.pending = ''
+
+    def read(self, size: int = -1) -> str:
+        size = self.chunk_size if size is None or size < 0 else size
+        while True:
+            chunk = self.f.read(size)
+            data, self.pending = self.pending + chunk, ''
+            if not chunk:
+                return BARE_AMPERSAND.sub('&amp;', data)
+            amp = data.rfind('&')
+            if amp != -1 and len(data) - amp < MAX_ENTITY_LENGTH and ';' not in data[amp:]:
+                data, self.pending = data[:amp], data[amp:]
+            # Une chaîne vide signifierait la fin du fichier pour le parseur
+            if data:
+                return BARE_AMPERSAND.sub('&amp;', data)
+
+
+def parse_condition(condition: str):
+    """Couples (filtre, valeur) d'une condition de prefilter 'f1==v1,f2==v2;'."""
+    for part in condition.split(','):
+        if "==" in part:
+            name, value = part.split("==", 1)
+            yield name.strip(), value.strip().replace(";", "")
+
+
+class PrefilterIndex:
+    """
+    Index en colonnes des conditions de prefilter d'une entité : filtre -> valeur -> bitset des conditions.
+    Un filtre multiple est l'intersection des bitsets des valeurs choisies.
+    """
+
+    def __init__(self, conditions: list):
+        self.conditions = list(conditions)
+        self.single_part = all(len(c.split(',')) == 1 for c in self.conditions)
+        rows = defaultdict(lambda: defaultdict(list))
+        for row, condition in enumerate(self.conditions):
+            for name, value in parse_condition(condition):
+                rows[name][value].append(row)
+        row_count = len(self.conditions)
+        self.columns = {name: {value: rows_to_bitset(value_rows, row_count) for value, value_rows in values.items()}
+                        for name, values in rows.items()}
+        self.all_rows = (1 << row_count) - 1
+
+    def __len__(self):
+        return len(self.conditions)
+
+    def values(self) -> dict:
+        """Valeurs possibles de chaque filtre, triées."""
+        return {name: sorted(values) for name, values in self.columns.items()}
+
+    def match(self, filters: dict) -> int:
+        """Bitset des conditions ayant exactement la valeur demandée pour chaque filtre renseigné."""
+        bitset = self.all_rows
+        for name, value in filters.items():
+            if value:
+                bitset &= self.columns.get(name, {}).get(value, 0)
+                if not bitset:
+                    break
+        return bitset
+
+    def query(self, filters: dict) -> list:
+        return [self.conditions[row] for row in bitset_rows(self.match(filters))]
+
+
 def show_ini_files(path_to_xml: str):
-    """Parse initialization XML to extract event groups and prefilters."""
+    """
+    Parse initialization XML to extract event groups and prefilters.
+    Lecture en flux : seuls les premiers eventList et preFilterList sont conservés, les éléments sont
+    supprimés dès qu'ils sont traités.
+    """
+    result = {
+        "eventGroups": defaultdict(lambda: {"events": []}),
+        "preFiltersGroupedByEntities": defaultdict(list)
+    }
+
+    stack = []
+    section = None  # 'eventList' ou 'preFilterList' en cours de lecture
+    section_depth = 0
+    done = set()
+    root_events = []
+    group_events = defaultdict(list)
+    has_groups = False
+
     try:
         with open(path_to_xml, 'r', encoding='utf-8') as f:
-            xml_string = f.read().replace("&", "&amp;")
-        root = ET.fromstring(xml_string)
+            for event, elem in get_engine().iterparse(AmpersandEscapingReader(f), events=("start", "end")):
+                if event == "start":
+                    depth = len(stack)
+                    stack.append(elem)
+                    if section is None:
+                        if depth and elem.tag in ("eventList", "preFilterList") and elem.tag not in done:
+                            section, section_depth = elem.tag, depth
+                    elif section == "eventList":
+                        if depth == section_depth + 1:
+                            if elem.tag == "event":
+                                root_events.append(dict(elem.attrib))
+                            else:
+                                has_groups = True
+                        elif depth == section_depth + 2 and elem.tag == "event":
+                            group_events[stack[-2].tag].append(dict(elem.attrib))
+                    elif depth == section_depth + 1 and elem.tag == "preFilter":
+                        entities = elem.attrib.get('entities', '')
+                        condition = elem.attrib.get('condition', 'NO_CONDITION')
+                        result["preFiltersGroupedByEntities"][entities].append(condition)
+                    continue
+
+                stack.pop()
+                if section is not None and len(stack) == section_depth and elem.tag == section:
+                    done.add(section)
+                    section = None
+                # Les attributs utiles sont copiés au 'start' : l'élément terminé peut être libéré
+                elem.clear()
+                if stack:
+                    del stack[-1][-1]
     except FileNotFoundError:
         return {"error": f"Fichier non trouvé : {path_to_xml}"}
     except Exception as e:
         return {"error": str(e)}
 
-    result = {
-        "eventGroups": defaultdict(lambda: {"events": []}),
-        "preFiltersGroupedByEntities": defaultdict(list)
-    }
-
-    # Event list
-    event_list_section = root.find(".//eventList")
-    if event_list_section is not None:
-        has_groups = any(child.tag != "event" for child in event_list_section)
+    if "eventList" in done:
         if has_groups:
-            for group in event_list_section:
-                for event in group.findall("event"):
-                    result["eventGroups"][group.tag]["events"].append(event.attrib)
+            for tag, events in group_events.items():
+                result["eventGroups"][tag]["events"].extend(events)
         else:
-            result["eventGroups"]["__root__"]["events"] = [event.attrib for event in event_list_section.findall("event")]
+            result["eventGroups"]["__root__"]["events"] = root_events
+
+    result["preFilterIndex"] = {entity: PrefilterIndex(conditions)
+                                for entity, conditions in result["preFiltersGroupedByEntities"].items()}
+    return result
+
 
-    # Prefilter list
-    prefilters_section = root.find(".//preFilterList")
-    if prefilters_section is not None:
-        for prefilter in prefilters_section.findall('preFilter'):
-            entities = prefilter.attrib.get('entities', '')
-            condition = prefilter.attrib.get('condition', 'NO_CONDITION')
-            result["preFiltersGroupedByEntities"][entities].append(condition)
+# Résultats de show_ini_files partagés entre reruns et sessions : chemin -> ((mtime, taille), résultat)
+_ini_results = {}
+_ini_results_lock = threading.Lock()
 
+
+def show_ini_files_cached(path_to_xml: str):
+    """
+    show_ini_files relu seulement si la date de modification ou la taille du fichier a changé (comme
+    func_config_registry.ConfigFile) : un rerun ne re-parse ni ne ré-indexe les conditions.
+    Le résultat est partagé entre sessions et ne doit pas être modifié.
+    """
+    try:
+        stat = os.stat(path_to_xml)
+    except OSError:
+        return show_ini_files(path_to_xml)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _ini_results_lock:
+        cached = _ini_results.get(path_to_xml)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    result = show_ini_files(path_to_xml)
+    if "error" not in result:
+        with _ini_results_lock:
+            _ini_results[path_to_xml] = (signature, result)
     return result